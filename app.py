@@ -2,83 +2,77 @@
 from dotenv import load_dotenv
 import os
 load_dotenv()
-from flask import Flask, request, Response, send_from_directory
+from flask import Flask, Blueprint, request, Response, send_from_directory, send_file
 from src.utils.logger import setup_logger
-from src.utils.scheduler import init_scheduler
 from src.services.payment_service import check_new_payments
 from src.services.reminder_service import send_balance_reminders
-from src.utils.database import init_db, StudentContact, GatePass
-from src.utils.whatsapp import send_whatsapp_message
+from src.services.gatepass_service import gatepass_expiry, store_gatepass_media, gatepass_text, deliver_gatepass, issue_gatepass_once, record_delivery, settle_message_status
+from src.utils.database import init_db, find_contacts_by_phone, StudentContact, GatePass, GatePassArchive, JobRun
+from src.utils.phone import normalize_phone
+from src.utils.idempotency import idempotent_webhook, twilio_message_key
+from src.utils.throttle import throttle_inbound, throttle_stats
+from src.utils.metrics import instrument_app, render_prometheus
+from src.utils import tracing, profiling, query_budget
+from src.utils.storage import get_storage, LocalStorage
+from src.utils.http_cache import conditional, validators_for
+from src.services.job_run_service import list_runs, run_summary, as_utc
+from src.services.campaign_service import plan_reminder_campaign, campaign_report
+from src.services.profile_sync_service import get_profiles_bulk
+from src.services.contact_service import contact_fields_from_profile
+from src.services.contact_import_service import import_contacts
+from src.services.search_service import search_students
+from src.services.financial_snapshot_service import get_financial_snapshot, invalidate_financial_snapshot, get_snapshot_store
 from config import get_config
 import datetime
-import uuid
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-import qrcode
-from PIL import Image as PILImage
-from twilio.rest import Client
-from twilio.twiml.messaging_response import MessagingResponse
-import requests  # Added import
-import boto3
-
-app = Flask(__name__)
-app.config.from_object(get_config())
-logger = setup_logger(__name__)
-init_scheduler()
-
-# Term end dates for 2025
-TERM_END_DATES = {
-    "2025-1": datetime.datetime(2025, 3, 31),
-    "2025-2": datetime.datetime(2025, 7, 31),
-    "2025-3": datetime.datetime(2025, 11, 30)
-}
+import hmac
 
-# Twilio client for media messages
-twilio_client = Client(app.config['TWILIO_ACCOUNT_SID'], app.config['TWILIO_AUTH_TOKEN'])
+# ReportLab, qrcode, boto3, twilio and APScheduler are imported on first use
+# (see gatepass_service, clients and create_app) to keep worker start-up fast.
+config = get_config()
+logger = setup_logger(__name__)
+bp = Blueprint("main", __name__)
 
-# AWS S3 client
-s3 = boto3.client('s3', aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'), aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'))
-bucket_name = 'shining-smiles-gatepasses'  # Replace with your S3 bucket name
+def _twiml():
+    from twilio.twiml.messaging_response import MessagingResponse
+    return MessagingResponse()
 
-@app.route("/trigger-payments", methods=["POST"])
+@bp.route("/trigger-payments", methods=["POST"])
 def trigger_payments():
     """Manual trigger for checking new payments (for testing)."""
     try:
         student_id = request.args.get("student_id_number", "SSC20257279")
         term = request.args.get("term", "2025-1")
         phone_number = request.args.get("phone_number")
-        logger.debug(f"Triggering payment check for student_id={student_id}, term={term}, phone_number={phone_number}")
+        logger.debug("Triggering payment check for student_id=%s, term=%s, phone_number=%s", student_id, term, phone_number)
         result = check_new_payments(student_id, term, phone_number)
         if "error" in result:
-            logger.error(f"Error in check_new_payments: {result['error']}")
+            logger.error("Error in check_new_payments: %s", result["error"])
             return {"status": "Payment check failed", "error": result["error"]}, 400
-        logger.info(f"Payment check triggered for {student_id}")
+        logger.info("Payment check triggered for %s", student_id)
         return {"status": "Payment check triggered", "result": result}, 200
     except Exception as e:
-        logger.error(f"Error triggering payments: {str(e)}")
+        logger.error("Error triggering payments: %s", e)
         return {"error": str(e)}, 500
 
-@app.route("/trigger-reminders", methods=["POST"])
+@bp.route("/trigger-reminders", methods=["POST"])
 def trigger_reminders():
     """Manual trigger for balance reminders (for testing)."""
     try:
         student_id = request.args.get("student_id_number", "SSC20257279")
         term = request.args.get("term", "2025-1")
         phone_number = request.args.get("phone_number")
-        logger.debug(f"Triggering reminder for student_id={student_id}, term={term}, phone_number={phone_number}")
+        logger.debug("Triggering reminder for student_id=%s, term=%s, phone_number=%s", student_id, term, phone_number)
         result = send_balance_reminders(student_id, term, phone_number)
         if "error" in result:
-            logger.error(f"Error in send_balance_reminders: {result['error']}")
+            logger.error("Error in send_balance_reminders: %s", result["error"])
             return {"status": "Reminder failed", "error": result["error"]}, 400
-        logger.info(f"Balance reminder triggered for {student_id}")
+        logger.info("Balance reminder triggered for %s", student_id)
         return {"status": "Balance reminder triggered", "result": result}, 200
     except Exception as e:
-        logger.error(f"Error triggering reminders: {str(e)}")
+        logger.error("Error triggering reminders: %s", e)
         return {"error": str(e)}, 500
 
-@app.route("/update-contact", methods=["POST"])
+@bp.route("/update-contact", methods=["POST"])
 def update_contact():
     """Update or add a contact."""
     try:
@@ -89,9 +83,12 @@ def update_contact():
         if not student_id or not phone_number:
             logger.error("Missing student_id or phone_number")
             return {"error": "student_id and phone_number required"}, 400
+        normalized = normalize_phone(phone_number)
+        if not normalized:
+            logger.error("Invalid phone number for %s: %s", student_id, phone_number)
+            return {"error": f"Invalid phone number format: '{phone_number}'"}, 400
+        phone_number = normalized
         session = init_db()
-        if not phone_number.startswith("+"):
-            phone_number = f"+263{phone_number.lstrip('0')}"
         contact = session.query(StudentContact).filter_by(student_id=student_id).first()
         if contact:
             contact.firstname = firstname or contact.firstname
@@ -100,7 +97,7 @@ def update_contact():
             contact.guardian_mobile_number = phone_number if not contact.guardian_mobile_number else contact.guardian_mobile_number
             contact.preferred_phone_number = phone_number
             contact.last_updated = datetime.datetime.now(datetime.UTC)
-            logger.info(f"Updated contact for {student_id}: {phone_number}")
+            logger.info("Updated contact for %s: %s", student_id, phone_number)
         else:
             contact = StudentContact(
                 student_id=student_id,
@@ -112,16 +109,66 @@ def update_contact():
                 last_updated=datetime.datetime.now(datetime.UTC)
             )
             session.add(contact)
-            logger.info(f"Added contact for {student_id}: {phone_number}")
+            logger.info("Added contact for %s: %s", student_id, phone_number)
         session.commit()
         return {"status": "Contact updated"}, 200
     except Exception as e:
-        logger.error(f"Error updating contact for {student_id}: {str(e)}")
+        logger.error("Error updating contact for %s: %s", student_id, e)
+        return {"error": str(e)}, 500
+
+def serialize_profile(contact):
+    return {
+        "student_id": contact.student_id,
+        "firstname": contact.firstname,
+        "lastname": contact.lastname,
+        "phone_number": contact.preferred_phone_number,
+        "last_updated": contact.last_updated.isoformat()
+    }
+
+PROFILE_COLUMNS = (
+    StudentContact.student_id, StudentContact.firstname, StudentContact.lastname,
+    StudentContact.preferred_phone_number, StudentContact.last_updated
+)
+
+@bp.route("/import-contacts", methods=["POST"])
+def import_contacts_route():
+    """Stream a CSV or JSONL roster into the contacts table.
+
+    Send the file as multipart field 'file' or as the raw request body.
+    Query parameters: format (csv/jsonl, inferred from the filename if
+    omitted), dry_run (true/false) and batch_size.
+    """
+    session = None
+    try:
+        upload = request.files.get("file")
+        stream = upload.stream if upload else request.stream
+        fmt = request.args.get("format")
+        if not fmt:
+            filename = (upload.filename if upload else "") or ""
+            fmt = "jsonl" if filename.endswith((".jsonl", ".ndjson")) or "ndjson" in (request.content_type or "") else "csv"
+        dry_run = request.args.get("dry_run", "false").lower() == "true"
+        batch_size = request.args.get("batch_size", type=int)
+        session = init_db()
+        report = import_contacts(session, stream, fmt=fmt, dry_run=dry_run, batch_size=batch_size)
+        return {"status": "Import dry run complete" if dry_run else "Import complete", "report": report}, 200
+    except ValueError as e:
+        logger.error("Invalid contact import: %s", e)
+        return {"error": str(e)}, 400
+    except Exception as e:
+        logger.error("Error importing contacts: %s", e)
         return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
 
-@app.route("/get-student-profile", methods=["GET"])
+@bp.route("/get-student-profile", methods=["GET"])
 def get_student_profile():
-    """Retrieve student profile from database or SMS API."""
+    """Retrieve student profile from database or SMS API.
+
+    Database profiles carry ETag/Last-Modified from last_updated, and a
+    client whose copy is current gets an empty 304.
+    """
+    session = None
     try:
         student_id = request.args.get("student_id")
         if not student_id:
@@ -129,483 +176,241 @@ def get_student_profile():
             return {"error": "student_id required"}, 400
 
         session = init_db()
-        contact = session.query(StudentContact).filter_by(student_id=student_id).first()
+        # Only the serialized columns, by the unique student_id index
+        contact = session.query(*PROFILE_COLUMNS).filter(StudentContact.student_id == student_id).first()
         if contact:
-            logger.info(f"Found profile for {student_id} in database")
-            return {
-                "status": "success",
-                "profile": {
-                    "student_id": contact.student_id,
-                    "firstname": contact.firstname,
-                    "lastname": contact.lastname,
-                    "phone_number": contact.preferred_phone_number,
-                    "last_updated": contact.last_updated.isoformat()
-                }
-            }, 200
+            logger.info("Found profile for %s in database", student_id)
+            return conditional(validators_for(student_id, contact.last_updated), lambda: {"status": "success", "profile": serialize_profile(contact)})
 
         from src.api.sms_client import SMSClient
         try:
             client = SMSClient()
             profile = client.get_student_profile(student_id)
-            profile_data = profile.get("data", {})
-            firstname = profile_data.get("firstname")
-            lastname = profile_data.get("lastname")
-            student_mobile = profile_data.get("student_mobile")
-            guardian_mobile = profile_data.get("guardian_mobile_number")
-            if student_mobile and not student_mobile.startswith("+"):
-                student_mobile = f"+263{student_mobile.lstrip('0')}"
-            if guardian_mobile and not guardian_mobile.startswith("+"):
-                guardian_mobile = f"+263{guardian_mobile.lstrip('0')}"
-            preferred_phone = student_mobile or guardian_mobile
-            if not preferred_phone:
-                logger.error(f"No phone number in profile for {student_id}")
+            fields = contact_fields_from_profile(profile)
+            if not fields:
+                logger.error("No phone number in profile for %s", student_id)
                 return {"error": "No phone number in profile"}, 404
 
             contact = StudentContact(
                 student_id=student_id,
-                firstname=firstname,
-                lastname=lastname,
-                student_mobile=student_mobile,
-                guardian_mobile_number=guardian_mobile,
-                preferred_phone_number=preferred_phone,
-                last_updated=datetime.datetime.now(datetime.UTC)
+                last_updated=datetime.datetime.now(datetime.UTC),
+                **fields
             )
             session.add(contact)
             session.commit()
-            logger.info(f"Cached profile for {student_id} from API")
-            return {
-                "status": "success",
-                "profile": {
-                    "student_id": contact.student_id,
-                    "firstname": contact.firstname,
-                    "lastname": contact.lastname,
-                    "phone_number": contact.preferred_phone_number,
-                    "last_updated": contact.last_updated.isoformat()
-                }
-            }, 200
+            logger.info("Cached profile for %s from API", student_id)
+            return conditional(validators_for(student_id, contact.last_updated), {"status": "success", "profile": serialize_profile(contact)})
         except Exception as e:
-            logger.error(f"Error fetching profile for {student_id} from API: {str(e)}")
+            logger.error("Error fetching profile for %s from API: %s", student_id, e)
             return {"error": f"Profile not found: {str(e)}"}, 404
     except Exception as e:
-        logger.error(f"Error retrieving profile for {student_id}: {str(e)}")
+        logger.error("Error retrieving profile for %s: %s", student_id, e)
         return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
+
+@bp.route("/get-student-profiles", methods=["GET", "POST"])
+def get_student_profiles():
+    """Retrieve many student profiles in one request, paged over the requested IDs.
+
+    IDs come from a JSON body {"student_ids": [...]} or a comma-separated
+    student_ids query parameter. Only the requested page is resolved.
+    """
+    session = None
+    try:
+        payload = request.get_json(silent=True) or {}
+        student_ids = payload.get("student_ids") or request.args.get("student_ids", "").split(",")
+        student_ids = list(dict.fromkeys(str(student_id).strip() for student_id in student_ids if str(student_id).strip()))
+        if not student_ids:
+            logger.error("Missing student_ids")
+            return {"error": "student_ids required"}, 400
+
+        page = max(1, int(payload.get("page") or request.args.get("page", 1)))
+        page_size = min(max(1, int(payload.get("page_size") or request.args.get("page_size", 50))), 200)
+        page_ids = student_ids[(page - 1) * page_size:page * page_size]
 
-@app.route("/generate-gatepass", methods=["POST"])
+        session = init_db()
+        contacts, errors = get_profiles_bulk(session, page_ids)
+        logger.info("Bulk profile lookup page %s: %s found, %s errors", page, len(contacts), len(errors))
+        return {
+            "status": "success",
+            "profiles": [serialize_profile(contacts[student_id]) for student_id in page_ids if student_id in contacts],
+            "errors": errors,
+            "page": page,
+            "page_size": page_size,
+            "total": len(student_ids),
+            "next_page": page + 1 if page * page_size < len(student_ids) else None
+        }, 200
+    except ValueError as e:
+        return {"error": f"Invalid pagination: {str(e)}"}, 400
+    except Exception as e:
+        logger.error("Error retrieving profiles in bulk: %s", e)
+        return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
+
+@bp.route("/search-students", methods=["GET"])
+def search_students_route():
+    """Search contacts by student ID prefix, phone number (or its last digits) or partial name.
+
+    Query parameters: q, page (default 1) and page_size (default 20, at
+    most 100). Results are ranked best match first.
+    """
+    session = None
+    try:
+        query = request.args.get("q", "").strip()
+        if len(query) < 2:
+            logger.error("Search query too short: '%s'", query)
+            return {"error": "q must be at least 2 characters"}, 400
+        page = max(1, int(request.args.get("page", 1)))
+        page_size = min(max(1, int(request.args.get("page_size", 20))), 100)
+
+        session = init_db()
+        results, total = search_students(session, query, page, page_size)
+        logger.info("Student search returned %s of %s matches", len(results), total)
+        return {
+            "status": "success",
+            "results": results,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "next_page": page + 1 if page * page_size < total else None
+        }, 200
+    except ValueError as e:
+        return {"error": f"Invalid pagination: {str(e)}"}, 400
+    except Exception as e:
+        logger.error("Error searching students: %s", e)
+        return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
+
+@bp.route("/generate-gatepass", methods=["POST"])
 def generate_gatepass():
-    """Generate and send gate pass as a PDF with logo, signature, QR code, and watermark."""
+    """Generate and send gate pass (PDF and/or inline image) with logo, signature, QR code, and watermark."""
+    session = None
     try:
         student_id = request.args.get("student_id", "SSC20257279")
         term = request.args.get("term", "2025-1")
-        payment_amount = float(request.args.get("payment_amount", 0))
-        total_fees = float(request.args.get("total_fees", 1000))
 
         if not student_id or not term:
             logger.error("Missing student_id or term")
             return {"error": "student_id and term required"}, 400
 
+        if "payment_amount" in request.args:
+            payment_amount = float(request.args.get("payment_amount", 0))
+            total_fees = float(request.args.get("total_fees", 1000))
+        else:
+            # Without explicit amounts, use the cached financial snapshot
+            snapshot = get_financial_snapshot(student_id, term)
+            payment_amount, total_fees = snapshot["total_paid"], snapshot["total_fees"]
+
         session = init_db()
         contact = session.query(StudentContact).filter_by(student_id=student_id).first()
         if not contact:
-            logger.error(f"No contact found for {student_id}")
+            logger.error("No contact found for %s", student_id)
             return {"error": "No contact found"}, 404
 
         # Calculate payment percentage
         payment_percentage = (payment_amount / total_fees) * 100
         issued_date = datetime.datetime.now(datetime.UTC)
-        expiry_date = None
-
-        # Determine expiry date
-        if payment_percentage >= 100:
-            expiry_date = TERM_END_DATES.get(term, datetime.datetime(2025, 3, 31))
-        elif payment_percentage >= 75:
-            expiry_date = issued_date + datetime.timedelta(days=60)
-        elif payment_percentage >= 50:
-            expiry_date = issued_date + datetime.timedelta(days=30)
-        else:
-            logger.info(f"Payment {payment_percentage}% for {student_id} below 50%; no gate pass issued")
+        expiry_date = gatepass_expiry(term, payment_percentage, issued_date)
+        if expiry_date is None:
+            logger.info("Payment %s%% for %s below 50%%; no gate pass issued", payment_percentage, student_id)
             return {"status": "No gate pass issued", "reason": "Payment below 50%"}, 200
 
-        # Check existing gate pass
-        existing_pass = session.query(GatePass).filter(
-            GatePass.student_id == student_id,
-            GatePass.expiry_date >= issued_date
-        ).first()
-        if existing_pass and existing_pass.payment_percentage >= payment_percentage:
-            logger.info(f"Existing gate pass for {student_id} is valid until {existing_pass.expiry_date}")
-            return {
-                "status": "Gate pass not updated",
-                "pass_id": existing_pass.pass_id,
-                "expiry_date": existing_pass.expiry_date.isoformat(),
-                "whatsapp_number": contact.preferred_phone_number
-            }, 200
-
-        # Generate unique pass ID
-        pass_id = str(uuid.uuid4())
-
-        # Create temporary directory for PDF and QR code
-        os.makedirs("temp", exist_ok=True)
-        pdf_path = f"temp/gatepass_{pass_id}.pdf"
-        qr_path = f"temp/qr_{pass_id}.png"
-
-        # Generate QR code
-        qr_url = f"https://shining-smiles-app-809413c70177.herokuapp.com/verify-gatepass?pass_id={pass_id}&whatsapp_number={contact.preferred_phone_number}"
-        logger.debug(f"Generating QR code for URL: {qr_url}")
-        qr = qrcode.QRCode(version=1, box_size=10, border=4)
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        qr_img.save(qr_path)
-        if not os.path.exists(qr_path):
-            logger.error("QR code generation failed")
-            return {"error": "Failed to generate QR code"}, 500
-        logger.debug(f"QR code saved to {qr_path}")
-
-        # Generate PDF
-        logger.debug(f"Generating PDF at {pdf_path}")
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        bold_style = ParagraphStyle(name='Bold', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12)
-        normal_style = ParagraphStyle(name='Normal', parent=styles['Normal'], fontSize=12)
-
-        # Add watermark (faint school logo in background)
-        def add_watermark(canvas, doc):
-            canvas.saveState()
-            canvas.setFillAlpha(0.1)  # Faint opacity
-            logo_path = "static/school_logo.png"
-            if os.path.exists(logo_path):
-                canvas.drawImage(logo_path, 150, 300, width=300, height=150, preserveAspectRatio=True, mask='auto')
-            canvas.restoreState()
-
-        doc.build = lambda flowables: SimpleDocTemplate.build(doc, flowables, onFirstPage=add_watermark)
-
-        story = []
-
-        # Header: Logo and Title
-        logo_path = "static/school_logo.png"
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=2*inch, height=1*inch, kind='proportional')
-            title = Paragraph("SHINING SMILES GROUP OF SCHOOLS", ParagraphStyle(name='Title', fontName='Helvetica-Bold', fontSize=16, textColor=colors.darkblue))
-            header_table = Table([[logo, title]], colWidths=[2.5*inch, 4*inch])
-            header_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-            ]))
-            story.append(header_table)
-        else:
-            logger.warning("School logo not found at static/school_logo.png")
-            story.append(Paragraph("SHINING SMILES GROUP OF SCHOOLS", ParagraphStyle(name='Title', fontName='Helvetica-Bold', fontSize=16, textColor=colors.darkblue)))
-
-        story.append(Spacer(1, 0.5*inch))
-
-        # Information table (bold titles, values next to them)
-        data = [
-            ["Student ID:", f"{student_id}"],
-            ["Name:", f"{contact.firstname or 'N/A'} {contact.lastname or 'N/A'}"],
-            ["Pass ID:", f"{pass_id}"],
-            ["Issued:", f"{issued_date.strftime('%Y-%m-%d')}"],
-            ["Expires:", f"{expiry_date.strftime('%Y-%m-%d')}"],
-            ["Payment:", f"{payment_percentage:.1f}%"],
-            ["Valid for:", f"{contact.preferred_phone_number}"]
-        ]
-        info_table = Table(data, colWidths=[2*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 12),
-            ('FONT', (1, 0), (1, -1), 'Helvetica', 12),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.darkblue),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgoldenrodyellow),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 0.5*inch))
-
-        # QR code (centered)
-        if os.path.exists(qr_path):
-            logger.debug(f"Adding QR code from {qr_path}")
-            qr_image = Image(qr_path, width=2*inch, height=2*inch, kind='proportional')
-            qr_table = Table([[qr_image]], colWidths=[2*inch])
-            qr_table.setStyle(TableStyle([('ALIGN', (0, 0), (-1, -1), 'CENTER')]))
-            story.append(qr_table)
-        else:
-            logger.error("QR code file missing after generation")
-            return {"error": "QR code file missing"}, 500
-
-        # Signature
-        signature_path = "static/signature.png"
-        if os.path.exists(signature_path):
-            logger.debug(f"Adding signature from {signature_path}")
-            signature = Image(signature_path, width=2*inch, height=0.5*inch, kind='proportional')
-            story.append(Spacer(1, 0.25*inch))
-            story.append(Paragraph("Authorized Signature", normal_style))
-            story.append(signature)
-        else:
-            logger.warning("Signature image not found at static/signature.png")
-            story.append(Paragraph("Authorized Signature", normal_style))
-
-        doc.build(story)
-        if not os.path.exists(pdf_path):
-            logger.error("PDF generation failed")
-            return {"error": "Failed to generate PDF"}, 500
-        logger.debug(f"PDF generated at {pdf_path}")
-
-        # Upload to S3
-        s3_key = f"gatepasses/gatepass_{pass_id}.pdf"
-        s3.upload_file(pdf_path, bucket_name, s3_key, ExtraArgs={'ACL': 'public-read'})
-        public_url = f"https://{bucket_name}.s3.amazonaws.com/{s3_key}"
-        logger.debug(f"Uploaded PDF to S3: {public_url}")
-
-        # Save to database
-        gate_pass = GatePass(
-            student_id=student_id,
-            pass_id=pass_id,
-            issued_date=issued_date,
-            expiry_date=expiry_date,
-            payment_percentage=int(payment_percentage),
-            whatsapp_number=contact.preferred_phone_number,
-            last_updated=issued_date,
-            pdf_path=s3_key,
-            qr_path=qr_path
-        )
-        session.add(gate_pass)
-        session.commit()
-
-        # Send PDF via WhatsApp
-        logger.debug(f"Sending PDF to WhatsApp: {public_url}")
-        try:
-            # Test URL accessibility
-            response = requests.head(public_url, timeout=5)
-            if response.status_code != 200:
-                logger.error(f"Public URL inaccessible: {public_url}, status={response.status_code}")
-                raise Exception(f"Public URL inaccessible: status={response.status_code}")
-
-            message = twilio_client.messages.create(
-                from_=f"whatsapp:{app.config['TWILIO_WHATSAPP_NUMBER']}",
-                body="Your gate pass is attached. This pass is valid only for your WhatsApp number. Do not share.",
-                media_url=[public_url],
-                to=f"whatsapp:{contact.preferred_phone_number}",
-                status_callback=f"https://shining-smiles-app-809413c70177.herokuapp.com//message-status"
-            )
-            logger.info(f"Gate pass PDF sent for {student_id} to {contact.preferred_phone_number}: SID={message.sid}, Status={message.status}")
-
-        except Exception as e:
-            logger.error(f"Failed to send WhatsApp PDF for {student_id}: {str(e)}")
-            # Fallback to text message
-            text_message = (
-                f"Dear {contact.firstname or 'Parent'} {contact.lastname or 'Guardian'},\n"
-                f"Gate Pass for {student_id}:\n"
-                f"Pass ID: {pass_id}\n"
-                f"Issued: {issued_date.strftime('%Y-%m-%d')}\n"
-                f"Expires: {expiry_date.strftime('%Y-%m-%d')}\n"
-                f"Payment: {payment_percentage:.1f}%\n"
-                f"This pass is valid only for {contact.preferred_phone_number}. Do not share."
-            )
-            send_whatsapp_message(contact.preferred_phone_number, text_message)
-            logger.info(f"Fallback text gate pass sent for {student_id} to {contact.preferred_phone_number}")
-            return {
-                "status": "Gate pass issued",
-                "pass_id": pass_id,
-                "expiry_date": expiry_date.isoformat(),
-                "whatsapp_number": contact.preferred_phone_number
-            }, 200
-
-        return {
-            "status": "Gate pass issued",
-            "pass_id": pass_id,
-            "expiry_date": expiry_date.isoformat(),
-            "whatsapp_number": contact.preferred_phone_number
-        }, 200
+        # Concurrent requests for the same pass share one issuance
+        return issue_gatepass_once(session, contact, term, payment_percentage, issued_date, expiry_date)
     except Exception as e:
-        logger.error(f"Error generating gate pass for {student_id}: {str(e)}")
+        logger.error("Error generating gate pass for %s: %s", student_id, e)
         return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
 
-@app.route("/whatsapp-incoming", methods=["POST"])
+@bp.route("/whatsapp-incoming", methods=["POST"])
+@idempotent_webhook(twilio_message_key())
+@throttle_inbound
 def whatsapp_incoming():
     """Handle incoming WhatsApp messages."""
+    session = None
     try:
         from_number = request.form.get("From").replace("whatsapp:", "")
+        from_number = normalize_phone(from_number) or from_number
         message_body = request.form.get("Body").lower().strip()
-        logger.debug(f"Incoming WhatsApp message from {from_number}: {message_body}")
+        logger.debug("Incoming WhatsApp message from %s: %s", from_number, message_body)
 
         session = init_db()
-        contact = session.query(StudentContact).filter_by(preferred_phone_number=from_number).first()
-        response = MessagingResponse()
+        # Every student linked to this number as student, guardian or preferred contact
+        contacts = find_contacts_by_phone(session, from_number)
+        response = _twiml()
 
-        if not contact:
+        if not contacts:
             response.message("Please provide your student ID. Reply with 'ID <student_id>'.")
             return Response(str(response), mimetype="application/xml")
 
         if message_body == "get gatepass":
-            gate_pass = session.query(GatePass).filter_by(student_id=contact.student_id, whatsapp_number=from_number).order_by(GatePass.issued_date.desc()).first()
+            gate_pass = session.query(GatePass).filter(
+                GatePass.student_id.in_([contact.student_id for contact in contacts]),
+                GatePass.whatsapp_e164 == from_number
+            ).order_by(GatePass.issued_date.desc()).first()
             if not gate_pass:
-                response.message(f"No active gate pass found for {contact.student_id}.")
+                response.message(f"No active gate pass found for {', '.join(contact.student_id for contact in contacts)}.")
             else:
-                # Generate PDF for resending
-                pdf_path = f"temp/gatepass_{gate_pass.pass_id}.pdf"
-                qr_path = f"temp/qr_{gate_pass.pass_id}.png"
-                os.makedirs("temp", exist_ok=True)
-
-                # Generate QR code
-                qr_url = f"https://shining-smiles-app-809413c70177.herokuapp.com//verify-gatepass?pass_id={gate_pass.pass_id}&whatsapp_number={from_number}"
-                logger.debug(f"Generating QR code for URL: {qr_url}")
-                qr = qrcode.QRCode(version=1, box_size=10, border=4)
-                qr.add_data(qr_url)
-                qr.make(fit=True)
-                qr_img = qr.make_image(fill_color="black", back_color="white")
-                qr_img.save(qr_path)
-                if not os.path.exists(qr_path):
-                    logger.error("QR code generation failed")
-                    response.message("Error generating gate pass PDF. Please try again later.")
-                    return Response(str(response), mimetype="application/xml")
-                logger.debug(f"QR code saved to {qr_path}")
-
-                # Generate PDF
-                logger.debug(f"Generating PDF at {pdf_path}")
-                doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-                styles = getSampleStyleSheet()
-                bold_style = ParagraphStyle(name='Bold', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12)
-                normal_style = ParagraphStyle(name='Normal', parent=styles['Normal'], fontSize=12)
-
-                # Add watermark
-                def add_watermark(canvas, doc):
-                    canvas.saveState()
-                    canvas.setFillAlpha(0.1)
-                    logo_path = "static/school_logo.png"
-                    if os.path.exists(logo_path):
-                        canvas.drawImage(logo_path, 150, 300, width=300, height=150, preserveAspectRatio=True, mask='auto')
-                    canvas.restoreState()
-
-                doc.build = lambda flowables: SimpleDocTemplate.build(doc, flowables, onFirstPage=add_watermark)
-
-                story = []
-
-                # Header: Logo and Title
-                logo_path = "static/school_logo.png"
-                if os.path.exists(logo_path):
-                    logo = Image(logo_path, width=2*inch, height=1*inch, kind='proportional')
-                    title = Paragraph("SHINING SMILES GROUP OF SCHOOLS", ParagraphStyle(name='Title', fontName='Helvetica-Bold', fontSize=16, textColor=colors.darkblue))
-                    header_table = Table([[logo, title]], colWidths=[2.5*inch, 4*inch])
-                    header_table.setStyle(TableStyle([
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-                    ]))
-                    story.append(header_table)
-                else:
-                    logger.warning("School logo not found at static/school_logo.png")
-                    story.append(Paragraph("SHINING SMILES GROUP OF SCHOOLS", ParagraphStyle(name='Title', fontName='Helvetica-Bold', fontSize=16, textColor=colors.darkblue)))
-
-                story.append(Spacer(1, 0.5*inch))
-
-                # Information table
-                data = [
-                    ["Student ID:", f"{contact.student_id}"],
-                    ["Name:", f"{contact.firstname or 'N/A'} {contact.lastname or 'N/A'}"],
-                    ["Pass ID:", f"{gate_pass.pass_id}"],
-                    ["Issued:", f"{gate_pass.issued_date.strftime('%Y-%m-%d')}"],
-                    ["Expires:", f"{gate_pass.expiry_date.strftime('%Y-%m-%d')}"],
-                    ["Payment:", f"{gate_pass.payment_percentage}%"],
-                    ["Valid for:", f"{from_number}"]
-                ]
-                info_table = Table(data, colWidths=[2*inch, 4*inch])
-                info_table.setStyle(TableStyle([
-                    ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 12),
-                    ('FONT', (1, 0), (1, -1), 'Helvetica', 12),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.darkblue),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('BACKGROUND', (0, 0), (-1, -1), colors.lightgoldenrodyellow),
-                ]))
-                story.append(info_table)
-                story.append(Spacer(1, 0.5*inch))
-
-                # QR code (centered)
-                if os.path.exists(qr_path):
-                    logger.debug(f"Adding QR code from {qr_path}")
-                    qr_image = Image(qr_path, width=2*inch, height=2*inch, kind='proportional')
-                    qr_table = Table([[qr_image]], colWidths=[2*inch])
-                    qr_table.setStyle(TableStyle([('ALIGN', (0, 0), (-1, -1), 'CENTER')]))
-                    story.append(qr_table)
-                else:
-                    logger.error("QR code file missing after generation")
-                    response.message("Error generating gate pass PDF. Please try again later.")
+                contact = next(contact for contact in contacts if contact.student_id == gate_pass.student_id)
+                pass_fields = dict(
+                    pass_id=gate_pass.pass_id,
+                    student_id=contact.student_id,
+                    firstname=contact.firstname,
+                    lastname=contact.lastname,
+                    issued_date=gate_pass.issued_date,
+                    expiry_date=gate_pass.expiry_date,
+                    payment_percentage=gate_pass.payment_percentage,
+                    whatsapp_number=from_number
+                )
+                # Render the pass again for resending
+                try:
+                    stored = store_gatepass_media(pass_fields)
+                except RuntimeError as e:
+                    logger.error("Gate pass rendering failed for %s: %s", contact.student_id, e)
+                    response.message("Error generating gate pass. Please try again later.")
                     return Response(str(response), mimetype="application/xml")
 
-                # Signature
-                signature_path = "static/signature.png"
-                if os.path.exists(signature_path):
-                    logger.debug(f"Adding signature from {signature_path}")
-                    signature = Image(signature_path, width=2*inch, height=0.5*inch, kind='proportional')
-                    story.append(Spacer(1, 0.25*inch))
-                    story.append(Paragraph("Authorized Signature", normal_style))
-                    story.append(signature)
-                else:
-                    logger.warning("Signature image not found at static/signature.png")
-                    story.append(Paragraph("Authorized Signature", normal_style))
-
-                doc.build(story)
-                if not os.path.exists(pdf_path):
-                    logger.error("PDF generation failed")
-                    response.message("Error generating gate pass PDF. Please try again later.")
-                    return Response(str(response), mimetype="application/xml")
-                logger.debug(f"PDF generated at {pdf_path}")
-
-                # Upload to S3
-                s3_key = f"gatepasses/gatepass_{gate_pass.pass_id}.pdf"
-                s3.upload_file(pdf_path, bucket_name, s3_key, ExtraArgs={'ACL': 'public-read'})
-                public_url = f"https://{bucket_name}.s3.amazonaws.com/{s3_key}"
-                logger.debug(f"Uploaded PDF to S3: {public_url}")
-
-                # Update database
-                session = init_db()
-                gate_pass.pdf_path = s3_key
-                gate_pass.qr_path = qr_path
+                method, message_sids = deliver_gatepass(from_number, stored["media_urls"], gatepass_text(**pass_fields), contact.student_id)
+                # New files and message SIDs in one write
+                gate_pass.pdf_path = stored["pdf_path"]
+                gate_pass.qr_path = stored["qr_path"]
+                gate_pass.image_path = stored["image_path"]
+                record_delivery(session, gate_pass, message_sids)
                 session.commit()
-
-                # Send PDF
-                logger.debug(f"Sending PDF to WhatsApp: {public_url}")
-                try:
-                    response = requests.head(public_url, timeout=5)
-                    if response.status_code != 200:
-                        logger.error(f"Public URL inaccessible: {public_url}, status={response.status_code}")
-                        raise Exception(f"Public URL inaccessible: status={response.status_code}")
-
-                    message = twilio_client.messages.create(
-                        from_=f"whatsapp:{app.config['TWILIO_WHATSAPP_NUMBER']}",
-                        body="Your gate pass is attached. This pass is valid only for your WhatsApp number. Do not share.",
-                        media_url=[public_url],
-                        to=f"whatsapp:{from_number}",
-                        status_callback=f"https://shining-smiles-app-809413c70177.herokuapp.com//message-status"
-                    )
-                    logger.info(f"Gate pass PDF sent for {contact.student_id} to {from_number}: SID={message.sid}, Status={message.status}")
-
-                    response.message("Your gate pass has been sent as a PDF.")
-                except Exception as e:
-                    logger.error(f"Failed to send WhatsApp PDF for {contact.student_id}: {str(e)}")
-                    text_message = (
-                        f"Dear {contact.firstname or 'Parent'} {contact.lastname or 'Guardian'},\n"
-                        f"Gate Pass for {contact.student_id}:\n"
-                        f"Pass ID: {gate_pass.pass_id}\n"
-                        f"Issued: {gate_pass.issued_date.strftime('%Y-%m-%d')}\n"
-                        f"Expires: {gate_pass.expiry_date.strftime('%Y-%m-%d')}\n"
-                        f"Payment: {gate_pass.payment_percentage}%\n"
-                        f"This pass is valid only for {from_number}. Do not share."
-                    )
-                    send_whatsapp_message(from_number, text_message)
-                    logger.info(f"Fallback text gate pass sent for {contact.student_id} to {from_number}")
-                    response.message("Your gate pass has been sent as text due to an error with the PDF.")
+                if method == "media":
+                    response.message("Your gate pass has been sent.")
+                else:
+                    response.message("Your gate pass has been sent as text due to an error with the attachment.")
 
             return Response(str(response), mimetype="application/xml")
         else:
             response.message("Send 'get gatepass' to view your latest gate pass.")
         return Response(str(response), mimetype="application/xml")
     except Exception as e:
-        logger.error(f"Error handling WhatsApp message from {from_number}: {str(e)}")
-        response = MessagingResponse()
+        logger.error("Error handling WhatsApp message from %s: %s", from_number, e)
+        response = _twiml()
         response.message("An error occurred. Please try again later.")
         return Response(str(response), mimetype="application/xml")
+    finally:
+        if session is not None:
+            session.close()
 
-@app.route("/verify-gatepass", methods=["GET"])
+@bp.route("/verify-gatepass", methods=["GET"])
 def verify_gatepass():
-    """Verify a gate pass."""
+    """Verify a gate pass.
+
+    Valid passes carry ETag/Last-Modified from last_updated, and scanners
+    polling an unchanged pass get an empty 304.
+    """
+    session = None
     try:
         pass_id = request.args.get("pass_id")
         whatsapp_number = request.args.get("whatsapp_number")
@@ -614,67 +419,248 @@ def verify_gatepass():
             return {"error": "pass_id and whatsapp_number required"}, 400
 
         session = init_db()
-        gate_pass = session.query(GatePass).filter_by(pass_id=pass_id, whatsapp_number=whatsapp_number).first()
+        # '+' in the QR link may arrive decoded as a space; compare canonical numbers
+        gate_pass = session.query(
+            GatePass.student_id, GatePass.whatsapp_number, GatePass.expiry_date, GatePass.last_updated
+        ).filter(GatePass.pass_id == pass_id).first()
+        if gate_pass and normalize_phone(gate_pass.whatsapp_number) != normalize_phone(whatsapp_number):
+            gate_pass = None
         if not gate_pass:
-            logger.error(f"Invalid gate pass {pass_id} for {whatsapp_number}")
+            archived = session.query(GatePassArchive).filter_by(pass_id=pass_id).first()
+            if archived and normalize_phone(archived.whatsapp_number) == normalize_phone(whatsapp_number):
+                logger.error("Gate pass %s expired on %s and was archived", pass_id, archived.expiry_date)
+                return {"error": "Gate pass expired"}, 410
+            logger.error("Invalid gate pass %s for %s", pass_id, whatsapp_number)
             return {"error": "Invalid gate pass or WhatsApp number"}, 404
 
-        if gate_pass.expiry_date < datetime.datetime.now(datetime.UTC):
-            logger.error(f"Gate pass {pass_id} expired on {gate_pass.expiry_date}")
+        seconds_left = (as_utc(gate_pass.expiry_date) - datetime.datetime.now(datetime.UTC)).total_seconds()
+        if seconds_left < 0:
+            logger.error("Gate pass %s expired on %s", pass_id, gate_pass.expiry_date)
             return {"error": "Gate pass expired"}, 410
 
-        return {
+        # A reused response must not outlive the pass
+        validators = validators_for(
+            f"{pass_id}|{gate_pass.whatsapp_number}", gate_pass.last_updated,
+            max_age=min(config.CONDITIONAL_GET_MAX_AGE_SECONDS, int(seconds_left))
+        )
+        return conditional(validators, lambda: {
             "status": "valid",
             "student_id": gate_pass.student_id,
             "expiry_date": gate_pass.expiry_date.isoformat(),
             "whatsapp_number": gate_pass.whatsapp_number
-        }, 200
+        })
     except Exception as e:
-        logger.error(f"Error verifying gate pass {pass_id}: {str(e)}")
+        logger.error("Error verifying gate pass %s: %s", pass_id, e)
         return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
 
-@app.route("/message-status", methods=["POST"])
+@bp.route("/message-status", methods=["POST"])
+@idempotent_webhook(twilio_message_key("MessageStatus"))
 def message_status():
     """Handle Twilio status callbacks for message delivery."""
+    session = None
     try:
         message_sid = request.form.get("MessageSid")
         message_status = request.form.get("MessageStatus")
-        logger.debug(f"Message status callback: SID={message_sid}, Status={message_status}")
+        logger.debug("Message status callback: SID=%s, Status=%s", message_sid, message_status)
 
         session = init_db()
-        gate_pass = session.query(GatePass).filter(GatePass.pass_id.ilike(f'%{message_sid[-10:]}%')).first()
-        if gate_pass and message_status in ["delivered", "failed", "undelivered"]:
+        # Media is only removed once every message of the delivery (image and PDF) is final
+        gate_pass = settle_message_status(session, message_sid, message_status) if message_sid else None
+        if gate_pass:
             if gate_pass.pdf_path:
                 if gate_pass.pdf_path.startswith("temp/"):
                     if os.path.exists(gate_pass.pdf_path):
                         os.remove(gate_pass.pdf_path)
-                        logger.debug(f"Cleaned up PDF: {gate_pass.pdf_path}")
+                        logger.debug("Cleaned up PDF: %s", gate_pass.pdf_path)
                 else:
-                    s3.delete_object(Bucket=bucket_name, Key=gate_pass.pdf_path)
-                    logger.debug(f"Deleted S3 PDF: {gate_pass.pdf_path}")
+                    get_storage().delete(gate_pass.pdf_path)
+                    logger.debug("Deleted stored PDF: %s", gate_pass.pdf_path)
+            if gate_pass.image_path:
+                get_storage().delete(gate_pass.image_path)
+                logger.debug("Deleted stored image: %s", gate_pass.image_path)
             if gate_pass.qr_path and os.path.exists(gate_pass.qr_path):
                 os.remove(gate_pass.qr_path)
-                logger.debug(f"Cleaned up QR code: {gate_pass.qr_path}")
+                logger.debug("Cleaned up QR code: %s", gate_pass.qr_path)
             gate_pass.pdf_path = None
             gate_pass.qr_path = None
+            gate_pass.image_path = None
             session.commit()
-            logger.info(f"Files cleaned up for message SID={message_sid}")
+            logger.info("Files cleaned up for message SID=%s", message_sid)
 
         return Response(status=200)
     except Exception as e:
-        logger.error(f"Error in message status callback: {str(e)}")
+        logger.error("Error in message status callback: %s", e)
         return Response(status=500)
+    finally:
+        if session is not None:
+            session.close()
+
+@bp.route("/job-runs", methods=["GET"])
+def job_runs():
+    """List recent batch job runs with timing, outcome counts and throughput."""
+    session = None
+    try:
+        job_name = request.args.get("job_name")
+        limit = min(int(request.args.get("limit", 20)), 200)
+        session = init_db()
+        runs = [run_summary(run) for run in list_runs(session, job_name=job_name, limit=limit)]
+        return {"status": "success", "runs": runs}, 200
+    except Exception as e:
+        logger.error("Error listing job runs: %s", e)
+        return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
+
+@bp.route("/job-runs/<int:run_id>", methods=["GET"])
+def job_run_detail(run_id):
+    """Show a job run with its planned per-minute schedule and progress."""
+    session = None
+    try:
+        session = init_db()
+        run = session.get(JobRun, run_id)
+        if not run:
+            return {"error": "Job run not found"}, 404
+        return {"status": "success", "run": campaign_report(session, run)}, 200
+    except Exception as e:
+        logger.error("Error fetching job run %s: %s", run_id, e)
+        return {"error": str(e)}, 500
+    finally:
+        if session is not None:
+            session.close()
+
+@bp.route("/reminder-campaign/plan", methods=["GET"])
+def reminder_campaign_plan():
+    """Preview the reminder campaign schedule without sending anything."""
+    try:
+        term = request.args.get("term", config.CURRENT_TERM)
+        window_minutes = request.args.get("window_minutes", type=int)
+        per_minute = request.args.get("per_minute", type=int)
+        priority = request.args.get("priority")
+        planned = plan_reminder_campaign(term, window_minutes=window_minutes, per_minute=per_minute, priority=priority)
+        return {
+            "status": "success",
+            "recipients": len(planned),
+            "plan": [
+                {
+                    "student_id": entry["student_id"],
+                    "balance": entry["balance"],
+                    "scheduled_for": entry["scheduled_for"].isoformat() if entry["scheduled_for"] else None
+                }
+                for entry in planned
+            ]
+        }, 200
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    except Exception as e:
+        logger.error("Error planning reminder campaign: %s", e)
+        return {"error": str(e)}, 500
+
+def _payment_event_authorized(token):
+    """True if token matches PAYMENT_EVENT_SECRET; always False while the secret is unset."""
+    return bool(config.PAYMENT_EVENT_SECRET) and hmac.compare_digest(token or "", config.PAYMENT_EVENT_SECRET)
+
+@bp.route("/payment-event", methods=["POST"])
+def payment_event():
+    """Invalidate cached financial snapshots when the SMS system records a payment.
+
+    Requires X-Payment-Event-Token: <PAYMENT_EVENT_SECRET>. Accepts JSON or
+    form fields student_id (required) and term (optional; all terms when
+    omitted). With check=true the payment check (confirmation and gate
+    pass) runs immediately against fresh figures for term, or CURRENT_TERM.
+    """
+    if not config.PAYMENT_EVENT_SECRET:
+        logger.error("Payment event rejected: PAYMENT_EVENT_SECRET is not set")
+        return {"error": "Payment events are disabled"}, 403
+    if not _payment_event_authorized(request.headers.get("X-Payment-Event-Token")):
+        logger.error("Payment event rejected: missing or invalid token from %s", request.remote_addr)
+        return {"error": "Invalid payment event token"}, 401
+    try:
+        payload = request.get_json(silent=True) or request.form
+        student_id = payload.get("student_id") or request.args.get("student_id")
+        term = payload.get("term") or request.args.get("term")
+        if not student_id:
+            logger.error("Missing student_id in payment event")
+            return {"error": "student_id required"}, 400
+        invalidated = invalidate_financial_snapshot(student_id, term)
+        response = {"status": "Snapshot invalidated", "invalidated": invalidated, "cache": get_snapshot_store().stats()}
+        if str(payload.get("check") or request.args.get("check", "false")).lower() == "true":
+            response["result"] = check_new_payments(student_id, term or config.CURRENT_TERM)
+        return response, 200
+    except Exception as e:
+        logger.error("Error handling payment event: %s", e)
+        return {"error": str(e)}, 500
 
-@app.route("/temp/<path:filename>")
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics merged across workers (see METRICS_DIR)."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/throttle-metrics", methods=["GET"])
+def throttle_metrics():
+    """Inbound throttling counters for this worker."""
+    return {"status": "success", "throttle": throttle_stats()}, 200
+
+@bp.route("/files/<path:key>", methods=["GET"])
+def serve_stored_file(key):
+    """Serve a file from local storage through a signed, expiring URL."""
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        return {"error": "File not found"}, 404
+    if not storage.verify(key, request.args.get("expires"), request.args.get("signature")):
+        logger.warning("Rejected unsigned or expired file URL for %s", key)
+        return {"error": "Invalid or expired link"}, 403
+    try:
+        return send_from_directory(storage.root, key)
+    except Exception as e:
+        logger.error("Error serving stored file %s: %s", key, e)
+        return {"error": "File not found"}, 404
+
+@bp.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Download a saved profile as pstats, folded stacks (?format=folded) or a text summary (?format=text)."""
+    if not profiling.authorized(request.headers.get("X-Profile") or request.args.get("token")):
+        return {"error": "Not found"}, 404
+    fmt = request.args.get("format", "pstats")
+    path = profiling.profile_path(profile_id, fmt)
+    if path is None:
+        return {"error": f"Profile {profile_id} not found in format {fmt}"}, 404
+    if fmt == "pstats":
+        return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=f"{profile_id}.pstats")
+    return send_file(path, mimetype="text/plain")
+
+@bp.route("/temp/<path:filename>")
 def serve_temp_file(filename):
     """Serve temporary files for testing (not for production)."""
     try:
         return send_from_directory("temp", filename)
     except Exception as e:
-        logger.error(f"Error serving temp file {filename}: {str(e)}")
+        logger.error("Error serving temp file %s: %s", filename, e)
         return {"error": "File not found"}, 404
 
+def create_app(start_scheduler=None):
+    """Build the Flask app. The batch scheduler starts only when start_scheduler
+    (default: the ENABLE_SCHEDULER setting) is true."""
+    app = Flask(__name__)
+    app.config.from_object(get_config())
+    app.register_blueprint(bp)
+    instrument_app(app)
+    tracing.instrument_app(app)
+    profiling.instrument_app(app)
+    query_budget.instrument_app(app)
+    if start_scheduler is None:
+        start_scheduler = config.ENABLE_SCHEDULER
+    if start_scheduler:
+        from src.utils.scheduler import init_scheduler
+        init_scheduler()
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
-    logger.info(f"Environment variables - SMS_API_BASE_URL: {os.getenv('SMS_API_BASE_URL')}, SMS_API_KEY: {os.getenv('SMS_API_KEY')}")
-    logger.info(f"Registered routes: {[rule.rule for rule in app.url_map.iter_rules()]}")
+    logger.info("Environment variables - SMS_API_BASE_URL: %s, SMS_API_KEY: %s", os.getenv("SMS_API_BASE_URL"), os.getenv("SMS_API_KEY"))
+    logger.info("Registered routes: %s", [rule.rule for rule in app.url_map.iter_rules()])
     app.run(debug=app.config["DEBUG"], host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,72 @@
+# benchmarks/gatepass_render.py
+"""Compare render time and size of the PDF gate pass and its JPEG/WebP image variants.
+
+    python benchmarks/gatepass_render.py [--runs 10] [--max-bytes 150000] [--json]
+
+The first render of each kind is reported separately (cold: library import and
+font loading); the rest are averaged (warm).
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)  # logo and signature paths are relative to the repo root
+
+from src.services.gatepass_service import render_gatepass_pdf, render_gatepass_image
+
+def _fields():
+    issued = datetime.datetime.now(datetime.UTC)
+    return dict(
+        pass_id=str(uuid.uuid4()),
+        student_id="SSC20257279",
+        firstname="Tendai",
+        lastname="Moyo",
+        issued_date=issued,
+        expiry_date=issued + datetime.timedelta(days=60),
+        payment_percentage=75.0,
+        whatsapp_number="+263711206287"
+    )
+
+def _measure(render, runs):
+    timings, sizes = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        paths = render(_fields())
+        timings.append(time.perf_counter() - start)
+        sizes.append(os.path.getsize(paths[0]))
+        for path in paths:
+            os.remove(path)
+    return {
+        "cold_ms": round(timings[0] * 1000, 1),
+        "warm_mean_ms": round(statistics.mean(timings[1:] or timings) * 1000, 1),
+        "bytes": int(statistics.median(sizes))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-bytes", type=int, default=None, help="Image byte budget (default GATEPASS_IMAGE_MAX_BYTES)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "pdf": _measure(lambda fields: render_gatepass_pdf(**fields), args.runs),
+        "jpeg": _measure(lambda fields: [render_gatepass_image(**fields, image_format="JPEG", max_bytes=args.max_bytes)], args.runs),
+        "webp": _measure(lambda fields: [render_gatepass_image(**fields, image_format="WEBP", max_bytes=args.max_bytes)], args.runs)
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'format':<6} {'cold ms':>9} {'warm ms':>9} {'bytes':>9}")
+    for name, result in results.items():
+        print(f"{name:<6} {result['cold_ms']:>9} {result['warm_mean_ms']:>9} {result['bytes']:>9}")
+
+if __name__ == "__main__":
+    main()
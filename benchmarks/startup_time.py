@@ -0,0 +1,85 @@
+# benchmarks/startup_time.py
+"""Measure how long a fresh interpreter takes to import the app (what a gunicorn
+worker pays on boot) and check that heavy libraries stay unloaded until first use.
+
+    python benchmarks/startup_time.py [--runs 5] [--top 10] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that should only load when a gate pass is rendered or sent, or
+# when the scheduler starts
+LAZY_MODULES = ["reportlab", "qrcode", "PIL", "boto3", "twilio", "apscheduler"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print("elapsed=%%f" %% elapsed)
+print("loaded=" + ",".join(name for name in %r if name in sys.modules))
+""" % (LAZY_MODULES,)
+
+def _run(args):
+    env = dict(os.environ, ENABLE_SCHEDULER="false")
+    env.setdefault("TWILIO_ACCOUNT_SID", "AC00000000000000000000000000000000")
+    env.setdefault("TWILIO_AUTH_TOKEN", "benchmark")
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+def measure(runs):
+    timings, loaded = [], ""
+    for _ in range(runs):
+        output = dict(line.split("=", 1) for line in _run(["-c", PROBE]).stdout.splitlines() if "=" in line)
+        timings.append(float(output["elapsed"]))
+        loaded = output["loaded"]
+    return timings, [name for name in loaded.split(",") if name]
+
+def heaviest_imports(top):
+    """Modules imported directly by app.py, by cumulative import time (-X importtime)."""
+    stderr = _run(["-X", "importtime", "-c", "import app"]).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if len(name) - len(name.lstrip()) != 3 or not cumulative.strip().isdigit():
+            continue  # one level below "app"
+        totals[name.strip()] = int(cumulative) / 1000.0
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    timings, loaded = measure(args.runs)
+    result = {
+        "import_app_ms": {
+            "median": round(statistics.median(timings) * 1000, 1),
+            "min": round(min(timings) * 1000, 1),
+            "max": round(max(timings) * 1000, 1),
+            "runs": args.runs
+        },
+        "eagerly_loaded": loaded,
+        "heaviest_imports_ms": [{"module": name, "ms": round(ms, 1)} for name, ms in heaviest_imports(args.top)]
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        stats = result["import_app_ms"]
+        print(f"import app: median {stats['median']} ms (min {stats['min']}, max {stats['max']}, {stats['runs']} runs)")
+        print(f"Lazy libraries loaded at import: {', '.join(loaded) or 'none'}")
+        for entry in result["heaviest_imports_ms"]:
+            print(f"  {entry['ms']:8.1f} ms  {entry['module']}")
+    return 1 if loaded else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
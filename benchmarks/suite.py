@@ -0,0 +1,300 @@
+# benchmarks/suite.py
+"""Microbenchmarks for the gate pass, messaging and lookup hot paths.
+
+    python benchmarks/suite.py [--filter lookup] [--output results.json]
+                               [--baseline baseline.json] [--threshold 0.2]
+
+Lookups run against a seeded SQLite database (default 10,000 students and
+50,000 gate passes in data/benchmark.db, created on first use). Results are
+written as JSON; with --baseline each case's median is compared against a
+previous results file and the run exits non-zero if any case is slower by
+more than --threshold (0.2 = 20%).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)  # logo and signature paths are relative to the repo root
+
+DEFAULT_DB = "data/benchmark.db"
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown vs the baseline median")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed samples per case")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite file for the lookup cases")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--passes", type=int, default=50000)
+    parser.add_argument("--reseed", action="store_true", help="Rebuild the lookup database")
+    return parser.parse_args()
+
+ARGS = _parse_args() if __name__ == "__main__" else None
+if ARGS:
+    # Must be set before the app modules create their engine
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(ARGS.db)}"
+    os.environ.setdefault("CONTACT_SCAN_GUARD", "raise")
+
+from sqlalchemy import func, insert
+from src.utils.database import init_db, find_contacts_by_phone, StudentContact, GatePass
+from src.utils.phone import normalize_phone
+from src.utils.messages import REMINDER, render_balance_reminder, render_payment_confirmation, render_message
+from src.services.contact_service import lookup_contact, allow_contact_scans
+from src.services.gatepass_service import make_qr_image, render_gatepass_pdf
+from src.services.search_service import search_students
+
+FIRSTNAMES = [
+    "Tendai", "Chipo", "Tatenda", "Rudo", "Farai", "Nyasha", "Tinashe", "Rutendo", "Kudzai", "Tafadzwa",
+    "Blessing", "Tanaka", "Vimbai", "Takudzwa", "Shamiso", "Anesu", "Ruvimbo", "Tawanda", "Chiedza", "Munashe",
+    "Panashe", "Ropafadzo", "Tapiwa", "Simbarashe", "Fadzai", "Kundai", "Nokuthula", "Thandiwe", "Sipho", "Lindiwe"
+]
+SURNAMES = [
+    "Moyo", "Ncube", "Sibanda", "Dube", "Ndlovu", "Mpofu", "Nyathi", "Chikwanha", "Mutasa", "Chinyama",
+    "Makoni", "Zvobgo", "Mhlanga", "Gumbo", "Mlambo", "Tshuma", "Chigumba", "Marufu", "Mapfumo", "Chiweshe",
+    "Banda", "Phiri", "Mushonga", "Katsande", "Chirwa", "Mazarura", "Nyoni", "Masuku", "Shumba", "Hove"
+]
+
+def _name(index):
+    return FIRSTNAMES[index % len(FIRSTNAMES)], SURNAMES[(index * 7 // len(FIRSTNAMES)) % len(SURNAMES)]
+
+def _student_id(index):
+    return f"SSC2025{index:05d}"
+
+def _phone(index):
+    return f"+26377{index:07d}"
+
+def seed_database(students, passes, force=False):
+    """Fill the benchmark database with students and passes unless it already holds that many."""
+    session = init_db()
+    try:
+        with allow_contact_scans():
+            if not force and (session.query(func.count(StudentContact.id)).scalar() == students
+                    and session.query(func.count(GatePass.id)).scalar() == passes):
+                return False
+        session.query(GatePass).delete()
+        session.query(StudentContact).delete()
+        now = datetime.datetime.now(datetime.UTC)
+        rng = random.Random(42)
+        # Core inserts skip the ORM validators, so the E.164 columns are filled here
+        session.execute(insert(StudentContact), [
+            {
+                "student_id": _student_id(index), "firstname": _name(index)[0], "lastname": _name(index)[1],
+                "preferred_phone_number": _phone(index), "preferred_phone_e164": _phone(index),
+                "guardian_mobile_number": _phone(index), "guardian_mobile_e164": _phone(index),
+                "last_updated": now
+            }
+            for index in range(students)
+        ])
+        rows = []
+        for _ in range(passes):
+            index = rng.randrange(students)
+            issued = now - datetime.timedelta(days=rng.randrange(365))
+            rows.append({
+                "student_id": _student_id(index), "pass_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "issued_date": issued, "expiry_date": issued + datetime.timedelta(days=60),
+                "payment_percentage": rng.choice([50, 75, 100]), "whatsapp_number": _phone(index), "whatsapp_e164": _phone(index), "last_updated": now
+            })
+        session.execute(insert(GatePass), rows)
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+def _pass_fields():
+    issued = datetime.datetime.now(datetime.UTC)
+    return dict(
+        pass_id=str(uuid.uuid4()), student_id="SSC20257279", firstname="Tendai", lastname="Moyo",
+        issued_date=issued, expiry_date=issued + datetime.timedelta(days=60),
+        payment_percentage=75.0, whatsapp_number="+263711206287"
+    )
+
+def _render_pdf_once():
+    pdf_path, qr_path = render_gatepass_pdf(**_pass_fields())
+    os.remove(pdf_path)
+    if os.path.exists(qr_path):
+        os.remove(qr_path)
+
+def _cycle(values):
+    """Callable returning the next value on each call, so lookups do not hit one row only."""
+    state = {"index": 0}
+    def next_value():
+        state["index"] = (state["index"] + 1) % len(values)
+        return values[state["index"]]
+    return next_value
+
+def build_cases(students, passes):
+    """name -> zero-argument callable timed per call."""
+    rng = random.Random(7)
+    sample = [rng.randrange(students) for _ in range(1000)]
+    next_student = _cycle([_student_id(index) for index in sample])
+    next_phone = _cycle([_phone(index) for index in sample])
+    raw_phones = _cycle(["0771234567", "whatsapp:+263 77 123 4567", "263771234567", "00263771234567", "+1 (555) 010-9999"])
+    session = init_db()
+    pass_ids = _cycle([pass_id for (pass_id,) in session.query(GatePass.pass_id).filter(GatePass.id.in_([index + 1 for index in sample if index < passes]))])
+    next_id_prefix = _cycle([_student_id(index)[:-2] for index in sample])
+    next_phone_suffix = _cycle([_phone(index)[-6:] for index in sample])
+    next_name = _cycle([f"{_name(index)[0][:4]} {_name(index)[1][:3]}" for index in sample])
+    # Two letters of the first name swapped
+    next_misspelt = _cycle([f"{_name(index)[0][:2]}{_name(index)[0][3]}{_name(index)[0][2]}{_name(index)[0][4:]} {_name(index)[1]}" for index in sample])
+    entries = [{"student_id": _student_id(index), "fullname": "Tendai Moyo", "balance": 120.5, "term": "2025-1"} for index in range(3)]
+
+    def latest_pass():
+        phone = next_phone()
+        contacts = find_contacts_by_phone(session, phone)
+        return session.query(GatePass).filter(
+            GatePass.student_id.in_([contact.student_id for contact in contacts]),
+            GatePass.whatsapp_number == phone
+        ).order_by(GatePass.issued_date.desc()).first()
+
+    return {
+        "qr.generate": lambda: make_qr_image(str(uuid.uuid4()), "+263711206287"),
+        "pdf.render_warm": _render_pdf_once,
+        "phone.normalize_uncached": lambda: normalize_phone.__wrapped__(raw_phones()),
+        "phone.normalize_cached": lambda: normalize_phone(raw_phones()),
+        "lookup.contact_by_student_id": lambda: lookup_contact(next_student()),
+        "lookup.contacts_by_phone": lambda: find_contacts_by_phone(session, next_phone()),
+        "lookup.latest_pass_for_sender": latest_pass,
+        "lookup.pass_by_pass_id": lambda: session.query(GatePass).filter_by(pass_id=pass_ids()).first(),
+        "search.id_prefix": lambda: search_students(session, next_id_prefix()),
+        "search.phone_suffix": lambda: search_students(session, next_phone_suffix()),
+        "search.name_prefix": lambda: search_students(session, next_name()),
+        "search.name_misspelt": lambda: search_students(session, next_misspelt()),
+        "template.balance_reminder": lambda: render_balance_reminder("Tendai Moyo", "SSC20257279", 120.5, "2025-1"),
+        "template.payment_confirmation": lambda: render_payment_confirmation("Tendai Moyo", "SSC20257279", 300, 120.5, "2025-1"),
+        "template.combined_reminder": lambda: render_message(REMINDER, entries)
+    }
+
+def time_case(fn, repeat, min_seconds=0.2):
+    """Per-call timings in microseconds: calls are batched until a batch takes min_seconds."""
+    fn()  # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds or number >= 100000:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_seconds / elapsed) + 1))
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return _stats([sample * 1e6 for sample in samples], number)
+
+def _stats(samples_us, number):
+    return {
+        "median_us": round(statistics.median(samples_us), 3),
+        "min_us": round(min(samples_us), 3),
+        "mean_us": round(statistics.mean(samples_us), 3),
+        "stdev_us": round(statistics.stdev(samples_us), 3) if len(samples_us) > 1 else 0.0,
+        "calls_per_sample": number,
+        "samples": len(samples_us)
+    }
+
+COLD_RENDER = """
+import datetime, os, sys, time
+sys.path.append(os.getcwd())
+start = time.perf_counter()
+from src.services.gatepass_service import render_gatepass_pdf
+issued = datetime.datetime.now(datetime.UTC)
+paths = render_gatepass_pdf(
+    pass_id="cold-render", student_id="SSC20257279", firstname="Tendai", lastname="Moyo",
+    issued_date=issued, expiry_date=issued + datetime.timedelta(days=60),
+    payment_percentage=75.0, whatsapp_number="+263711206287"
+)
+print(time.perf_counter() - start)
+for path in paths:
+    if os.path.exists(path):
+        os.remove(path)
+"""
+
+def time_cold_render(repeat):
+    """First PDF render in a fresh interpreter, imports and font loading included."""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", COLD_RENDER], capture_output=True, text=True, check=True, cwd=ROOT)
+        samples.append(float(output.stdout.strip().splitlines()[-1]) * 1e6)
+    return _stats(samples, 1)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline, threshold):
+    """Per-case median ratios against a baseline; returns (rows, regressions)."""
+    rows, regressions = [], []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            rows.append((name, result["median_us"], None, None))
+            continue
+        ratio = result["median_us"] / before["median_us"] if before["median_us"] else None
+        rows.append((name, result["median_us"], before["median_us"], ratio))
+        if ratio is not None and ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def main(args):
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    started = time.perf_counter()
+    if seed_database(args.students, args.passes, force=args.reseed):
+        print(f"Seeded {args.db} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    cases = build_cases(args.students, args.passes)
+    results = {}
+    if not args.filter or args.filter in "pdf.render_cold":
+        results["pdf.render_cold"] = time_cold_render(max(3, args.repeat // 2))
+        print(f"{'pdf.render_cold':<32} {results['pdf.render_cold']['median_us']:>12.1f} us", file=sys.stderr)
+    for name, fn in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = time_case(fn, args.repeat)
+        print(f"{name:<32} {results[name]['median_us']:>12.1f} us", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "students": args.students,
+            "passes": args.passes
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            rows, regressions = compare(results, json.load(baseline_file), args.threshold)
+        print(f"\n{'case':<32} {'median us':>12} {'baseline us':>12} {'ratio':>7}", file=sys.stderr)
+        for name, current, before, ratio in rows:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<32} {current:>12.1f} {before if before is not None else '-':>12} "
+                  f"{f'{ratio:.2f}' if ratio is not None else '-':>7}{flag}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main(ARGS)
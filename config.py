@@ -9,6 +9,120 @@ class Config:
     TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    # LOG_ROTATION "external" reopens LOG_FILE after an outside tool such as
+    # logrotate moves it, so any number of gunicorn workers and shard processes
+    # can share it; "size" rotates in-process at LOG_MAX_BYTES keeping
+    # LOG_BACKUP_COUNT old files and is only safe when a single process writes
+    # the file. LOG_FORMAT "json" (one object per line) or "text"
+    LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
+    LOG_ROTATION = os.getenv("LOG_ROTATION", "external")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    # Batch job checkpointing: a running job that has not checkpointed for this
+    # long is treated as interrupted and resumed on the next trigger.
+    JOB_RUN_STALE_MINUTES = int(os.getenv("JOB_RUN_STALE_MINUTES", "15"))
+    JOB_RUN_RESUME_WINDOW_HOURS = int(os.getenv("JOB_RUN_RESUME_WINDOW_HOURS", "24"))
+    # Worker processes for batch jobs; students are partitioned by guardian phone
+    # number so siblings are coalesced within one shard
+    BATCH_SHARDS = int(os.getenv("BATCH_SHARDS", "1"))
+    # Reminder campaigns are spread over a window instead of sent in one burst;
+    # a window of 0 sends everything immediately
+    CAMPAIGN_WINDOW_MINUTES = int(os.getenv("CAMPAIGN_WINDOW_MINUTES", "120"))
+    CAMPAIGN_PER_MINUTE_QUOTA = int(os.getenv("CAMPAIGN_PER_MINUTE_QUOTA", "30"))
+    CAMPAIGN_PRIORITY = os.getenv("CAMPAIGN_PRIORITY", "balance")  # balance or student_id
+    # Combine batch messages to siblings sharing a guardian phone number
+    COALESCE_MESSAGES = os.getenv("COALESCE_MESSAGES", "true").lower() == "true"
+    COALESCE_WINDOW_SECONDS = int(os.getenv("COALESCE_WINDOW_SECONDS", "60"))
+    # Concurrent SMS API profile fetches for bulk lookups
+    PROFILE_FETCH_CONCURRENCY = int(os.getenv("PROFILE_FETCH_CONCURRENCY", "8"))
+    # Rows per transaction for roster imports
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+    # Twilio webhook retries are answered from a store keyed by MessageSid;
+    # use "database" to share it between gunicorn workers
+    IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+    # Inbound WhatsApp throttling (per worker): a token bucket per sender, where
+    # expensive commands such as "get gatepass" cost EXPENSIVE_COMMAND_COST tokens,
+    # and a cap on expensive commands running at once
+    INBOUND_RATE_PER_MINUTE = int(os.getenv("INBOUND_RATE_PER_MINUTE", "10"))
+    INBOUND_BURST = int(os.getenv("INBOUND_BURST", "5"))
+    EXPENSIVE_COMMAND_COST = int(os.getenv("EXPENSIVE_COMMAND_COST", "5"))
+    EXPENSIVE_COMMAND_CONCURRENCY = int(os.getenv("EXPENSIVE_COMMAND_CONCURRENCY", "2"))
+    # The background scheduler only starts in processes that opt in, so web
+    # workers, scripts and tests do not each run the batch jobs
+    ENABLE_SCHEDULER = os.getenv("ENABLE_SCHEDULER", "false").lower() == "true"
+    PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "https://shining-smiles-app-809413c70177.herokuapp.com").rstrip("/")
+    AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+    AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+    S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "shining-smiles-gatepasses")
+    # Point the Twilio and S3 clients at other hosts (loadtest/stub_server.py);
+    # unset in production
+    TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+    # Gate-pass storage: "s3" (presigned URLs) or "local" (files under
+    # LOCAL_STORAGE_DIR served by /files with signed URLs)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3")
+    STORAGE_URL_EXPIRY_SECONDS = int(os.getenv("STORAGE_URL_EXPIRY_SECONDS", "900"))
+    LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "data/storage")
+    STORAGE_SIGNING_KEY = os.getenv("STORAGE_SIGNING_KEY")
+    # Gate pass attachments: "pdf", "image" (inline JPEG/WebP) or "both"
+    GATEPASS_OUTPUT = os.getenv("GATEPASS_OUTPUT", "pdf")
+    GATEPASS_IMAGE_FORMAT = os.getenv("GATEPASS_IMAGE_FORMAT", "JPEG")  # JPEG or WEBP
+    GATEPASS_IMAGE_MAX_BYTES = int(os.getenv("GATEPASS_IMAGE_MAX_BYTES", "150000"))
+    # Financial snapshots (payments + statement) per student and term are cached
+    # this long, or until /payment-event invalidates them; "database" shares
+    # them between workers, "memory" is per process and capped at 60 seconds
+    FINANCIAL_SNAPSHOT_BACKEND = os.getenv("FINANCIAL_SNAPSHOT_BACKEND", "database")
+    FINANCIAL_SNAPSHOT_TTL_SECONDS = int(os.getenv("FINANCIAL_SNAPSHOT_TTL_SECONDS", "900"))
+    # /payment-event requires X-Payment-Event-Token: <PAYMENT_EVENT_SECRET>;
+    # unset = the endpoint is disabled
+    PAYMENT_EVENT_SECRET = os.getenv("PAYMENT_EVENT_SECRET")
+    # Term used by the scheduled batch jobs and by requests that do not name one
+    CURRENT_TERM = os.getenv("CURRENT_TERM", "2025-1")
+    # Metrics: each process writes its counters to METRICS_DIR so /metrics can
+    # merge all gunicorn workers (and shard processes); files of exited
+    # processes are folded into one on scrape; unset = this process only
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    METRICS_FLUSH_SECONDS = int(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+    # Tracing: spans per request/job step exported to a JSONL file ("jsonl") or
+    # an OTLP/HTTP collector ("otlp"); unset = correlation IDs only, no spans
+    TRACE_EXPORT = os.getenv("TRACE_EXPORT")
+    TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "logs/traces.jsonl")
+    TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    # Profiling: requests sent with X-Profile: <PROFILING_TOKEN> are profiled and
+    # saved under PROFILE_DIR; unset = disabled, no hooks installed
+    PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+    PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_SECONDS", "0.005"))
+    PROFILE_SHARDS = os.getenv("PROFILE_SHARDS", "false").lower() == "true"  # set by scripts/run_batch_job.py --profile
+    # Unfiltered SELECTs over student_contacts: "warn" logs them, "raise"
+    # fails them (use in development and CI), "off" skips the check
+    CONTACT_SCAN_GUARD = os.getenv("CONTACT_SCAN_GUARD", "warn")
+    # Query budgets: requests or batch items running more statements than this
+    # are logged with their top queries, as is any statement repeated
+    # QUERY_REPEAT_THRESHOLD times with different parameters (likely N+1)
+    QUERY_BUDGET_PER_REQUEST = int(os.getenv("QUERY_BUDGET_PER_REQUEST", "20"))
+    QUERY_BUDGET_PER_JOB_ITEM = int(os.getenv("QUERY_BUDGET_PER_JOB_ITEM", "10"))
+    QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+    # Conditional GET on /get-student-profile and /verify-gatepass: responses
+    # carry ETag/Last-Modified and unchanged data is answered with 304; 0 means
+    # clients revalidate every time, N lets them reuse a response for N seconds
+    CONDITIONAL_GET_MAX_AGE_SECONDS = int(os.getenv("CONDITIONAL_GET_MAX_AGE_SECONDS", "0"))
+    # Student search: Postgres uses pg_trgm indexes when the extension is
+    # installed, otherwise each process keeps an in-memory index refreshed at
+    # most every SEARCH_INDEX_REFRESH_SECONDS. SEARCH_NAME_SIMILARITY matches
+    # pg_trgm's default similarity threshold; SEARCH_MAX_RESULTS caps matches
+    SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "30"))
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "200"))
+    SEARCH_MIN_PHONE_DIGITS = int(os.getenv("SEARCH_MIN_PHONE_DIGITS", "4"))
+    SEARCH_NAME_SIMILARITY = float(os.getenv("SEARCH_NAME_SIMILARITY", "0.3"))
+    # Daily sweeper: expired passes older than the grace period move to
+    # gate_pass_archive in batches; temp/ is kept under a size budget
+    SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "500"))
+    GATEPASS_ARCHIVE_GRACE_DAYS = int(os.getenv("GATEPASS_ARCHIVE_GRACE_DAYS", "7"))
+    TEMP_DIR_MAX_MB = int(os.getenv("TEMP_DIR_MAX_MB", "200"))
+    TEMP_FILE_MAX_AGE_HOURS = int(os.getenv("TEMP_FILE_MAX_AGE_HOURS", "24"))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -0,0 +1,209 @@
+# loadtest/driver.py
+"""Replay realistic traffic mixes against a running app and report latency per endpoint.
+
+    python loadtest/driver.py --target http://localhost:5000 --scenario verify_burst
+                              [--duration 60] [--concurrency 20] [--students 200]
+                              [--json results.json]
+
+Run the app against loadtest/stub_server.py (see its docstring for the
+environment), with PUBLIC_BASE_URL pointing at the app so the Twilio
+status callbacks come back to /message-status. Setup seeds --students
+contacts through /update-contact and one gate pass each through
+/generate-gatepass; the scenarios then run for --duration seconds:
+
+    monday_reminders  POST /trigger-reminders for every student, plus the
+                      callbacks and a few parents asking for their pass
+    verify_burst      GET /verify-gatepass at the school gate in the morning
+    gatepass_flood    POST /whatsapp-incoming "get gatepass" from many parents
+    mixed             all of the above in proportion
+
+Throughput and p50/p95/p99 latency are reported per endpoint; TwiML
+replies from the inbound throttle are counted separately from errors.
+"""
+import argparse
+import collections
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+# Share of requests per endpoint in each scenario
+SCENARIOS = {
+    "monday_reminders": {"trigger_reminders": 0.85, "whatsapp_get_gatepass": 0.1, "verify_gatepass": 0.05},
+    "verify_burst": {"verify_gatepass": 0.95, "whatsapp_get_gatepass": 0.05},
+    "gatepass_flood": {"whatsapp_get_gatepass": 0.8, "whatsapp_other": 0.15, "verify_gatepass": 0.05},
+    "mixed": {"verify_gatepass": 0.5, "whatsapp_get_gatepass": 0.25, "trigger_reminders": 0.2, "whatsapp_other": 0.05}
+}
+
+THROTTLED_REPLIES = ("sending messages too quickly", "busy preparing gate passes")
+
+class Student:
+    def __init__(self, index):
+        self.student_id = f"SSC2025{index:05d}"
+        self.phone_number = f"+26378{index:07d}"
+        self.pass_id = None
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by the worker threads."""
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.outcomes = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, outcome):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.outcomes[endpoint][outcome] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            rows[endpoint] = {
+                "requests": len(ordered),
+                "throughput_rps": round(len(ordered) / elapsed, 2),
+                "p50_ms": round(_percentile(ordered, 50) * 1000, 1),
+                "p95_ms": round(_percentile(ordered, 95) * 1000, 1),
+                "p99_ms": round(_percentile(ordered, 99) * 1000, 1),
+                "mean_ms": round(statistics.mean(ordered) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+                "outcomes": dict(self.outcomes[endpoint])
+            }
+        return rows
+
+def _percentile(ordered, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def _outcome(response):
+    if response.status_code >= 500:
+        return "error"
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if response.headers.get("Content-Type", "").startswith("application/xml"):
+        text = response.text
+        if any(reply in text for reply in THROTTLED_REPLIES):
+            return "throttled"
+        if "An error occurred" in text or "Error generating" in text:
+            return "error"
+    return "ok"
+
+def _call(http, recorder, endpoint, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = http.request(method, url, timeout=60, **kwargs)
+        outcome = _outcome(response)
+    except requests.RequestException:
+        response, outcome = None, "connection_error"
+    recorder.record(endpoint, time.perf_counter() - start, outcome)
+    return response
+
+def _requests(target, student, term):
+    """endpoint -> (method, url, kwargs) for one student."""
+    whatsapp = {"From": f"whatsapp:{student.phone_number}", "To": "whatsapp:+14155238886"}
+    return {
+        "trigger_reminders": ("POST", f"{target}/trigger-reminders", {"params": {"student_id_number": student.student_id, "term": term, "phone_number": student.phone_number}}),
+        "verify_gatepass": ("GET", f"{target}/verify-gatepass", {"params": {"pass_id": student.pass_id, "whatsapp_number": student.phone_number}}),
+        "whatsapp_get_gatepass": ("POST", f"{target}/whatsapp-incoming", {"data": {**whatsapp, "Body": "get gatepass", "MessageSid": f"SM{uuid.uuid4().hex}"}}),
+        "whatsapp_other": ("POST", f"{target}/whatsapp-incoming", {"data": {**whatsapp, "Body": "hello", "MessageSid": f"SM{uuid.uuid4().hex}"}})
+    }
+
+def setup(target, students, term, concurrency):
+    """Create a contact and a gate pass per student through the app's own endpoints."""
+    recorder = Recorder()
+    queue = list(students)
+    lock = threading.Lock()
+
+    def worker():
+        http = requests.Session()
+        while True:
+            with lock:
+                if not queue:
+                    return
+                student = queue.pop()
+            _call(http, recorder, "setup.update_contact", "POST", f"{target}/update-contact", params={
+                "student_id": student.student_id, "phone_number": student.phone_number, "firstname": "Load", "lastname": student.student_id
+            })
+            response = _call(http, recorder, "setup.generate_gatepass", "POST", f"{target}/generate-gatepass", params={
+                "student_id": student.student_id, "term": term, "payment_amount": 750, "total_fees": 1000
+            })
+            if response is not None and response.ok:
+                student.pass_id = response.json().get("pass_id")
+
+    started = time.perf_counter()
+    # One student first, so a fresh database is created before the workers race for it
+    queue, rest = queue[:1], queue[1:]
+    worker()
+    queue.extend(rest)
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - started)
+
+def run(target, students, mix, duration, concurrency, term, seed):
+    """Issue requests drawn from mix with concurrency workers for duration seconds."""
+    recorder = Recorder()
+    endpoints, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+    with_pass = [student for student in students if student.pass_id]
+
+    def worker(worker_index):
+        rng = random.Random(seed + worker_index)
+        http = requests.Session()
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            pool = with_pass if endpoint == "verify_gatepass" and with_pass else students
+            method, url, kwargs = _requests(target, rng.choice(pool), term)[endpoint]
+            _call(http, recorder, endpoint, method, url, **kwargs)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - started)
+
+def print_table(title, rows):
+    print(f"\n{title}", file=sys.stderr)
+    print(f"{'endpoint':<28} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  outcomes", file=sys.stderr)
+    for endpoint, row in rows.items():
+        outcomes = ", ".join(f"{name}={count}" for name, count in sorted(row["outcomes"].items()))
+        print(f"{endpoint:<28} {row['requests']:>7} {row['throughput_rps']:>8.1f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}  {outcomes}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="http://localhost:5000", help="Base URL of the app under test")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run the scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--students", type=int, default=200, help="Students (and parents) to simulate")
+    parser.add_argument("--term", default="2025-1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-setup", action="store_true", help="Reuse contacts and passes from an earlier run (verify requests will 404)")
+    parser.add_argument("--json", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    target = args.target.rstrip("/")
+    students = [Student(index) for index in range(args.students)]
+    report = {"scenario": args.scenario, "target": target, "duration": args.duration, "concurrency": args.concurrency, "students": args.students}
+    if not args.skip_setup:
+        report["setup"] = setup(target, students, args.term, args.concurrency)
+        print_table("setup", report["setup"])
+    report["results"] = run(target, students, SCENARIOS[args.scenario], args.duration, args.concurrency, args.term, args.seed)
+    print_table(args.scenario, report["results"])
+    if args.json:
+        with open(args.json, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
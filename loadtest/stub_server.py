@@ -0,0 +1,268 @@
+# loadtest/stub_server.py
+"""Local stand-ins for the SMS API, the Twilio Messages API and S3, for load tests.
+
+    python loadtest/stub_server.py [--latency sms=80,twilio=150,s3=30]
+                                   [--jitter 0.5] [--errors twilio=0.02]
+
+Each service listens on its own port (defaults 8101, 8102, 8103). Point the
+app at them with:
+
+    SMS_API_BASE_URL=http://localhost:8101 SMS_API_KEY=stub
+    TWILIO_API_BASE_URL=http://localhost:8102
+    S3_ENDPOINT_URL=http://localhost:8103 AWS_ACCESS_KEY_ID=stub AWS_SECRET_ACCESS_KEY=stub
+
+Latency is the mean added per request in ms (spread by +/- jitter as a
+fraction); errors is the fraction of requests answered with a 5xx. Both
+can be changed while running with POST /_stub/config on any port, e.g.
+{"twilio": {"error_rate": 0.1}}; GET /_stub/stats returns request counts.
+Twilio status callbacks (sent, then delivered or failed) are posted to
+each message's StatusCallback URL after --callback-delay seconds.
+"""
+import argparse
+import collections
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+import requests
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+SERVICES = ("sms", "twilio", "s3")
+
+settings = {service: {"latency_ms": 0.0, "jitter": 0.5, "error_rate": 0.0} for service in SERVICES}
+settings["twilio"]["callback_delay"] = 1.0
+stats = collections.Counter()
+_stats_lock = threading.Lock()
+
+def _inject(service, operation):
+    """Apply configured latency; return an error status to send instead, or None."""
+    config = settings[service]
+    with _stats_lock:
+        stats[f"{service}.{operation}"] += 1
+    if config["latency_ms"]:
+        spread = config["latency_ms"] * config["jitter"]
+        time.sleep(max(0.0, random.uniform(config["latency_ms"] - spread, config["latency_ms"] + spread)) / 1000)
+    if config["error_rate"] and random.random() < config["error_rate"]:
+        with _stats_lock:
+            stats[f"{service}.{operation}.injected_error"] += 1
+        return random.choice([500, 502, 503])
+    return None
+
+def _add_control_routes(app):
+    @app.route("/_stub/config", methods=["GET", "POST"])
+    def stub_config():
+        for service, values in (request.get_json(silent=True) or {}).items():
+            if service in settings:
+                settings[service].update({key: float(value) for key, value in values.items() if key in settings[service]})
+        return jsonify(settings)
+
+    @app.route("/_stub/stats", methods=["GET"])
+    def stub_stats():
+        with _stats_lock:
+            return jsonify(dict(stats))
+
+# SMS API: deterministic data derived from the student number
+
+def _student_number(student_id):
+    return int(hashlib.sha256(student_id.encode()).hexdigest()[:8], 16)
+
+def _student_phone(student_id):
+    return f"+26377{_student_number(student_id) % 10000000:07d}"
+
+def _student_fees(student_id):
+    number = _student_number(student_id)
+    total_fees = 1000.0
+    paid = [150.0 * (1 + (number >> shift) % 3) for shift in range(number % 4)]
+    return total_fees, paid
+
+sms_app = Flask("sms_stub")
+_add_control_routes(sms_app)
+
+@sms_app.route("/student/account-statement/", methods=["GET"])
+def account_statement():
+    error = _inject("sms", "account_statement")
+    if error:
+        return {"detail": "Injected error"}, error
+    student_id = request.args.get("student_id_number", "")
+    total_fees, paid = _student_fees(student_id)
+    return {"data": {"student_id_number": student_id, "total_fees": total_fees, "balance": total_fees - sum(paid)}}
+
+@sms_app.route("/student/payments/", methods=["GET"])
+def payments():
+    error = _inject("sms", "payments")
+    if error:
+        return {"detail": "Injected error"}, error
+    student_id = request.args.get("student_id_number", "")
+    _, paid = _student_fees(student_id)
+    if not paid:
+        return {"detail": "Not found"}, 404
+    return {"data": [{"amount": amount, "receipt_number": f"R{index}"} for index, amount in enumerate(paid)]}
+
+@sms_app.route("/students/accounts-in-debt/", methods=["GET"])
+def accounts_in_debt():
+    error = _inject("sms", "accounts_in_debt")
+    if error:
+        return {"detail": "Injected error"}, error
+    count = int(settings["sms"].get("debtors", 500))
+    return {"data": [{"student": {"student_number": f"SSC2025{index:05d}"}} for index in range(count)]}
+
+@sms_app.route("/student-profile/", methods=["GET"])
+def student_profile():
+    error = _inject("sms", "student_profile")
+    if error:
+        return {"detail": "Injected error"}, error
+    student_id = request.args.get("student_id_number", "")
+    return {"data": {
+        "student_id_number": student_id,
+        "firstname": "Tendai",
+        "lastname": f"Moyo{_student_number(student_id) % 1000}",
+        "student_mobile": _student_phone(student_id),
+        "guardian_mobile_number": _student_phone(student_id)
+    }}
+
+# Twilio Messages API
+
+twilio_app = Flask("twilio_stub")
+_add_control_routes(twilio_app)
+
+def _send_status_callbacks(url, message_sid, fail):
+    for status in ("sent", "failed" if fail else "delivered"):
+        time.sleep(settings["twilio"]["callback_delay"])
+        try:
+            requests.post(url, data={"MessageSid": message_sid, "MessageStatus": status}, timeout=10)
+            with _stats_lock:
+                stats[f"twilio.callback.{status}"] += 1
+        except requests.RequestException:
+            with _stats_lock:
+                stats["twilio.callback.unreachable"] += 1
+
+@twilio_app.route("/2010-04-01/Accounts/<account_sid>/Messages.json", methods=["POST"])
+def create_message(account_sid):
+    error = _inject("twilio", "messages.create")
+    if error:
+        return {"code": 20500, "message": "Injected error", "more_info": "https://www.twilio.com/docs/errors/20500", "status": error}, error
+    message_sid = f"SM{secrets.token_hex(16)}"
+    media = request.form.getlist("MediaUrl")
+    callback = request.form.get("StatusCallback")
+    if callback:
+        fail = random.random() < settings["twilio"].get("delivery_failure_rate", 0.0)
+        threading.Thread(target=_send_status_callbacks, args=(callback, message_sid, fail), daemon=True).start()
+    now = time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime())
+    return {
+        "sid": message_sid,
+        "account_sid": account_sid,
+        "to": request.form.get("To"),
+        "from": request.form.get("From"),
+        "body": request.form.get("Body", ""),
+        "status": "queued",
+        "num_media": str(len(media)),
+        "num_segments": "1",
+        "direction": "outbound-api",
+        "date_created": now,
+        "date_updated": now,
+        "uri": f"/2010-04-01/Accounts/{account_sid}/Messages/{message_sid}.json"
+    }, 201
+
+# S3 (path-style addressing; objects kept in memory)
+
+s3_app = Flask("s3_stub")
+_add_control_routes(s3_app)
+_objects = {}
+_objects_lock = threading.Lock()
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+def _s3_error(status):
+    body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>InternalError</Code><Message>Injected error</Message></Error>'
+    return Response(body, status=status, mimetype="application/xml")
+
+@s3_app.route("/<bucket>", methods=["POST"])
+def delete_objects(bucket):
+    error = _inject("s3", "delete_objects")
+    if error:
+        return _s3_error(error)
+    root = ElementTree.fromstring(request.get_data())
+    keys = [element.text for element in root.iter() if element.tag.endswith("Key")]
+    with _objects_lock:
+        for key in keys:
+            _objects.pop((bucket, key), None)
+    deleted = "".join(f"<Deleted><Key>{key}</Key></Deleted>" for key in keys)
+    return Response(f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="{S3_NAMESPACE}">{deleted}</DeleteResult>', mimetype="application/xml")
+
+@s3_app.route("/<bucket>/<path:key>", methods=["PUT", "GET", "HEAD", "DELETE"])
+def s3_object(bucket, key):
+    error = _inject("s3", request.method.lower())
+    if error:
+        return _s3_error(error)
+    if request.method == "PUT":
+        data = request.get_data()
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with _objects_lock:
+            _objects[(bucket, key)] = (data, request.content_type or "application/octet-stream", etag)
+        return Response(status=200, headers={"ETag": etag})
+    if request.method == "DELETE":
+        with _objects_lock:
+            _objects.pop((bucket, key), None)
+        return Response(status=204)
+    with _objects_lock:
+        stored = _objects.get((bucket, key))
+    if stored is None:
+        return Response(f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey</Code><Key>{key}</Key></Error>', status=404, mimetype="application/xml")
+    data, content_type, etag = stored
+    return Response(b"" if request.method == "HEAD" else data, mimetype=content_type, headers={"ETag": etag, "Content-Length": str(len(data))})
+
+def _parse_pairs(text, cast=float):
+    pairs = {}
+    for item in filter(None, (text or "").split(",")):
+        service, value = item.split("=")
+        if service not in SERVICES:
+            raise SystemExit(f"Unknown service '{service}'; expected one of {', '.join(SERVICES)}")
+        pairs[service] = cast(value)
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--sms-port", type=int, default=8101)
+    parser.add_argument("--twilio-port", type=int, default=8102)
+    parser.add_argument("--s3-port", type=int, default=8103)
+    parser.add_argument("--latency", help="Mean added latency in ms per service, e.g. sms=80,twilio=150")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency spread as a fraction of the mean")
+    parser.add_argument("--errors", help="Injected 5xx rate per service, e.g. twilio=0.02")
+    parser.add_argument("--callback-delay", type=float, default=1.0, help="Seconds between Twilio status callbacks")
+    parser.add_argument("--debtors", type=int, default=500, help="Students returned by /students/accounts-in-debt/")
+    args = parser.parse_args()
+
+    for service in SERVICES:
+        settings[service]["jitter"] = args.jitter
+    for service, value in _parse_pairs(args.latency).items():
+        settings[service]["latency_ms"] = value
+    for service, value in _parse_pairs(args.errors).items():
+        settings[service]["error_rate"] = value
+    settings["twilio"]["callback_delay"] = args.callback_delay
+    settings["sms"]["debtors"] = args.debtors
+
+    servers = [
+        make_server(args.host, args.sms_port, sms_app, threaded=True),
+        make_server(args.host, args.twilio_port, twilio_app, threaded=True),
+        make_server(args.host, args.s3_port, s3_app, threaded=True)
+    ]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(json.dumps({
+        "sms": f"http://{args.host}:{args.sms_port}",
+        "twilio": f"http://{args.host}:{args.twilio_port}",
+        "s3": f"http://{args.host}:{args.s3_port}",
+        "settings": settings
+    }, indent=2), flush=True)
+    try:
+        servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
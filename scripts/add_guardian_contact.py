@@ -5,6 +5,7 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.utils.database import init_db, StudentContact
+from src.utils.phone import normalize_phone
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -13,19 +14,22 @@ def add_guardian_contact(student_id, phone_number):
     """Manually add or update a guardian phone number."""
     try:
         session = init_db()
-        if not phone_number.startswith("+"):
-            phone_number = f"+263{phone_number.lstrip('0')}"
+        normalized = normalize_phone(phone_number)
+        if not normalized:
+            raise ValueError(f"Invalid phone number format: '{phone_number}'")
+        phone_number = normalized
         contact = session.query(StudentContact).filter_by(student_id=student_id).first()
         if contact:
-            contact.phone_number = phone_number
-            logger.info(f"Updated phone number for {student_id}: {phone_number}")
+            contact.guardian_mobile_number = phone_number
+            contact.preferred_phone_number = phone_number
+            logger.info("Updated phone number for %s: %s", student_id, phone_number)
         else:
-            contact = StudentContact(student_id=student_id, phone_number=phone_number)
+            contact = StudentContact(student_id=student_id, guardian_mobile_number=phone_number, preferred_phone_number=phone_number)
             session.add(contact)
-            logger.info(f"Added phone number for {student_id}: {phone_number}")
+            logger.info("Added phone number for %s: %s", student_id, phone_number)
         session.commit()
     except Exception as e:
-        logger.error(f"Error adding contact for {student_id}: {str(e)}")
+        logger.error("Error adding contact for %s: %s", student_id, e)
         raise
 
 if __name__ == "__main__":
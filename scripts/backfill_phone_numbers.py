@@ -0,0 +1,14 @@
+# scripts/backfill_phone_numbers.py
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.database import init_db, backfill_normalized_phones
+
+def backfill_phone_numbers():
+    session = init_db()
+    updated = backfill_normalized_phones(session)
+    print(f"✅ Normalized phone numbers for {updated} contacts and gate passes")
+
+if __name__ == "__main__":
+    backfill_phone_numbers()
@@ -4,12 +4,14 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.utils.database import init_db, StudentContact
+from src.services.contact_service import allow_contact_scans
 
 def check_contacts():
     session = init_db()
-    contacts = session.query(StudentContact).all()
+    with allow_contact_scans():
+        contacts = session.query(StudentContact).all()
     for contact in contacts:
-        print(f"Student ID: {contact.student_id}, Phone: {contact.phone_number}")
+        print(f"Student ID: {contact.student_id}, Phone: {contact.preferred_phone_number}, Guardian: {contact.guardian_mobile_number}")
 
 if __name__ == "__main__":
     check_contacts()
\ No newline at end of file
@@ -0,0 +1,32 @@
+# scripts/import_contacts.py
+import os
+import sys
+import argparse
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.database import init_db
+from src.services.contact_import_service import import_contacts
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV or JSONL roster export into student_contacts.")
+    parser.add_argument("path", help="Roster file (.csv, .jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    parser.add_argument("--batch-size", type=int, help="Rows per transaction")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    session = init_db()
+    with open(args.path, "rb") as stream:
+        report = import_contacts(session, stream, fmt=fmt, dry_run=args.dry_run, batch_size=args.batch_size)
+    print(f"Rows: {report['rows']}, inserted: {report['inserted']}, updated: {report['updated']}, errors: {report['error_count']}{' (dry run)' if args.dry_run else ''}")
+    for error in report["errors"]:
+        print(f"  line {error['line']} ({error['student_id']}): {error['error']}")
+    return 1 if report["error_count"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
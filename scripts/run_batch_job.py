@@ -0,0 +1,27 @@
+# scripts/run_batch_job.py
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a batch job now, optionally under the profiler.")
+    parser.add_argument("job", choices=["send_all_reminders", "check_all_payments"])
+    parser.add_argument("--term", help="Term to run for (default CURRENT_TERM)")
+    parser.add_argument("--shards", type=int, help="Worker processes (default BATCH_SHARDS)")
+    parser.add_argument("--profile", action="store_true", help="Save pstats/folded profiles under PROFILE_DIR (one per shard process with --shards > 1)")
+    args = parser.parse_args()
+
+    if args.profile:
+        # Read by spawned shard processes when they load config
+        os.environ["PROFILE_SHARDS"] = "true"
+
+    from src.utils.scheduler import BATCH_JOBS
+    from src.utils.profiling import profiled
+
+    with profiled(f"{args.job} (scripts/run_batch_job.py)", enabled=args.profile) as profile:
+        summary = BATCH_JOBS[args.job](shards=args.shards, term=args.term)
+    if profile is not None:
+        summary = dict(summary or {}, profile_id=profile.profile_id)
+    print(json.dumps(summary, indent=2, default=str))
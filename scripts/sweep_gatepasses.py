@@ -0,0 +1,14 @@
+# scripts/sweep_gatepasses.py
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.services.gatepass_cleanup_service import sweep_gatepasses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive expired gate passes and purge stale temp files.")
+    parser.add_argument("--batch-size", type=int, help="Passes archived per transaction (default SWEEP_BATCH_SIZE)")
+    args = parser.parse_args()
+    print(json.dumps(sweep_gatepasses(batch_size=args.batch_size), indent=2))
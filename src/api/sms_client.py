@@ -1,6 +1,7 @@
 import requests
 import json
 from src.utils.logger import setup_logger
+from src.utils.metrics import timed
 from config import get_config
 
 config = get_config()
@@ -11,7 +12,7 @@ class SMSClient:
     def __init__(self):
         self.base_url = config.SMS_API_BASE_URL
         self.api_key = config.SMS_API_KEY
-        logger.info(f"Initializing SMSClient with base_url: {self.base_url}, api_key: {self.api_key}")
+        logger.debug("Initializing SMSClient with base_url: %s", self.base_url)
         if not self.base_url:
             logger.error("SMS_API_BASE_URL not set")
             raise ValueError("SMS_API_BASE_URL environment variable is required")
@@ -29,61 +30,65 @@ class SMSClient:
         try:
             return response.json()
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {str(e)}. Raw response: {response.text}")
+            logger.error("Failed to parse JSON response: %s. Raw response: %s", e, response.text)
             return {"error": "Invalid JSON response", "raw": response.text}
 
+    @timed("sms_api_request", method="get_student_account_statement")
     def get_student_account_statement(self, student_id, term):
         """Fetch student account statement."""
         try:
             params = {"student_id_number": student_id, "term": term}
             url = f"{self.base_url}/student/account-statement/"
-            logger.debug(f"Requesting account statement: {url} | Params: {params} | Headers: {self.headers}")
+            logger.debug("Requesting account statement: %s | Params: %s | Headers: %s", url, params, self.headers)
             response = requests.get(url, headers=self.headers, params=params, timeout=30, verify=False)
-            logger.debug(f"Response [{response.status_code}]: {response.text}")
+            logger.debug("Response [%s]: %s", response.status_code, response.text)
             response.raise_for_status()
             return self.safe_json_response(response)
         except requests.RequestException as e:
-            logger.error(f"Error fetching account statement: {str(e)}, Response: {e.response.text if e.response else 'No response'}")
+            logger.error("Error fetching account statement: %s, Response: %s", e, e.response.text if e.response else "No response")
             raise
 
+    @timed("sms_api_request", method="get_student_payments")
     def get_student_payments(self, student_id, term):
         """Fetch student payment data."""
         try:
             params = {"student_id_number": student_id, "term": term}
             url = f"{self.base_url}/student/payments/"
-            logger.debug(f"Requesting payments: {url} | Params: {params} | Headers: {self.headers}")
+            logger.debug("Requesting payments: %s | Params: %s | Headers: %s", url, params, self.headers)
             response = requests.get(url, headers=self.headers, params=params, timeout=30, verify=False)
-            logger.debug(f"Payment Response [{response.status_code}]: {response.text}")
+            logger.debug("Payment Response [%s]: %s", response.status_code, response.text)
             response.raise_for_status()
             return self.safe_json_response(response)
         except requests.RequestException as e:
-            logger.error(f"Error fetching payments: {str(e)}, Response: {e.response.text if e.response else 'No response'}")
+            logger.error("Error fetching payments: %s, Response: %s", e, e.response.text if e.response else "No response")
             raise
 
+    @timed("sms_api_request", method="get_students_in_debt")
     def get_students_in_debt(self, student_id=None):
         """Fetch students with outstanding balances."""
         try:
             params = {"student_id_number": student_id} if student_id else {}
             url = f"{self.base_url}/students/accounts-in-debt/"
-            logger.debug(f"Requesting debt data: {url} | Params: {params} | Headers: {self.headers}")
+            logger.debug("Requesting debt data: %s | Params: %s | Headers: %s", url, params, self.headers)
             response = requests.get(url, headers=self.headers, params=params, timeout=30, verify=False)
-            logger.debug(f"Debt Response [{response.status_code}]: {response.text}")
+            logger.debug("Debt Response [%s]: %s", response.status_code, response.text)
             response.raise_for_status()
             return self.safe_json_response(response)
         except requests.RequestException as e:
-            logger.error(f"Error fetching debt data: {str(e)}, Response: {e.response.text if e.response else 'No response'}")
+            logger.error("Error fetching debt data: %s, Response: %s", e, e.response.text if e.response else "No response")
             raise
 
+    @timed("sms_api_request", method="get_student_profile")
     def get_student_profile(self, student_id):
         """Fetch student profile."""
         try:
             params = {"student_id_number": student_id}
             url = f"{self.base_url}/student-profile/"
-            logger.debug(f"Requesting profile: {url} | Params: {params} | Headers: {self.headers}")
+            logger.debug("Requesting profile: %s | Params: %s | Headers: %s", url, params, self.headers)
             response = requests.get(url, headers=self.headers, params=params, timeout=30, verify=False)
-            logger.debug(f"Profile Response [{response.status_code}]: {response.text}")
+            logger.debug("Profile Response [%s]: %s", response.status_code, response.text)
             response.raise_for_status()
             return self.safe_json_response(response)
         except requests.RequestException as e:
-            logger.error(f"Error fetching profile: {str(e)}, Response: {e.response.text if e.response else 'No response'}")
+            logger.error("Error fetching profile: %s, Response: %s", e, e.response.text if e.response else "No response")
             raise
@@ -0,0 +1,133 @@
+# src/services/campaign_service.py
+from src.api.sms_client import SMSClient
+from src.services.job_run_service import as_utc, run_summary
+from src.utils.database import init_db, JobRunItem, StudentContact
+from src.utils.logger import setup_logger
+from config import get_config
+import datetime
+import math
+
+config = get_config()
+logger = setup_logger(__name__)
+
+PRIORITIES = {
+    # Largest outstanding balance first; ties broken by student ID for a stable plan
+    "balance": lambda recipient: (-recipient["balance"], recipient["student_id"]),
+    "student_id": lambda recipient: recipient["student_id"]
+}
+
+def _now():
+    return datetime.datetime.now(datetime.UTC)
+
+def phone_numbers_for(session, student_ids, chunk_size=500):
+    """Map student IDs to their preferred phone numbers with chunked IN queries.
+
+    Numbers are in E.164 form, so siblings saved with the same number in
+    different formats map to the same value; numbers that cannot be
+    normalized are returned as stored.
+    """
+    student_ids = list(student_ids)
+    phones = {}
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        rows = session.query(StudentContact.student_id, StudentContact.preferred_phone_e164, StudentContact.preferred_phone_number).filter(
+            StudentContact.student_id.in_(chunk)
+        ).all()
+        phones.update((student_id, e164 or raw) for student_id, e164, raw in rows)
+    return phones
+
+def group_siblings(recipients, phones):
+    """Reorder recipients so those sharing a phone number are adjacent.
+
+    Each group takes the position of its first (highest priority) member.
+    Students without a known number form groups of their own.
+    """
+    groups = {}
+    for recipient in recipients:
+        key = phones.get(recipient["student_id"]) or ("student", recipient["student_id"])
+        groups.setdefault(key, []).append(recipient)
+    return list(groups.values())
+
+def assign_slots(groups, start_at=None, window_minutes=None, per_minute=None):
+    """Spread recipient groups evenly over the window, never exceeding per_minute messages per minute.
+
+    Each group is one outgoing message (siblings sharing a phone number) and
+    all its members get the same scheduled_for minute slot. Groups keep their
+    order. A window of 0 disables pacing. If the quota cannot fit everyone
+    inside the window, the campaign runs past it at the full quota.
+    """
+    window_minutes = config.CAMPAIGN_WINDOW_MINUTES if window_minutes is None else window_minutes
+    per_minute = per_minute or config.CAMPAIGN_PER_MINUTE_QUOTA
+    if window_minutes <= 0 or not groups:
+        return [dict(recipient, scheduled_for=None) for group in groups for recipient in group]
+
+    start_at = (start_at or _now()).replace(second=0, microsecond=0)
+    rate = max(1, min(per_minute, math.ceil(len(groups) / window_minutes)))
+    minutes_needed = math.ceil(len(groups) / rate)
+    if minutes_needed > window_minutes:
+        logger.warning("Campaign of %s messages needs %s minutes at %s/min; exceeds %s-minute window", len(groups), minutes_needed, per_minute, window_minutes)
+    return [
+        dict(recipient, scheduled_for=start_at + datetime.timedelta(minutes=index // rate))
+        for index, group in enumerate(groups)
+        for recipient in group
+    ]
+
+def plan_reminder_campaign(term, start_at=None, window_minutes=None, per_minute=None, priority=None):
+    """Build the reminder recipient list in one pass over the debt listing and schedule it."""
+    priority = priority or config.CAMPAIGN_PRIORITY
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown campaign priority '{priority}'; expected one of {sorted(PRIORITIES)}")
+
+    client = SMSClient()
+    debt_data = client.get_students_in_debt()
+    balances = {}
+    for student in debt_data.get("data", []):
+        student_id = student["student"]["student_number"]
+        balance = float(student.get("outstanding_balance") or 0)
+        if balance > 0:
+            balances[student_id] = max(balance, balances.get(student_id, 0))
+
+    recipients = sorted(
+        ({"student_id": student_id, "balance": balance} for student_id, balance in balances.items()),
+        key=PRIORITIES[priority]
+    )
+    session = init_db()
+    try:
+        groups = group_siblings(recipients, phone_numbers_for(session, balances))
+    finally:
+        session.close()
+    planned = assign_slots(groups, start_at, window_minutes, per_minute)
+    logger.info("Planned reminder campaign for term %s: %s recipients in %s messages, priority=%s", term, len(planned), len(groups), priority)
+    return planned
+
+def reschedule_pending(session, run, start_at=None, window_minutes=None, per_minute=None):
+    """Re-spread the pending items of a resumed campaign from now, so overdue slots do not burst."""
+    items = session.query(JobRunItem).filter_by(run_id=run.id, status="pending").order_by(JobRunItem.id).all()
+    phones = phone_numbers_for(session, [item.student_id for item in items])
+    groups = group_siblings([{"student_id": item.student_id, "item": item} for item in items], phones)
+    for slot in assign_slots(groups, start_at, window_minutes, per_minute):
+        slot["item"].scheduled_for = slot["scheduled_for"]
+    session.commit()
+    logger.info("Rescheduled %s pending items of campaign run %s", len(items), run.id)
+
+def campaign_report(session, run):
+    """Planned per-minute schedule of a run alongside its progress."""
+    items = session.query(JobRunItem.status, JobRunItem.scheduled_for).filter_by(run_id=run.id).all()
+    minutes = {}
+    for status, scheduled_for in items:
+        key = scheduled_for.isoformat() if scheduled_for else None
+        bucket = minutes.setdefault(key, {"minute": key, "planned": 0, "processed": 0})
+        bucket["planned"] += 1
+        if status != "pending":
+            bucket["processed"] += 1
+
+    pending_slots = [as_utc(scheduled_for) for status, scheduled_for in items if status == "pending" and scheduled_for]
+    scheduled = [as_utc(scheduled_for) for _, scheduled_for in items if scheduled_for]
+    return {
+        "summary": run_summary(run),
+        "pending": sum(1 for status, _ in items if status == "pending"),
+        "window_start": min(scheduled).isoformat() if scheduled else None,
+        "window_end": max(scheduled).isoformat() if scheduled else None,
+        "next_send_at": min(pending_slots).isoformat() if pending_slots else None,
+        "schedule": sorted(minutes.values(), key=lambda bucket: bucket["minute"] or "")
+    }
@@ -0,0 +1,146 @@
+# src/services/contact_import_service.py
+from src.utils.database import StudentContact
+from src.utils.phone import normalize_phone
+from src.utils.logger import setup_logger
+from config import get_config
+import csv
+import datetime
+import io
+import json
+
+config = get_config()
+logger = setup_logger(__name__)
+
+MAX_REPORTED_ERRORS = 100
+
+def _normalize_phone(value):
+    value = (value or "").strip()
+    if not value:
+        return None
+    normalized = normalize_phone(value)
+    if not normalized:
+        raise ValueError(f"Invalid phone number format: '{value}'")
+    return normalized
+
+def _text_stream(stream):
+    """Wrap a binary upload in a decoder; text streams pass through."""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+def iter_rows(stream, fmt):
+    """Yield (line_number, row) pairs one at a time; row is an error string for unparseable lines."""
+    text = _text_stream(stream)
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, f"Invalid JSON: {str(e)}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "Expected a JSON object"
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}'; expected csv or jsonl")
+
+def parse_row(row):
+    """Validate a roster row and return StudentContact fields.
+
+    Columns: student_id (required), firstname, lastname, student_mobile or
+    phone_number, guardian_mobile_number, preferred_phone_number.
+    """
+    student_id = (row.get("student_id") or "").strip()
+    if not student_id:
+        raise ValueError("student_id required")
+    student_mobile = _normalize_phone(row.get("student_mobile") or row.get("phone_number"))
+    guardian_mobile = _normalize_phone(row.get("guardian_mobile_number"))
+    preferred_phone = _normalize_phone(row.get("preferred_phone_number")) or student_mobile or guardian_mobile
+    if not preferred_phone:
+        raise ValueError("At least one phone number required")
+    fields = {
+        "student_id": student_id,
+        "student_mobile": student_mobile,
+        "guardian_mobile_number": guardian_mobile,
+        "preferred_phone_number": preferred_phone
+    }
+    for name in ("firstname", "lastname"):
+        value = (row.get(name) or "").strip()
+        if value:
+            fields[name] = value
+    return fields
+
+def _upsert_batch(session, batch, dry_run, report):
+    """Upsert one batch of parsed rows in a single transaction."""
+    existing = {
+        contact.student_id: contact
+        for contact in session.query(StudentContact).filter(StudentContact.student_id.in_(list(batch)))
+    }
+    now = datetime.datetime.now(datetime.UTC)
+    inserted = updated = 0
+    try:
+        for student_id, (line_number, fields) in batch.items():
+            contact = existing.get(student_id)
+            if contact:
+                for name, value in fields.items():
+                    if value is not None:
+                        setattr(contact, name, value)
+                contact.last_updated = now
+                updated += 1
+            else:
+                session.add(StudentContact(last_updated=now, **fields))
+                inserted += 1
+        if dry_run:
+            session.flush()
+            session.rollback()
+        else:
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error("Import batch of %s rows failed: %s", len(batch), e)
+        for student_id, (line_number, _) in batch.items():
+            _record_error(report, line_number, student_id, f"Batch failed: {str(e)}")
+        return
+    report["inserted"] += inserted
+    report["updated"] += updated
+    report["batches"] += 1
+
+def _record_error(report, line_number, student_id, message):
+    report["error_count"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_number, "student_id": student_id, "error": message})
+
+def import_contacts(session, stream, fmt="csv", dry_run=False, batch_size=None):
+    """Stream a CSV/JSONL roster into student_contacts.
+
+    Rows are parsed one at a time and upserted in transactions of batch_size,
+    so memory stays constant in the size of the file. Invalid rows are
+    reported with their line number and skipped. With dry_run nothing is
+    committed but the report shows what would change.
+    """
+    batch_size = batch_size or config.IMPORT_BATCH_SIZE
+    report = {"rows": 0, "inserted": 0, "updated": 0, "batches": 0, "error_count": 0, "errors": [], "dry_run": dry_run}
+    batch = {}
+    for line_number, row in iter_rows(stream, fmt):
+        report["rows"] += 1
+        if isinstance(row, str):
+            _record_error(report, line_number, None, row)
+            continue
+        try:
+            fields = parse_row(row)
+        except ValueError as e:
+            _record_error(report, line_number, row.get("student_id"), str(e))
+            continue
+        # A later row for the same student in the batch wins
+        batch[fields["student_id"]] = (line_number, fields)
+        if len(batch) >= batch_size:
+            _upsert_batch(session, batch, dry_run, report)
+            batch = {}
+    if batch:
+        _upsert_batch(session, batch, dry_run, report)
+    logger.info("Contact import %sfinished: %s rows, %s inserted, %s updated, %s errors", "dry run " if dry_run else "", report["rows"], report["inserted"], report["updated"], report["error_count"])
+    return report
@@ -0,0 +1,140 @@
+# src/services/contact_service.py
+from src.api.sms_client import SMSClient
+from src.utils.database import init_db, StudentContact
+from src.utils.phone import normalize_phone
+from src.utils.logger import setup_logger
+from config import get_config
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import collections
+import contextlib
+import contextvars
+import datetime
+
+config = get_config()
+logger = setup_logger(__name__)
+
+DEFAULT_FULLNAME = "Parent/Guardian"
+
+# What per-student services need from a contact; plain values so preloaded
+# entries survive the batch session committing or closing
+ContactInfo = collections.namedtuple("ContactInfo", ["student_id", "phone_number", "fullname"])
+
+_preloaded = contextvars.ContextVar("preloaded_contacts", default=None)
+_scans_allowed = contextvars.ContextVar("contact_scans_allowed", default=False)
+
+class ContactScanError(RuntimeError):
+    """An unfiltered query over student_contacts while CONTACT_SCAN_GUARD=raise."""
+
+def contact_fields_from_profile(profile):
+    """Extract StudentContact fields from a /student-profile/ response, or None without a phone number."""
+    profile_data = profile.get("data", {}) if isinstance(profile, dict) else {}
+    student_mobile = normalize_phone(profile_data.get("student_mobile"))  # Parent's number
+    guardian_mobile = normalize_phone(profile_data.get("guardian_mobile_number"))
+    preferred_phone = student_mobile or guardian_mobile
+    if not preferred_phone:
+        return None
+    return {
+        "firstname": profile_data.get("firstname"),
+        "lastname": profile_data.get("lastname"),
+        "student_mobile": student_mobile,
+        "guardian_mobile_number": guardian_mobile,
+        "preferred_phone_number": preferred_phone
+    }
+
+def fullname_for(firstname, lastname):
+    return f"{firstname} {lastname}".strip() if firstname and lastname else DEFAULT_FULLNAME
+
+def contact_info(contact):
+    return ContactInfo(contact.student_id, contact.preferred_phone_number, fullname_for(contact.firstname, contact.lastname))
+
+def load_contacts(session, student_ids, chunk_size=500):
+    """Load contacts for student_ids with chunked IN queries on the unique student_id index."""
+    contacts = {}
+    student_ids = list(student_ids)
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        for contact in session.query(StudentContact).filter(StudentContact.student_id.in_(chunk)):
+            contacts[contact.student_id] = contact
+    return contacts
+
+@contextlib.contextmanager
+def preloaded_contacts(session, student_ids):
+    """Answer lookup_contact() for these students from one batched load while the block runs."""
+    contacts = {student_id: contact_info(contact) for student_id, contact in load_contacts(session, student_ids).items()}
+    logger.info("Preloaded %s of %s contacts", len(contacts), len(student_ids))
+    token = _preloaded.set(contacts)
+    try:
+        yield contacts
+    finally:
+        _preloaded.reset(token)
+
+def _fetch_and_cache(session, student_id, client):
+    profile = (client or SMSClient()).get_student_profile(student_id)
+    logger.debug("Profile response for %s: %s", student_id, profile)
+    fields = contact_fields_from_profile(profile)
+    if not fields:
+        return None
+    contact = StudentContact(student_id=student_id, last_updated=datetime.datetime.now(datetime.UTC), **fields)
+    session.add(contact)
+    session.commit()
+    logger.info("Cached contact for %s: %s", student_id, contact.preferred_phone_number)
+    return contact_info(contact)
+
+def lookup_contact(student_id, client=None):
+    """Return (ContactInfo, None) or (None, error) for one student.
+
+    Checked in order: contacts preloaded by the running batch job, a keyed
+    query on student_id, then the SMS API profile (cached for next time).
+    """
+    preloaded = _preloaded.get()
+    if preloaded is not None and student_id in preloaded:
+        return preloaded[student_id], None
+
+    session = init_db()
+    try:
+        contact = session.query(StudentContact).filter_by(student_id=student_id).first()
+        if contact:
+            return contact_info(contact), None
+        logger.debug("No contact in database for %s, trying API", student_id)
+        try:
+            info = _fetch_and_cache(session, student_id, client)
+        except Exception as e:
+            session.rollback()
+            logger.error("Failed to fetch profile for %s: %s", student_id, e)
+            return None, f"Failed to fetch profile: {str(e)}"
+        if info is None:
+            logger.error("No phone number found in profile for %s", student_id)
+            return None, "No phone number found in profile"
+        return info, None
+    finally:
+        session.close()
+
+@contextlib.contextmanager
+def allow_contact_scans():
+    """Permit whole-table contact queries (exports, admin scripts) inside the block."""
+    token = _scans_allowed.set(True)
+    try:
+        yield
+    finally:
+        _scans_allowed.reset(token)
+
+@event.listens_for(Session, "do_orm_execute")
+def _guard_contact_scans(orm_execute_state):
+    """Flag SELECTs over student_contacts with neither a WHERE nor a LIMIT.
+
+    Per-student code must use lookup_contact() or load_contacts(); a full
+    scan per student makes batch jobs quadratic in the roster size.
+    CONTACT_SCAN_GUARD=warn logs the query, raise fails it, off disables.
+    """
+    if config.CONTACT_SCAN_GUARD == "off" or not orm_execute_state.is_select or _scans_allowed.get():
+        return
+    statement = orm_execute_state.statement
+    if statement.whereclause is not None or getattr(statement, "_limit_clause", None) is not None:
+        return
+    if StudentContact.__table__ not in statement.get_final_froms():
+        return
+    message = f"Unfiltered scan of student_contacts: {statement}"
+    if config.CONTACT_SCAN_GUARD == "raise":
+        raise ContactScanError(message)
+    logger.warning("%s", message)
@@ -0,0 +1,248 @@
+# src/services/financial_snapshot_service.py
+from src.api.sms_client import SMSClient
+from src.utils.database import init_db, FinancialSnapshot
+from src.utils.single_flight import SingleFlight
+from src.utils.logger import setup_logger
+from config import get_config
+from sqlalchemy.exc import IntegrityError
+import collections
+import datetime
+import json
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+DEFAULT_TOTAL_FEES = 1000.0  # Used when the account statement has no total_fees
+# Invalidations only reach the worker that receives /payment-event, so the
+# per-process cache keeps entries for at most this long
+MEMORY_TTL_CAP_SECONDS = 60
+
+class _StoreStats:
+    def __init__(self):
+        self.hits = self.misses = self.invalidations = self.stale_discarded = 0
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations, "stale_discarded": self.stale_discarded}
+
+class MemorySnapshotStore:
+    """Per-process TTL cache of snapshots keyed by (student_id, term).
+
+    Each worker and shard process has its own copy and an invalidation only
+    clears the process that receives it, so the TTL is capped at
+    MEMORY_TTL_CAP_SECONDS. Use the database backend with several workers.
+    """
+    def __init__(self, ttl_seconds=None, max_entries=20000):
+        ttl_seconds = config.FINANCIAL_SNAPSHOT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.ttl_seconds = min(ttl_seconds, MEMORY_TTL_CAP_SECONDS)
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # (student_id, term) -> (expires_at, snapshot)
+        self._generations = {}  # student_id -> invalidations so far
+        self._lock = threading.Lock()
+        self.stats_counter = _StoreStats()
+
+    def get(self, student_id, term):
+        """Return (snapshot or None, generation to pass to put)."""
+        with self._lock:
+            entry = self._entries.get((student_id, term))
+            generation = self._generations.get(student_id, 0)
+        if entry and entry[0] > time.monotonic():
+            self.stats_counter.count("hits")
+            return entry[1], generation
+        self.stats_counter.count("misses")
+        return None, generation
+
+    def put(self, snapshot, generation):
+        """Store snapshot unless the student was invalidated since generation was read."""
+        with self._lock:
+            if self._generations.get(snapshot["student_id"], 0) != generation:
+                self.stats_counter.count("stale_discarded")
+                return False
+            key = (snapshot["student_id"], snapshot["term"])
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, snapshot)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, student_id, term=None):
+        """Drop one student's snapshot for a term, or for every term."""
+        with self._lock:
+            self._generations[student_id] = self._generations.get(student_id, 0) + 1
+            keys = [key for key in self._entries if key[0] == student_id and (term is None or key[1] == term)]
+            for key in keys:
+                del self._entries[key]
+        self.stats_counter.count("invalidations", len(keys))
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {"backend": "memory", "entries": entries, **self.stats_counter.as_dict()}
+
+class DatabaseSnapshotStore:
+    """Snapshots shared by all workers and shard processes, in the financial_snapshots table.
+
+    Every (student, term) row carries a generation that invalidation bumps;
+    a fetch only stores its result if the generation it started from is
+    still current, so a fetch overtaken by a payment event is discarded.
+    """
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = config.FINANCIAL_SNAPSHOT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.stats_counter = _StoreStats()
+
+    def get(self, student_id, term):
+        """Return (snapshot or None, generation to pass to put)."""
+        now = datetime.datetime.now(datetime.UTC)
+        session = init_db()
+        try:
+            row = session.get(FinancialSnapshot, (student_id, term))
+            if row is None:
+                # The row carries the generation, so it must exist before fetching
+                session.add(FinancialSnapshot(student_id=student_id, term=term, generation=0))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    session.rollback()
+                    row = session.get(FinancialSnapshot, (student_id, term))
+            if row is not None and row.data is not None:
+                expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=datetime.UTC)
+                if expires_at > now:
+                    self.stats_counter.count("hits")
+                    return json.loads(row.data), row.generation
+            self.stats_counter.count("misses")
+            return None, row.generation if row is not None else 0
+        finally:
+            session.close()
+
+    def put(self, snapshot, generation):
+        """Store snapshot unless the student was invalidated since generation was read."""
+        session = init_db()
+        try:
+            updated = session.query(FinancialSnapshot).filter_by(
+                student_id=snapshot["student_id"], term=snapshot["term"], generation=generation
+            ).update({
+                FinancialSnapshot.data: json.dumps(snapshot),
+                FinancialSnapshot.expires_at: datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=self.ttl_seconds)
+            }, synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+        if not updated:
+            self.stats_counter.count("stale_discarded")
+        return bool(updated)
+
+    def invalidate(self, student_id, term=None):
+        """Drop one student's snapshot for a term, or for every term."""
+        session = init_db()
+        try:
+            query = session.query(FinancialSnapshot).filter(FinancialSnapshot.student_id == student_id)
+            if term is not None:
+                query = query.filter(FinancialSnapshot.term == term)
+            dropped = query.filter(FinancialSnapshot.data.isnot(None)).count()
+            query.update({
+                FinancialSnapshot.generation: FinancialSnapshot.generation + 1,
+                FinancialSnapshot.data: None
+            }, synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+        self.stats_counter.count("invalidations", dropped)
+        return dropped
+
+    def stats(self):
+        return {"backend": "database", **self.stats_counter.as_dict()}
+
+_store = None
+_store_lock = threading.Lock()
+_fetches = SingleFlight()
+
+def get_snapshot_store():
+    """Process-wide store selected by FINANCIAL_SNAPSHOT_BACKEND (database or memory)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if config.FINANCIAL_SNAPSHOT_BACKEND == "memory":
+                    _store = MemorySnapshotStore()
+                else:
+                    _store = DatabaseSnapshotStore()
+    return _store
+
+def _outstanding_balance(client, student_id):
+    """The student's outstanding_balance in /students/accounts-in-debt, 0 when not listed."""
+    debt_data = client.get_students_in_debt(student_id=student_id)
+    for student in debt_data.get("data", []):
+        if student["student"]["student_number"] == student_id:
+            return student["outstanding_balance"]
+    return 0
+
+def fetch_financial_snapshot(student_id, term, client=None, with_outstanding=False):
+    """Fetch payments and the account statement from the SMS API and normalize them.
+
+    As before snapshots existed, the statement is only requested when the
+    student has paid something; otherwise total_fees is the default and
+    balance None. With with_outstanding the debt listing's
+    outstanding_balance, which balance reminders quote, is fetched too.
+    """
+    client = client or SMSClient()
+    try:
+        payment_data = client.get_student_payments(student_id, term)
+    except Exception as e:
+        if "404 Client Error" not in str(e):
+            raise
+        logger.info("No payments found for %s in term %s", student_id, term)
+        payment_data = {"data": []}
+    if not isinstance(payment_data, dict) or "data" not in payment_data:
+        raise ValueError(f"Invalid payment data for {student_id}: {payment_data}")
+    payments = [payment for payment in payment_data.get("data") or [] if isinstance(payment, dict) and "amount" in payment]
+
+    snapshot = {
+        "student_id": student_id,
+        "term": term,
+        "total_paid": sum(payment["amount"] for payment in payments),
+        "total_fees": DEFAULT_TOTAL_FEES,
+        "balance": None,
+        "outstanding_balance": None,
+        "payment_count": len(payments),
+        "fetched_at": datetime.datetime.now(datetime.UTC).isoformat()
+    }
+    if snapshot["total_paid"] > 0:
+        statement = client.get_student_account_statement(student_id, term).get("data", {})
+        snapshot.update(total_fees=statement.get("total_fees", DEFAULT_TOTAL_FEES), balance=statement.get("balance", 0))
+    if with_outstanding:
+        snapshot["outstanding_balance"] = _outstanding_balance(client, student_id)
+    return snapshot
+
+def get_financial_snapshot(student_id, term, client=None, refresh=False, with_outstanding=False):
+    """Return the cached snapshot for (student_id, term), fetching it on a miss.
+
+    Snapshot keys: total_paid, total_fees, balance, outstanding_balance,
+    payment_count. Pass with_outstanding when outstanding_balance is needed.
+    Entries live for FINANCIAL_SNAPSHOT_TTL_SECONDS or until a payment event
+    invalidates them; concurrent misses for one key share a single fetch.
+    """
+    store = get_snapshot_store()
+    snapshot, generation = store.get(student_id, term)
+    if snapshot is not None and not refresh and (snapshot.get("outstanding_balance") is not None or not with_outstanding):
+        return snapshot
+
+    def fetch():
+        snapshot = fetch_financial_snapshot(student_id, term, client, with_outstanding)
+        store.put(snapshot, generation)
+        return snapshot
+
+    # Callers arriving after an invalidation start a new fetch instead of joining a stale one
+    return _fetches.do(f"snapshot:{student_id}:{term}:{generation}:{with_outstanding}", fetch)
+
+def invalidate_financial_snapshot(student_id, term=None):
+    """Forget cached figures after a payment so the next read refetches them."""
+    dropped = get_snapshot_store().invalidate(student_id, term)
+    logger.info("Invalidated %s financial snapshots for %s%s", dropped, student_id, f" term {term}" if term else "")
+    return dropped
@@ -0,0 +1,125 @@
+# src/services/gatepass_cleanup_service.py
+from src.utils.database import init_db, GatePass, GatePassArchive, GatePassMessage
+from src.utils.storage import get_storage
+from src.utils.logger import setup_logger
+from config import get_config
+import datetime
+import os
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+TEMP_DIR = "temp"
+# Files younger than this may still be in use by a render or upload
+TEMP_MIN_AGE_SECONDS = 300
+
+ARCHIVED_COLUMNS = (
+    "student_id", "pass_id", "issued_date", "expiry_date", "payment_percentage",
+    "whatsapp_number", "last_updated", "message_sid"
+)
+
+def _remove_local(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+        return 1
+    return 0
+
+def archive_expired_passes(session, batch_size=None, grace_days=None, now=None):
+    """Move passes that expired more than grace_days ago into gate_pass_archive.
+
+    Each batch is copied and deleted in one transaction, then its stored PDFs and
+    images are removed with one bulk delete and its local files unlinked.
+    """
+    batch_size = batch_size or config.SWEEP_BATCH_SIZE
+    grace_days = config.GATEPASS_ARCHIVE_GRACE_DAYS if grace_days is None else grace_days
+    cutoff = (now or datetime.datetime.now(datetime.UTC)) - datetime.timedelta(days=grace_days)
+    storage = get_storage()
+    report = {"archived": 0, "batches": 0, "objects_deleted": 0, "files_deleted": 0}
+    columns = [GatePass.id, GatePass.pdf_path, GatePass.qr_path, GatePass.image_path] + [getattr(GatePass, name) for name in ARCHIVED_COLUMNS]
+    while True:
+        passes = session.query(*columns).filter(GatePass.expiry_date < cutoff).order_by(GatePass.id).limit(batch_size).all()
+        if not passes:
+            break
+        archived_at = datetime.datetime.now(datetime.UTC)
+        session.bulk_insert_mappings(GatePassArchive, [
+            dict({name: getattr(row, name) for name in ARCHIVED_COLUMNS}, archived_at=archived_at)
+            for row in passes
+        ])
+        session.query(GatePassMessage).filter(GatePassMessage.pass_id.in_([row.pass_id for row in passes])).delete(synchronize_session=False)
+        session.query(GatePass).filter(GatePass.id.in_([row.id for row in passes])).delete(synchronize_session=False)
+        session.commit()
+
+        # Rows are gone before their files; a failed delete leaves an orphan, never a dangling reference
+        stored_keys = [row.pdf_path for row in passes if row.pdf_path and not row.pdf_path.startswith(f"{TEMP_DIR}/")]
+        stored_keys += [row.image_path for row in passes if row.image_path]
+        local_paths = [row.pdf_path for row in passes if row.pdf_path and row.pdf_path.startswith(f"{TEMP_DIR}/")]
+        local_paths += [row.qr_path for row in passes if row.qr_path]
+        try:
+            if stored_keys:
+                report["objects_deleted"] += storage.delete_many(stored_keys)
+        except Exception as e:
+            logger.error("Bulk delete of %s stored gate passes failed: %s", len(stored_keys), e)
+        for path in local_paths:
+            try:
+                report["files_deleted"] += _remove_local(path)
+            except OSError as e:
+                logger.error("Failed to remove %s: %s", path, e)
+
+        report["archived"] += len(passes)
+        report["batches"] += 1
+        if len(passes) < batch_size:
+            break
+    logger.info("Archived %s expired gate passes in %s batches", report["archived"], report["batches"])
+    return report
+
+def purge_temp_files(directory=TEMP_DIR, max_bytes=None, max_age_hours=None, now=None):
+    """Delete temp files older than max_age_hours, then the oldest ones until the directory fits in max_bytes."""
+    max_bytes = config.TEMP_DIR_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    max_age_hours = config.TEMP_FILE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    now = now or time.time()
+    report = {"files_deleted": 0, "bytes_freed": 0, "bytes_remaining": 0}
+    if not os.path.isdir(directory):
+        return report
+
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_file(follow_symlinks=False):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()  # oldest first
+    total = sum(size for _, size, _ in files)
+
+    for mtime, size, path in files:
+        age = now - mtime
+        expired = age > max_age_hours * 3600
+        over_budget = total > max_bytes and age > TEMP_MIN_AGE_SECONDS
+        if not (expired or over_budget):
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error("Failed to remove temp file %s: %s", path, e)
+            continue
+        total -= size
+        report["files_deleted"] += 1
+        report["bytes_freed"] += size
+    report["bytes_remaining"] = total
+    if total > max_bytes:
+        logger.warning("%s/ holds %s bytes after purge, over the %s-byte budget", directory, total, max_bytes)
+    logger.info("Purged %s temp files (%s bytes)", report["files_deleted"], report["bytes_freed"])
+    return report
+
+def sweep_gatepasses(batch_size=None):
+    """Archive expired passes and purge temp/; run daily by the scheduler."""
+    session = init_db()
+    try:
+        report = archive_expired_passes(session, batch_size=batch_size)
+    except Exception as e:
+        session.rollback()
+        logger.error("Gate pass sweep failed: %s", e)
+        report = {"error": str(e)}
+    finally:
+        session.close()
+    report["temp"] = purge_temp_files()
+    return report
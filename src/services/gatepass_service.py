@@ -0,0 +1,460 @@
+# src/services/gatepass_service.py
+from src.utils.clients import get_twilio_client
+from src.utils.storage import get_storage
+from src.utils.database import GatePass, GatePassMessage
+from src.utils.single_flight import SingleFlight, KeyedLock, advisory_lock
+from src.utils.metrics import timer, timed
+from src.utils.whatsapp import send_whatsapp_message
+from src.utils.logger import setup_logger
+from config import get_config
+from sqlalchemy import or_
+import datetime
+import os
+import uuid
+
+config = get_config()
+logger = setup_logger(__name__)
+
+# Term end dates for 2025
+TERM_END_DATES = {
+    "2025-1": datetime.datetime(2025, 3, 31),
+    "2025-2": datetime.datetime(2025, 7, 31),
+    "2025-3": datetime.datetime(2025, 11, 30)
+}
+
+LOGO_PATH = "static/school_logo.png"
+SIGNATURE_PATH = "static/signature.png"
+SCHOOL_NAME = "SHINING SMILES GROUP OF SCHOOLS"
+
+# Twilio statuses after which a message no longer needs its media URL
+FINAL_MESSAGE_STATUSES = ("delivered", "failed", "undelivered")
+
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+# Tried in order until the encoded image fits the byte budget
+IMAGE_QUALITIES = (85, 75, 65, 55, 45)
+IMAGE_SCALES = (1.0, 0.85, 0.7)
+
+def format_percentage(payment_percentage):
+    return f"{payment_percentage:.1f}%" if isinstance(payment_percentage, float) else f"{payment_percentage}%"
+
+def verify_url(pass_id, whatsapp_number):
+    return f"{config.PUBLIC_BASE_URL}/verify-gatepass?pass_id={pass_id}&whatsapp_number={whatsapp_number}"
+
+def make_qr_image(pass_id, whatsapp_number):
+    """Verification QR code for a pass as a PIL image."""
+    import qrcode
+
+    qr_url = verify_url(pass_id, whatsapp_number)
+    logger.debug("Generating QR code for URL: %s", qr_url)
+    qr = qrcode.QRCode(version=1, box_size=10, border=4)
+    qr.add_data(qr_url)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white").get_image()
+
+def render_qr(pass_id, whatsapp_number, qr_path):
+    """Write the verification QR code for a pass to qr_path."""
+    make_qr_image(pass_id, whatsapp_number).save(qr_path)
+    if not os.path.exists(qr_path):
+        raise RuntimeError("Failed to generate QR code")
+    logger.debug("QR code saved to %s", qr_path)
+
+@timed("gatepass_render", format="pdf")
+def render_gatepass_pdf(pass_id, student_id, firstname, lastname, issued_date, expiry_date, payment_percentage, whatsapp_number):
+    """Render a gate pass PDF with logo, watermark, details, QR code and signature.
+
+    Returns (pdf_path, qr_path) under temp/. ReportLab and qrcode are only
+    imported here, the first time a pass is rendered.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+
+    os.makedirs("temp", exist_ok=True)
+    pdf_path = f"temp/gatepass_{pass_id}.pdf"
+    qr_path = f"temp/qr_{pass_id}.png"
+    render_qr(pass_id, whatsapp_number, qr_path)
+
+    logger.debug("Generating PDF at %s", pdf_path)
+    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+    styles = getSampleStyleSheet()
+    normal_style = ParagraphStyle(name='Normal', parent=styles['Normal'], fontSize=12)
+    title_style = ParagraphStyle(name='Title', fontName='Helvetica-Bold', fontSize=16, textColor=colors.darkblue)
+
+    # Add watermark (faint school logo in background)
+    def add_watermark(canvas, doc):
+        canvas.saveState()
+        canvas.setFillAlpha(0.1)  # Faint opacity
+        if os.path.exists(LOGO_PATH):
+            canvas.drawImage(LOGO_PATH, 150, 300, width=300, height=150, preserveAspectRatio=True, mask='auto')
+        canvas.restoreState()
+
+    story = []
+
+    # Header: Logo and Title
+    if os.path.exists(LOGO_PATH):
+        logo = Image(LOGO_PATH, width=2*inch, height=1*inch, kind='proportional')
+        header_table = Table([[logo, Paragraph(SCHOOL_NAME, title_style)]], colWidths=[2.5*inch, 4*inch])
+        header_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (1, 0), (1, 0), 'LEFT'),
+        ]))
+        story.append(header_table)
+    else:
+        logger.warning("School logo not found at %s", LOGO_PATH)
+        story.append(Paragraph(SCHOOL_NAME, title_style))
+
+    story.append(Spacer(1, 0.5*inch))
+
+    # Information table (bold titles, values next to them)
+    data = [list(row) for row in _pass_rows(student_id, firstname, lastname, pass_id, issued_date, expiry_date, payment_percentage, whatsapp_number)]
+    info_table = Table(data, colWidths=[2*inch, 4*inch])
+    info_table.setStyle(TableStyle([
+        ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 12),
+        ('FONT', (1, 0), (1, -1), 'Helvetica', 12),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.darkblue),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightgoldenrodyellow),
+    ]))
+    story.append(info_table)
+    story.append(Spacer(1, 0.5*inch))
+
+    # QR code (centered)
+    qr_table = Table([[Image(qr_path, width=2*inch, height=2*inch, kind='proportional')]], colWidths=[2*inch])
+    qr_table.setStyle(TableStyle([('ALIGN', (0, 0), (-1, -1), 'CENTER')]))
+    story.append(qr_table)
+
+    # Signature
+    if os.path.exists(SIGNATURE_PATH):
+        story.append(Spacer(1, 0.25*inch))
+        story.append(Paragraph("Authorized Signature", normal_style))
+        story.append(Image(SIGNATURE_PATH, width=2*inch, height=0.5*inch, kind='proportional'))
+    else:
+        logger.warning("Signature image not found at %s", SIGNATURE_PATH)
+        story.append(Paragraph("Authorized Signature", normal_style))
+
+    doc.build(story, onFirstPage=add_watermark)
+    if not os.path.exists(pdf_path):
+        raise RuntimeError("Failed to generate PDF")
+    logger.debug("PDF generated at %s", pdf_path)
+    return pdf_path, qr_path
+
+def _pass_rows(student_id, firstname, lastname, pass_id, issued_date, expiry_date, payment_percentage, whatsapp_number):
+    return [
+        ("Student ID:", f"{student_id}"),
+        ("Name:", f"{firstname or 'N/A'} {lastname or 'N/A'}"),
+        ("Pass ID:", f"{pass_id}"),
+        ("Issued:", f"{issued_date.strftime('%Y-%m-%d')}"),
+        ("Expires:", f"{expiry_date.strftime('%Y-%m-%d')}"),
+        ("Payment:", format_percentage(payment_percentage)),
+        ("Valid for:", f"{whatsapp_number}")
+    ]
+
+def _encode_within_budget(image, image_format, max_bytes):
+    """Encode at the highest quality and scale that fits max_bytes; returns (bytes, scale, quality)."""
+    import io
+    from PIL import Image as PILImage
+
+    data = None
+    for scale in IMAGE_SCALES:
+        scaled = image if scale == 1.0 else image.resize(
+            (int(image.width * scale), int(image.height * scale)), PILImage.LANCZOS
+        )
+        for quality in IMAGE_QUALITIES:
+            buffer = io.BytesIO()
+            scaled.save(buffer, format=image_format, quality=quality, optimize=True)
+            data = buffer.getvalue()
+            if len(data) <= max_bytes:
+                return data, scale, quality
+    logger.warning("Gate pass image is %s bytes at the lowest quality, over the %s-byte budget", len(data), max_bytes)
+    return data, IMAGE_SCALES[-1], IMAGE_QUALITIES[-1]
+
+@timed("gatepass_render", format="image")
+def render_gatepass_image(pass_id, student_id, firstname, lastname, issued_date, expiry_date, payment_percentage, whatsapp_number,
+                          image_format=None, max_bytes=None):
+    """Render the gate pass as a JPEG/WebP that WhatsApp shows inline.
+
+    Uses the same details, QR code, logo and signature as the PDF and keeps
+    the file under max_bytes (GATEPASS_IMAGE_MAX_BYTES) by lowering quality,
+    then resolution. Returns the path under temp/.
+    """
+    from PIL import Image as PILImage, ImageDraw, ImageFont
+
+    image_format = (image_format or config.GATEPASS_IMAGE_FORMAT).upper()
+    if image_format not in IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported gate pass image format '{image_format}'; expected one of {sorted(IMAGE_EXTENSIONS)}")
+    max_bytes = max_bytes or config.GATEPASS_IMAGE_MAX_BYTES
+
+    width, margin = 720, 40
+    dark_blue, grid, fill = (0, 0, 139), (128, 128, 128), (250, 250, 210)
+    title_font = ImageFont.load_default(size=30)
+    text_font = ImageFont.load_default(size=22)
+    canvas = PILImage.new("RGB", (width, 1060), "white")
+    draw = ImageDraw.Draw(canvas)
+
+    # Header: logo and title, with the logo faintly repeated as a watermark
+    y = margin
+    if os.path.exists(LOGO_PATH):
+        with PILImage.open(LOGO_PATH) as source:
+            logo = source.convert("RGBA")
+        header_logo = logo.copy()
+        header_logo.thumbnail((100, 100))
+        canvas.paste(header_logo, (margin, y), header_logo)
+        watermark = logo.copy()
+        watermark.thumbnail((420, 420))
+        watermark.putalpha(watermark.getchannel("A").point(lambda alpha: alpha // 10))
+        canvas.paste(watermark, ((width - watermark.width) // 2, 420), watermark)
+        draw.text((margin + 120, y + 50), SCHOOL_NAME, font=title_font, fill=dark_blue, anchor="lm")
+    else:
+        logger.warning("School logo not found at %s", LOGO_PATH)
+        draw.text((width // 2, y + 50), SCHOOL_NAME, font=title_font, fill=dark_blue, anchor="mm")
+    y += 130
+
+    # Information table
+    row_height, label_width = 40, 180
+    for label, value in _pass_rows(student_id, firstname, lastname, pass_id, issued_date, expiry_date, payment_percentage, whatsapp_number):
+        draw.rectangle((margin, y, width - margin, y + row_height), fill=fill, outline=grid)
+        draw.line((margin + label_width, y, margin + label_width, y + row_height), fill=grid)
+        draw.text((margin + 10, y + row_height // 2), label, font=text_font, fill=dark_blue, anchor="lm", stroke_width=1, stroke_fill=dark_blue)
+        draw.text((margin + label_width + 10, y + row_height // 2), value, font=text_font, fill=dark_blue, anchor="lm")
+        y += row_height
+    y += 30
+
+    # QR code (centered)
+    qr = make_qr_image(pass_id, whatsapp_number).convert("RGB").resize((320, 320), PILImage.NEAREST)
+    canvas.paste(qr, ((width - qr.width) // 2, y))
+    y += qr.height + 20
+
+    # Signature
+    draw.text((margin, y), "Authorized Signature", font=text_font, fill="black")
+    y += 30
+    if os.path.exists(SIGNATURE_PATH):
+        with PILImage.open(SIGNATURE_PATH) as source:
+            signature = source.convert("RGBA")
+        signature.thumbnail((240, 80))
+        canvas.paste(signature, (margin, y), signature)
+    else:
+        logger.warning("Signature image not found at %s", SIGNATURE_PATH)
+
+    data, scale, quality = _encode_within_budget(canvas, image_format, max_bytes)
+    os.makedirs("temp", exist_ok=True)
+    image_path = f"temp/gatepass_{pass_id}.{IMAGE_EXTENSIONS[image_format]}"
+    with open(image_path, "wb") as image_file:
+        image_file.write(data)
+    logger.debug("Gate pass image generated at %s: %s bytes, scale=%s, quality=%s", image_path, len(data), scale, quality)
+    return image_path
+
+def store_gatepass_media(pass_fields, output=None):
+    """Render the pass in the configured formats and upload them.
+
+    output is "pdf", "image" or "both" (default GATEPASS_OUTPUT). Returns a
+    dict with storage keys (pdf_path, image_path), the local qr_path and the
+    signed media_urls to send, image first so it shows inline.
+    """
+    output = output or config.GATEPASS_OUTPUT
+    if output not in ("pdf", "image", "both"):
+        raise ValueError(f"Unknown gate pass output '{output}'; expected pdf, image or both")
+    storage = get_storage()
+    pass_id = pass_fields["pass_id"]
+    stored = {"pdf_path": None, "image_path": None, "qr_path": None, "media_urls": []}
+    if output in ("image", "both"):
+        image_path = render_gatepass_image(**pass_fields)
+        extension = os.path.splitext(image_path)[1]
+        content_type = "image/webp" if extension == ".webp" else "image/jpeg"
+        stored["image_path"] = storage.put(image_path, f"gatepasses/gatepass_{pass_id}{extension}", content_type=content_type)
+        stored["media_urls"].append(storage.url(stored["image_path"]))
+        os.remove(image_path)
+    if output in ("pdf", "both"):
+        pdf_path, stored["qr_path"] = render_gatepass_pdf(**pass_fields)
+        stored["pdf_path"] = storage.put(pdf_path, f"gatepasses/gatepass_{pass_id}.pdf", content_type="application/pdf")
+        stored["media_urls"].append(storage.url(stored["pdf_path"]))
+    return stored
+
+def gatepass_text(student_id, firstname, lastname, pass_id, issued_date, expiry_date, payment_percentage, whatsapp_number):
+    """Plain-text gate pass sent when the PDF cannot be delivered."""
+    return (
+        f"Dear {firstname or 'Parent'} {lastname or 'Guardian'},\n"
+        f"Gate Pass for {student_id}:\n"
+        f"Pass ID: {pass_id}\n"
+        f"Issued: {issued_date.strftime('%Y-%m-%d')}\n"
+        f"Expires: {expiry_date.strftime('%Y-%m-%d')}\n"
+        f"Payment: {format_percentage(payment_percentage)}\n"
+        f"This pass is valid only for {whatsapp_number}. Do not share."
+    )
+
+def deliver_gatepass(to_number, media_urls, fallback_text, student_id):
+    """Send the rendered pass over WhatsApp, falling back to fallback_text.
+
+    WhatsApp allows one attachment per message, so each media URL goes in
+    its own message; one that fails does not stop the rest. Returns
+    ("media", SIDs of the messages sent) when any attachment went out, or
+    ("text", []) after sending the fallback. The uploads were already
+    confirmed by the storage backend, so the URLs are handed to Twilio
+    without a reachability check.
+    """
+    logger.debug("Sending %s gate pass attachments to WhatsApp for %s", len(media_urls), student_id)
+    message_sids = []
+    for index, media_url in enumerate(media_urls):
+        # The caption goes with the first attachment that is actually sent
+        caption = {} if message_sids else {"body": "Your gate pass is attached. This pass is valid only for your WhatsApp number. Do not share."}
+        try:
+            with timer("twilio_request", kind="media"):
+                message = get_twilio_client().messages.create(
+                    from_=f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}",
+                    media_url=[media_url],
+                    to=f"whatsapp:{to_number}",
+                    status_callback=f"{config.PUBLIC_BASE_URL}/message-status",
+                    **caption
+                )
+            message_sids.append(message.sid)
+        except Exception as e:
+            logger.error("Failed to send gate pass attachment %s of %s for %s: %s", index + 1, len(media_urls), student_id, e)
+    if message_sids:
+        logger.info("Gate pass sent for %s to %s: SIDs=%s (%s of %s attachments)", student_id, to_number, ", ".join(message_sids), len(message_sids), len(media_urls))
+        return "media", message_sids
+    logger.error("No gate pass attachment was sent for %s; sending text instead", student_id)
+    send_whatsapp_message(to_number, fallback_text)
+    logger.info("Fallback text gate pass sent for %s to %s", student_id, to_number)
+    return "text", []
+
+# In-flight issuances keyed by student, term and payment percentage, so a
+# payment confirmation and a parent's request arriving together render once
+_issuance_flight = SingleFlight()
+_student_locks = KeyedLock()
+
+def gatepass_expiry(term, payment_percentage, issued_date):
+    """Expiry of a pass for payment_percentage of the fees, or None below the 50% threshold."""
+    if payment_percentage >= 100:
+        return TERM_END_DATES.get(term, datetime.datetime(2025, 3, 31))
+    if payment_percentage >= 75:
+        return issued_date + datetime.timedelta(days=60)
+    if payment_percentage >= 50:
+        return issued_date + datetime.timedelta(days=30)
+    return None
+
+def record_delivery(session, gate_pass, message_sids):
+    """Make message_sids the pass's current delivery so status callbacks can find it by any of them.
+
+    SIDs of an earlier delivery are dropped: their callbacks must not remove
+    the media just stored for this one. The caller commits.
+    """
+    gate_pass.message_sid = message_sids[-1] if message_sids else None
+    session.query(GatePassMessage).filter_by(pass_id=gate_pass.pass_id).delete(synchronize_session=False)
+    session.add_all(GatePassMessage(pass_id=gate_pass.pass_id, message_sid=sid) for sid in message_sids)
+
+def settle_message_status(session, message_sid, status):
+    """Record a final status for one message of a delivery.
+
+    Returns the gate pass once every message of its delivery is final, so
+    its media can be deleted; otherwise None. The pass row is locked first
+    so concurrent callbacks for its messages see each other's status; when
+    a pass is returned the transaction is left open for the caller's cleanup
+    to commit.
+    """
+    if status not in FINAL_MESSAGE_STATUSES:
+        return None
+    message = session.query(GatePassMessage).filter_by(message_sid=message_sid).first()
+    if message is None:
+        return None
+    gate_pass = session.query(GatePass).filter_by(pass_id=message.pass_id).with_for_update().first()
+    message.status = status
+    message.last_updated = datetime.datetime.now(datetime.UTC)
+    session.flush()
+    in_flight = session.query(GatePassMessage).filter(
+        GatePassMessage.pass_id == message.pass_id,
+        or_(GatePassMessage.status.is_(None), GatePassMessage.status.notin_(FINAL_MESSAGE_STATUSES))
+    ).count()
+    if in_flight:
+        session.commit()
+        logger.debug("Gate pass %s still has %s messages in flight", message.pass_id, in_flight)
+        return None
+    return gate_pass
+
+def issue_gatepass(session, contact, payment_percentage, issued_date, expiry_date):
+    """Issue (render, store, record and send) a pass unless a valid one covers this payment.
+
+    Returns a (response dict, HTTP status) pair. Callers must hold the
+    student's issuance lock; see issue_gatepass_once.
+    """
+    student_id = contact.student_id
+    # Passes carry the canonical number, which inbound senders are matched against
+    whatsapp_number = contact.preferred_phone_e164 or contact.preferred_phone_number
+    # Check existing gate pass
+    existing_pass = session.query(GatePass).filter(
+        GatePass.student_id == student_id,
+        GatePass.expiry_date >= issued_date
+    ).first()
+    if existing_pass and existing_pass.payment_percentage >= payment_percentage:
+        logger.info("Existing gate pass for %s is valid until %s", student_id, existing_pass.expiry_date)
+        return {
+            "status": "Gate pass not updated",
+            "pass_id": existing_pass.pass_id,
+            "expiry_date": existing_pass.expiry_date.isoformat(),
+            "whatsapp_number": whatsapp_number
+        }, 200
+
+    # Generate unique pass ID
+    pass_id = str(uuid.uuid4())
+    pass_fields = dict(
+        pass_id=pass_id,
+        student_id=student_id,
+        firstname=contact.firstname,
+        lastname=contact.lastname,
+        issued_date=issued_date,
+        expiry_date=expiry_date,
+        payment_percentage=payment_percentage,
+        whatsapp_number=whatsapp_number
+    )
+    try:
+        stored = store_gatepass_media(pass_fields)
+    except RuntimeError as e:
+        logger.error("Gate pass rendering failed for %s: %s", student_id, e)
+        return {"error": str(e)}, 500
+
+    # Save to database
+    gate_pass = GatePass(
+        student_id=student_id,
+        pass_id=pass_id,
+        issued_date=issued_date,
+        expiry_date=expiry_date,
+        payment_percentage=int(payment_percentage),
+        whatsapp_number=whatsapp_number,
+        last_updated=issued_date,
+        pdf_path=stored["pdf_path"],
+        qr_path=stored["qr_path"],
+        image_path=stored["image_path"]
+    )
+    session.add(gate_pass)
+    session.commit()
+
+    # Send the pass via WhatsApp, falling back to a text pass
+    _, message_sids = deliver_gatepass(whatsapp_number, stored["media_urls"], gatepass_text(**pass_fields), student_id)
+    if message_sids:
+        record_delivery(session, gate_pass, message_sids)
+        session.commit()
+    return {
+        "status": "Gate pass issued",
+        "pass_id": pass_id,
+        "expiry_date": expiry_date.isoformat(),
+        "whatsapp_number": whatsapp_number
+    }, 200
+
+def issue_gatepass_once(session, contact, term, payment_percentage, issued_date, expiry_date):
+    """Issue a pass with at most one issuance per student in flight.
+
+    Identical concurrent requests in this process wait for and share the
+    leader's result. Different requests for the same student are serialized
+    by a per-student lock, plus a PostgreSQL advisory lock across workers,
+    so the follower sees the leader's pass in the existing-pass check
+    instead of rendering again.
+    """
+    student_id = contact.student_id
+    flight_key = f"gatepass:{student_id}:{term}:{payment_percentage:.2f}"
+
+    def issue():
+        with _student_locks.hold(student_id), advisory_lock(session, f"gatepass:{student_id}"):
+            return issue_gatepass(session, contact, payment_percentage, issued_date, expiry_date)
+
+    return _issuance_flight.do(flight_key, issue)
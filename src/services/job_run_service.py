@@ -0,0 +1,152 @@
+# src/services/job_run_service.py
+from src.utils.database import JobRun, JobRunItem
+from src.utils.logger import setup_logger
+from config import get_config
+import datetime
+
+config = get_config()
+logger = setup_logger(__name__)
+
+RESUMABLE_STATUSES = ("running", "failed")
+
+def _now():
+    return datetime.datetime.now(datetime.UTC)
+
+def as_utc(value):
+    """SQLite hands back naive datetimes; treat them as UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=datetime.UTC)
+    return value
+
+def classify_result(result):
+    """Map a service result dict to an item status."""
+    if not isinstance(result, dict) or "error" in result:
+        return "failed"
+    if result.get("phone_number"):
+        return "succeeded"
+    return "skipped"
+
+def is_live(run):
+    """True when a running run has checkpointed within JOB_RUN_STALE_MINUTES."""
+    stale_before = _now() - datetime.timedelta(minutes=config.JOB_RUN_STALE_MINUTES)
+    return run.status == "running" and as_utc(run.heartbeat_at) >= stale_before
+
+def find_unfinished_run(session, job_name):
+    """Return the latest running or failed run for job_name, or None.
+
+    Unfinished runs older than JOB_RUN_RESUME_WINDOW_HOURS are marked
+    abandoned so a stale roster is never resumed.
+    """
+    now = _now()
+    resume_after = now - datetime.timedelta(hours=config.JOB_RUN_RESUME_WINDOW_HOURS)
+    runs = session.query(JobRun).filter(
+        JobRun.job_name == job_name,
+        JobRun.status.in_(RESUMABLE_STATUSES)
+    ).order_by(JobRun.started_at.desc()).all()
+    unfinished = None
+    for run in runs:
+        if as_utc(run.started_at) < resume_after:
+            run.status = "abandoned"
+            run.finished_at = now
+            logger.warning("Abandoned job run %s (%s) started at %s", run.id, job_name, run.started_at)
+        elif unfinished is None:
+            unfinished = run
+    session.commit()
+    return unfinished
+
+def start_or_resume_run(session, job_name, term, discover_student_ids):
+    """Resume an interrupted run of job_name or start a new one.
+
+    discover_student_ids is only called for new runs, so a resumed run costs
+    only its remaining items. It returns student IDs, or dicts of JobRunItem
+    fields (student_id, balance, scheduled_for) in processing order.
+    Returns None when another worker holds a live run.
+    """
+    run = find_unfinished_run(session, job_name)
+    if run is not None:
+        if is_live(run):
+            logger.info("Job run %s (%s) is already in progress; skipping", run.id, job_name)
+            return None
+        run.status = "running"
+        run.resume_count += 1
+        run.heartbeat_at = _now()
+        run.error = None
+        session.commit()
+        logger.info("Resuming job run %s (%s) at checkpoint: %s of %s students remaining", run.id, job_name, pending_count(session, run), run.total_items)
+        return run
+
+    discovered = discover_student_ids()
+    if all(isinstance(entry, str) for entry in discovered):
+        planned = [{"student_id": student_id} for student_id in sorted(set(discovered))]
+    else:
+        planned = list(discovered)
+    run = JobRun(job_name=job_name, term=term, status="running", total_items=len(planned))
+    session.add(run)
+    session.flush()
+    session.add_all(JobRunItem(run_id=run.id, **fields) for fields in planned)
+    session.commit()
+    logger.info("Started job run %s (%s) for %s students", run.id, job_name, len(planned))
+    return run
+
+def pending_items(session, run):
+    """Items of a run that have not been processed yet, in a stable order."""
+    return session.query(JobRunItem).filter_by(run_id=run.id, status="pending").order_by(JobRunItem.id).all()
+
+def pending_count(session, run):
+    return session.query(JobRunItem).filter_by(run_id=run.id, status="pending").count()
+
+def record_item(session, run, item, result):
+    """Checkpoint a processed student and update the run counters.
+
+    Counters are incremented in SQL so shard workers in separate processes
+    can checkpoint the same run concurrently.
+    """
+    status = classify_result(result)
+    item.status = status
+    item.detail = str(result.get("error") or result.get("status")) if isinstance(result, dict) else str(result)
+    item.processed_at = _now()
+    counter = getattr(JobRun, status)
+    session.query(JobRun).filter_by(id=run.id).update(
+        {counter: counter + 1, JobRun.heartbeat_at: item.processed_at},
+        synchronize_session=False
+    )
+    session.commit()
+    return status
+
+def finish_run(session, run, status, error=None):
+    """Mark a run finished and record its duration."""
+    session.refresh(run)
+    run.status = status
+    run.error = error
+    run.finished_at = _now()
+    run.heartbeat_at = run.finished_at
+    run.duration_seconds = (run.finished_at - as_utc(run.started_at)).total_seconds()
+    session.commit()
+    logger.info("Job run %s (%s) %s: %s", run.id, run.job_name, status, run_summary(run))
+
+def run_summary(run):
+    """Serializable summary of a run, including throughput."""
+    processed = run.succeeded + run.skipped + run.failed
+    return {
+        "run_id": run.id,
+        "job_name": run.job_name,
+        "term": run.term,
+        "status": run.status,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "duration_seconds": run.duration_seconds,
+        "resume_count": run.resume_count,
+        "total_items": run.total_items,
+        "succeeded": run.succeeded,
+        "skipped": run.skipped,
+        "failed": run.failed,
+        "students_per_second": round(processed / run.duration_seconds, 3) if run.duration_seconds else None,
+        "error": run.error
+    }
+
+def list_runs(session, job_name=None, limit=20):
+    """Most recent runs, newest first."""
+    query = session.query(JobRun)
+    if job_name:
+        query = query.filter_by(job_name=job_name)
+    return query.order_by(JobRun.started_at.desc()).limit(limit).all()
@@ -1,10 +1,13 @@
 # src/services/payment_service.py
 from src.api.sms_client import SMSClient
 from src.utils.whatsapp import send_whatsapp_message
+from src.utils.messages import PAYMENT_CONFIRMATION, render_payment_confirmation
 from src.utils.logger import setup_logger
+from src.services.contact_service import lookup_contact, DEFAULT_FULLNAME
+from src.services.financial_snapshot_service import get_financial_snapshot
+from src.services.gatepass_service import gatepass_expiry, issue_gatepass_once
 from src.utils.database import init_db, StudentContact
 import datetime
-from flask import current_app
 
 logger = setup_logger(__name__)
 
@@ -15,145 +18,80 @@ TERM_END_DATES = {
     "2025-3": datetime.datetime(2025, 11, 30)
 }
 
-def check_new_payments(student_id, term, phone_number=None):
-    """Check for new payments, send confirmation, and generate gate pass if applicable."""
+def check_new_payments(student_id, term, phone_number=None, outbox=None):
+    """Check for new payments, send confirmation, and generate gate pass if applicable.
+
+    With an outbox the confirmation is queued for coalescing instead of sent immediately.
+    """
     try:
         client = SMSClient()
-        session = init_db()
-
-        logger.debug(f"Database session initialized for {student_id}")
-        contacts = session.query(StudentContact).all()
-        logger.debug(f"All contacts: {[(c.student_id, c.firstname, c.lastname, c.preferred_phone_number) for c in contacts]}")
-
-        # Get contact
-        if not phone_number:
-            contact = session.query(StudentContact).filter_by(student_id=student_id).first()
-            if contact:
-                phone_number = contact.preferred_phone_number
-                fullname = f"{contact.firstname} {contact.lastname}".strip() if contact.firstname and contact.lastname else "Parent/Guardian"
-                logger.info(f"Found DB contact for {student_id}: {phone_number}")
-            else:
-                logger.debug(f"No contact in DB, fetching via API for {student_id}")
-                try:
-                    profile = client.get_student_profile(student_id)
-                    logger.debug(f"Profile data for {student_id}: {profile}")
-
-                    if not isinstance(profile, dict):
-                        logger.error(f"Invalid profile format (not dict): {profile}")
-                        return {"error": "Invalid profile format"}
-
-                    profile_data = profile.get("data", {})
-                    firstname = profile_data.get("firstname")
-                    lastname = profile_data.get("lastname")
-                    student_mobile = profile_data.get("student_mobile")
-                    guardian_mobile = profile_data.get("guardian_mobile_number")
-
-                    if student_mobile and not student_mobile.startswith("+"):
-                        student_mobile = f"+263{student_mobile.lstrip('0')}"
-                    if guardian_mobile and not guardian_mobile.startswith("+"):
-                        guardian_mobile = f"+263{guardian_mobile.lstrip('0')}"
-
-                    phone_number = student_mobile or guardian_mobile
-                    if not phone_number:
-                        logger.error(f"No phone number found in profile for {student_id}")
-                        return {"error": "No phone number found in profile"}
-
-                    fullname = f"{firstname} {lastname}".strip() if firstname and lastname else "Parent/Guardian"
 
-                    # Cache in DB
-                    contact = StudentContact(
-                        student_id=student_id,
-                        firstname=firstname,
-                        lastname=lastname,
-                        student_mobile=student_mobile,
-                        guardian_mobile_number=guardian_mobile,
-                        preferred_phone_number=phone_number,
-                        last_updated=datetime.datetime.utcnow()
-                    )
-                    session.add(contact)
-                    session.commit()
-                    logger.info(f"Cached contact for {student_id}: {phone_number}")
-                except Exception as e:
-                    logger.error(f"Failed to fetch profile for {student_id}: {str(e)}")
-                    return {"error": f"Failed to fetch profile: {str(e)}"}
+        if phone_number:
+            fullname = DEFAULT_FULLNAME
+        else:
+            contact, error = lookup_contact(student_id, client)
+            if error:
+                return {"error": error}
+            phone_number, fullname = contact.phone_number, contact.fullname
+            logger.info("Found contact for %s: %s", student_id, phone_number)
 
         if not phone_number:
-            logger.error(f"No phone number available after profile/DB lookup for {student_id}")
+            logger.error("No phone number available after profile/DB lookup for %s", student_id)
             return {"error": "Phone number required"}
 
-        # Fetch payments
+        # Payments and account statement, shared with the discovery pass of batch runs
         try:
-            payment_data = client.get_student_payments(student_id, term)
-            logger.debug(f"Raw payment response: {payment_data}")
-
-            if not isinstance(payment_data, dict):
-                logger.error(f"Expected dict for payments, got {type(payment_data)}: {payment_data}")
-                return {"error": "Invalid payment data: not a dict"}
-
-            if "data" not in payment_data:
-                logger.error(f"Missing 'data' key in payments for {student_id}")
-                return {"error": "Missing 'data' key in payment response"}
+            snapshot = get_financial_snapshot(student_id, term, client)
         except Exception as e:
-            if "404 Client Error" in str(e):
-                logger.info(f"No payments found for {student_id} in term {term}")
-                return {"status": f"No payments found for {student_id}"}
-            logger.error(f"Failed to fetch payments for {student_id}: {str(e)}")
+            logger.error("Failed to fetch financial snapshot for %s: %s", student_id, e)
             return {"error": f"Failed to fetch payments: {str(e)}"}
 
-        if not payment_data.get("data"):
-            logger.info(f"No new payments found for {student_id}")
+        if not snapshot["payment_count"]:
+            logger.info("No new payments found for %s", student_id)
             return {"status": f"No new payments for {student_id}"}
 
-        # Calculate total paid
-        try:
-            valid_payments = [
-                payment for payment in payment_data["data"]
-                if isinstance(payment, dict) and "amount" in payment
-            ]
-            if not valid_payments:
-                logger.warning(f"Payment data contains no valid 'amount' fields: {payment_data['data']}")
-                return {"status": f"No valid payments for {student_id}"}
-            total_paid = sum(payment["amount"] for payment in valid_payments)
-        except Exception as e:
-            logger.error(f"Error processing payments for {student_id}: {str(e)}")
-            return {"error": f"Error calculating total payments: {str(e)}"}
-
+        total_paid = snapshot["total_paid"]
         if total_paid <= 0:
-            logger.info(f"Payments exist but none are valid (> 0) for {student_id}")
+            logger.info("Payments exist but none are valid (> 0) for %s", student_id)
             return {"status": f"No valid payments for {student_id}"}
+        total_fees = snapshot["total_fees"]
+        balance = snapshot["balance"]
 
-        # Fetch account statement
-        try:
-            statement = client.get_student_account_statement(student_id, term)
-            logger.debug(f"Statement for {student_id}: {statement}")
-            total_fees = statement.get("data", {}).get("total_fees", 1000.0)  # Fallback if total_fees is missing
-            balance = statement.get("data", {}).get("balance", 0)
-        except Exception as e:
-            logger.error(f"Failed to fetch account statement: {str(e)}")
-            return {"error": f"Failed to fetch account statement: {str(e)}"}
-
-        # Generate gate pass if payment meets threshold
+        # Generate gate pass if payment meets threshold. Issued directly rather
+        # than through /generate-gatepass: shard workers and scheduler threads
+        # have no Flask application context.
         payment_percentage = (total_paid / total_fees) * 100
-        if payment_percentage >= 50:
-            with current_app.test_client() as client:
-                response = client.post(
-                    f"/generate-gatepass?student_id={student_id}&term={term}&payment_amount={total_paid}&total_fees={total_fees}"
-                )
-                if response.status_code != 200:
-                    logger.error(f"Failed to generate gate pass for {student_id}: {response.json}")
-                    return {"error": f"Failed to generate gate pass: {response.json.get('error')}"}
-                logger.info(f"Gate pass generated for {student_id}: {response.json}")
+        issued_date = datetime.datetime.now(datetime.UTC)
+        expiry_date = gatepass_expiry(term, payment_percentage, issued_date)
+        if expiry_date is not None:
+            session = init_db()
+            try:
+                contact = session.query(StudentContact).filter_by(student_id=student_id).first()
+                if not contact:
+                    logger.error("No contact found for gate pass of %s", student_id)
+                    return {"error": "Failed to generate gate pass: No contact found"}
+                result, status = issue_gatepass_once(session, contact, term, payment_percentage, issued_date, expiry_date)
+            finally:
+                session.close()
+            if status != 200:
+                logger.error("Failed to generate gate pass for %s: %s", student_id, result)
+                return {"error": f"Failed to generate gate pass: {result.get('error')}"}
+            logger.info("Gate pass generated for %s: %s", student_id, result)
+
+        if outbox is not None:
+            outbox.add(phone_number, PAYMENT_CONFIRMATION, {
+                "student_id": student_id, "fullname": fullname, "amount": total_paid, "balance": balance, "term": term
+            })
+            logger.info("Payment confirmation queued for %s to %s", student_id, phone_number)
+            return {"status": "Payment confirmation queued", "phone_number": phone_number, "queued": True}
 
         # Send payment confirmation
-        message = (
-            f"Dear {fullname}, thank you for your payment of ${total_paid} for {student_id} (Term {term}). "
-            f"Your current balance is ${balance}."
-        )
+        message = render_payment_confirmation(fullname, student_id, total_paid, balance, term)
         send_whatsapp_message(phone_number, message)
-        logger.info(f"Sent payment confirmation for {student_id} to {phone_number}")
+        logger.info("Sent payment confirmation for %s to %s", student_id, phone_number)
 
         return {"status": "Payment confirmation sent", "phone_number": phone_number}
 
     except Exception as e:
-        logger.error(f"Unhandled error in check_new_payments for {student_id}: {str(e)}")
+        logger.error("Unhandled error in check_new_payments for %s: %s", student_id, e)
         return {"error": str(e)}
\ No newline at end of file
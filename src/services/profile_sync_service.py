@@ -1,11 +1,68 @@
 # src/services/profile_sync_service.py
 from src.api.sms_client import SMSClient
 from src.utils.database import init_db, StudentContact
+from src.services.contact_service import contact_fields_from_profile, load_contacts
 from src.utils.logger import setup_logger
+from src.utils.tracing import propagate
+from config import get_config
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import IntegrityError
 import datetime
 
+config = get_config()
 logger = setup_logger(__name__)
 
+def get_profiles_bulk(session, student_ids, max_workers=None):
+    """Resolve many student profiles in one round trip.
+
+    Hits come from a single IN query; misses are fetched from the SMS API
+    concurrently (at most PROFILE_FETCH_CONCURRENCY at a time) and inserted
+    in one transaction. Returns (contacts by student_id, errors by student_id).
+    """
+    contacts = load_contacts(session, student_ids)
+    misses = [student_id for student_id in student_ids if student_id not in contacts]
+    errors = {}
+    if not misses:
+        return contacts, errors
+
+    client = SMSClient()
+
+    def fetch(student_id):
+        try:
+            return student_id, contact_fields_from_profile(client.get_student_profile(student_id)), None
+        except Exception as e:
+            return student_id, None, str(e)
+
+    max_workers = max_workers or config.PROFILE_FETCH_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as executor:
+        fetched = list(executor.map(propagate(fetch), misses))
+
+    now = datetime.datetime.now(datetime.UTC)
+    new_contacts = []
+    for student_id, fields, error in fetched:
+        if error:
+            errors[student_id] = f"Profile not found: {error}"
+        elif not fields:
+            errors[student_id] = "No phone number in profile"
+        else:
+            new_contacts.append(StudentContact(student_id=student_id, last_updated=now, **fields))
+
+    if new_contacts:
+        try:
+            session.add_all(new_contacts)
+            session.commit()
+        except IntegrityError:
+            # Another request cached some of these meanwhile; keep theirs and insert the rest
+            session.rollback()
+            existing = load_contacts(session, [contact.student_id for contact in new_contacts])
+            contacts.update(existing)
+            new_contacts = [contact for contact in new_contacts if contact.student_id not in existing]
+            session.add_all(new_contacts)
+            session.commit()
+        contacts.update((contact.student_id, contact) for contact in new_contacts)
+        logger.info("Cached %s profiles from API in bulk", len(new_contacts))
+    return contacts, errors
+
 def sync_student_profiles():
     """Sync student profiles from /students/accounts-in-debt and /student/payments/."""
     try:
@@ -17,9 +74,9 @@ def sync_student_profiles():
         try:
             debt_data = client.get_students_in_debt()
             student_ids.update(student["student"]["student_number"] for student in debt_data.get("data", []))
-            logger.info(f"Fetched {len(student_ids)} students from /students/accounts-in-debt")
+            logger.info("Fetched %s students from /students/accounts-in-debt", len(student_ids))
         except Exception as e:
-            logger.error(f"Error fetching students in debt: {str(e)}")
+            logger.error("Error fetching students in debt: %s", e)
 
         # Fetch students with recent payments (last 30 days)
         try:
@@ -29,57 +86,41 @@ def sync_student_profiles():
                     if payment_data.get("data"):
                         student_ids.add(student_id)
                 except Exception as e:
-                    logger.debug(f"No payments for {student_id}: {str(e)}")
-            logger.info(f"Total students to sync: {len(student_ids)}")
+                    logger.debug("No payments for %s: %s", student_id, e)
+            logger.info("Total students to sync: %s", len(student_ids))
         except Exception as e:
-            logger.error(f"Error checking payments: {str(e)}")
+            logger.error("Error checking payments: %s", e)
 
-        # Sync profiles
+        # Sync profiles; existing contacts come from one batched load
+        existing = load_contacts(session, student_ids)
         for student_id in student_ids:
             try:
                 profile = client.get_student_profile(student_id)
-                profile_data = profile.get("data", {})
-                firstname = profile_data.get("firstname")
-                lastname = profile_data.get("lastname")
-                student_mobile = profile_data.get("student_mobile")  # Parent's number
-                guardian_mobile = profile_data.get("guardian_mobile_number")
-                
-                # Format phone numbers
-                if student_mobile and not student_mobile.startswith("+"):
-                    student_mobile = f"+263{student_mobile.lstrip('0')}"
-                if guardian_mobile and not guardian_mobile.startswith("+"):
-                    guardian_mobile = f"+263{guardian_mobile.lstrip('0')}"
-                preferred_phone = student_mobile or guardian_mobile
-                if not preferred_phone:
-                    logger.warning(f"No phone number for {student_id}; skipping")
+                fields = contact_fields_from_profile(profile)
+                if not fields:
+                    logger.warning("No phone number for %s; skipping", student_id)
                     continue
 
                 # Update or insert contact
-                contact = session.query(StudentContact).filter_by(student_id=student_id).first()
+                contact = existing.get(student_id)
                 if contact:
-                    contact.firstname = firstname
-                    contact.lastname = lastname
-                    contact.student_mobile = student_mobile
-                    contact.guardian_mobile_number = guardian_mobile
-                    contact.preferred_phone_number = preferred_phone
+                    for field, value in fields.items():
+                        setattr(contact, field, value)
                     contact.last_updated = datetime.datetime.utcnow()
-                    logger.info(f"Updated profile for {student_id}")
+                    logger.info("Updated profile for %s", student_id)
                 else:
                     contact = StudentContact(
                         student_id=student_id,
-                        firstname=firstname,
-                        lastname=lastname,
-                        student_mobile=student_mobile,
-                        guardian_mobile_number=guardian_mobile,
-                        preferred_phone_number=preferred_phone,
-                        last_updated=datetime.datetime.utcnow()
+                        last_updated=datetime.datetime.utcnow(),
+                        **fields
                     )
                     session.add(contact)
-                    logger.info(f"Added profile for {student_id}")
+                    existing[student_id] = contact
+                    logger.info("Added profile for %s", student_id)
                 session.commit()
             except Exception as e:
-                logger.error(f"Error syncing profile for {student_id}: {str(e)}")
+                logger.error("Error syncing profile for %s: %s", student_id, e)
                 continue
     except Exception as e:
-        logger.error(f"Error syncing profiles: {str(e)}")
+        logger.error("Error syncing profiles: %s", e)
         raise
\ No newline at end of file
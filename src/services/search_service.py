@@ -0,0 +1,269 @@
+# src/services/search_service.py
+from src.utils.database import get_engine, StudentContact
+from src.services.contact_service import allow_contact_scans
+from src.utils.metrics import timer
+from src.utils.phone import normalize_phone
+from src.utils.logger import setup_logger
+from config import get_config
+from sqlalchemy import func, literal, literal_column, or_, and_, text
+import bisect
+import collections
+import math
+import re
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+# What a search result needs from a contact; the same for both backends
+SearchEntry = collections.namedtuple("SearchEntry", ["student_id", "firstname", "lastname", "phone_number", "phones", "fullname", "word_trigrams"])
+
+SEARCH_COLUMNS = (
+    StudentContact.student_id, StudentContact.firstname, StudentContact.lastname, StudentContact.preferred_phone_number,
+    StudentContact.preferred_phone_e164, StudentContact.guardian_mobile_e164, StudentContact.student_mobile_e164
+)
+
+_WORDS = re.compile(r"[0-9a-z]+")
+_PHONE_QUERY = re.compile(r"^[\d\s\-+().]+$")
+
+def _entry(row):
+    phones = tuple(dict.fromkeys(phone.lstrip("+") for phone in row[4:7] if phone))
+    fullname = f"{row.firstname or ''} {row.lastname or ''}".lower()
+    word_trigrams = tuple(trigrams(word) for word in fullname.split())
+    return SearchEntry(row.student_id, row.firstname, row.lastname, row.preferred_phone_number, phones, fullname, word_trigrams)
+
+def trigrams(value):
+    """Trigrams as pg_trgm extracts them: per lowercase word, padded with two spaces before and one after."""
+    grams = set()
+    for word in _WORDS.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+def similarity(left, right):
+    """pg_trgm similarity(): shared trigrams over distinct trigrams of both."""
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+class SearchQuery:
+    """A search string split into the parts each kind of match uses."""
+    def __init__(self, raw):
+        self.raw = " ".join(raw.split())
+        self.id_prefix = self.raw.upper() if self.raw and " " not in self.raw else None
+        digits = re.sub(r"\D", "", self.raw)
+        self.phone_digits = None
+        if _PHONE_QUERY.match(self.raw) and len(digits) >= config.SEARCH_MIN_PHONE_DIGITS:
+            # Full local or international numbers match on their E.164 form, fragments as written
+            normalized = normalize_phone(self.raw) if len(digits) >= 9 else None
+            self.phone_digits = normalized.lstrip("+") if normalized else digits
+        self.name_tokens = _WORDS.findall(self.raw.lower()) if re.search(r"[a-zA-Z]", self.raw) else []
+        self.token_trigrams = [trigrams(token) for token in self.name_tokens]
+
+def _name_prefix_match(entry, query):
+    words = entry.fullname.split()
+    return all(any(word.startswith(token) for word in words) for token in query.name_tokens)
+
+def score(entry, query):
+    """Rank of one contact for a query (0 = no match) and what matched.
+
+    Exact IDs and full phone numbers rank first, then ID prefixes and phone
+    suffixes by how much of the value they cover, then names where every
+    query word starts a name word, then misspelt names by the trigram
+    similarity of each query word to its closest name word.
+    """
+    best, matched = 0.0, None
+    if query.id_prefix and entry.student_id.upper().startswith(query.id_prefix):
+        value = 100.0 if len(query.id_prefix) == len(entry.student_id) else 70 + 20 * len(query.id_prefix) / len(entry.student_id)
+        best, matched = value, "student_id"
+    if query.phone_digits:
+        for phone in entry.phones:
+            if phone.endswith(query.phone_digits):
+                value = 95.0 if phone == query.phone_digits else 50 + 30 * len(query.phone_digits) / len(phone)
+                if value > best:
+                    best, matched = value, "phone"
+    if query.name_tokens:
+        if _name_prefix_match(entry, query):
+            words = entry.fullname.split()
+            exact = sum(token in words for token in query.name_tokens)
+            covered = sum(len(token) for token in query.name_tokens) / max(1, len("".join(words)))
+            value = 40 + 10 * exact / len(query.name_tokens) + 10 * covered
+        else:
+            closest = [max((similarity(grams, word) for word in entry.word_trigrams), default=0.0) for grams in query.token_trigrams]
+            value = 40 * sum(closest) / len(closest)
+        if value > best:
+            best, matched = value, "name"
+    return round(best, 2), matched
+
+def _prefix_range(ordered, prefix, limit):
+    """Values of (key, value) pairs in sorted list ordered whose key starts with prefix."""
+    found = []
+    position = bisect.bisect_left(ordered, (prefix,))
+    while position < len(ordered) and len(found) < limit and ordered[position][0].startswith(prefix):
+        found.append(ordered[position][1])
+        position += 1
+    return found
+
+class ContactSearchIndex:
+    """In-process search index over all contacts, for SQLite or Postgres without pg_trgm.
+
+    Student IDs and name words are kept sorted for prefix lookups, phone
+    digits reversed so suffixes become prefixes, and the trigrams of each
+    distinct name word in an inverted index for misspelt names.
+    """
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.entries = [_entry(row) for row in rows]
+        self._ids = sorted((entry.student_id.upper(), index) for index, entry in enumerate(self.entries))
+        self._phones = sorted({(phone[::-1], index) for index, entry in enumerate(self.entries) for phone in entry.phones})
+        self._words = sorted({(word, index) for index, entry in enumerate(self.entries) for word in entry.fullname.split()})
+        # Misspellings are matched per word against the distinct name words,
+        # far fewer than contacts: trigram -> words, word -> contacts
+        self._word_entries = collections.defaultdict(list)
+        for word, index in self._words:
+            self._word_entries[word].append(index)
+        self._word_trigrams = {word: trigrams(word) for word in self._word_entries}
+        self._trigram_words = collections.defaultdict(list)
+        for word, grams in self._word_trigrams.items():
+            for gram in grams:
+                self._trigram_words[gram].append(word)
+
+    def _similar_words(self, token):
+        # A word at the similarity threshold shares at least `needed` of the
+        # token's trigrams, so it contains one of the rarest len - needed + 1
+        token_grams = trigrams(token)
+        grams = sorted(token_grams, key=lambda gram: len(self._trigram_words.get(gram, ())))
+        needed = max(1, math.ceil(config.SEARCH_NAME_SIMILARITY * len(grams)))
+        candidates = set()
+        for gram in grams[:len(grams) - needed + 1]:
+            candidates.update(self._trigram_words.get(gram, ()))
+        return [word for word in candidates if similarity(token_grams, self._word_trigrams[word]) >= config.SEARCH_NAME_SIMILARITY]
+
+    def _fuzzy(self, query, limit):
+        """Contacts with a name word similar to each query word that resembles any name at all."""
+        matches = None
+        for token in query.name_tokens:
+            token_matches = {index for word in self._similar_words(token) for index in self._word_entries[word]}
+            if token_matches:
+                matches = token_matches if matches is None else matches & token_matches
+        return sorted(matches or ())[:limit]
+
+    def candidates(self, query, limit):
+        found = set()
+        if query.id_prefix:
+            found.update(_prefix_range(self._ids, query.id_prefix, limit))
+        if query.phone_digits:
+            found.update(_prefix_range(self._phones, query.phone_digits[::-1], limit))
+        if query.name_tokens:
+            matches = None
+            for token in query.name_tokens:
+                token_matches = set(_prefix_range(self._words, token, len(self.entries)))
+                matches = token_matches if matches is None else matches & token_matches
+            # Misspellings are only looked for when no name starts with the query words
+            found.update(sorted(matches)[:limit] if matches else self._fuzzy(query, limit))
+        return [self.entries[index] for index in found]
+
+_index = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+def _contact_index(session):
+    """The process-wide index, rebuilt when the contact count or latest last_updated changes.
+
+    The check runs at most every SEARCH_INDEX_REFRESH_SECONDS, so new or
+    edited contacts can take that long to appear in results.
+    """
+    global _index, _index_checked
+    with _index_lock:
+        if _index is not None and time.monotonic() - _index_checked < config.SEARCH_INDEX_REFRESH_SECONDS:
+            return _index
+        with allow_contact_scans():
+            version = tuple(session.query(func.count(StudentContact.id), func.max(StudentContact.last_updated)).one())
+            if _index is None or _index.version != version:
+                started = time.perf_counter()
+                _index = ContactSearchIndex(session.query(*SEARCH_COLUMNS), version)
+                logger.info("Built contact search index over %s contacts in %.1f ms", len(_index.entries), (time.perf_counter() - started) * 1000)
+        _index_checked = time.monotonic()
+        return _index
+
+_trigram_support = {}
+
+def _has_pg_trgm(session):
+    engine = get_engine()
+    if engine not in _trigram_support:
+        _trigram_support[engine] = engine.dialect.name == "postgresql" and bool(
+            session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+        )
+        if engine.dialect.name == "postgresql" and not _trigram_support[engine]:
+            logger.warning("pg_trgm is not installed; student search uses the in-process index")
+    return _trigram_support[engine]
+
+def _database_candidates(session, query, limit):
+    """Candidates from Postgres using the prefix and trigram indexes."""
+    # Same expression as FULLNAME_SQL, which the trigram index is built on
+    fullname = func.lower(
+        func.coalesce(StudentContact.firstname, literal_column("''")).op("||")(literal_column("' '"))
+        .op("||")(func.coalesce(StudentContact.lastname, literal_column("''")))
+    )
+    conditions = []
+    if query.id_prefix:
+        conditions.append(func.upper(StudentContact.student_id).startswith(query.id_prefix, autoescape=True))
+    if query.phone_digits:
+        conditions += [column.endswith(query.phone_digits, autoescape=True) for column in SEARCH_COLUMNS[4:7]]
+    if query.name_tokens:
+        conditions.append(and_(*[fullname.contains(token, autoescape=True) for token in query.name_tokens]))
+    entries = {}
+    if conditions:
+        entries = {row.student_id: _entry(row) for row in session.query(*SEARCH_COLUMNS).filter(or_(*conditions)).limit(limit)}
+    # Misspellings, as in the in-process index, only when no name starts with the query words
+    if query.name_tokens and not any(_name_prefix_match(entry, query) for entry in entries.values()):
+        # token <% name: some word of the name is similar to the token (index-assisted)
+        session.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(config.SEARCH_NAME_SIMILARITY)}
+        )
+        closeness = sum(func.word_similarity(token, fullname) for token in query.name_tokens)
+        similar = session.query(*SEARCH_COLUMNS).filter(
+            or_(*[literal(token).op("<%")(fullname) for token in query.name_tokens])
+        ).order_by(closeness.desc()).limit(limit)
+        entries.update((row.student_id, _entry(row)) for row in similar)
+    return list(entries.values())
+
+def search_students(session, raw_query, page=1, page_size=20):
+    """Ranked contacts matching an ID prefix, phone number suffix or (partial, misspelt) name.
+
+    Returns (results for the page, total matches). Total is capped at
+    SEARCH_MAX_RESULTS; each result is a dict with the contact fields, its
+    score and which field matched.
+    """
+    query = SearchQuery(raw_query)
+    if not query.raw:
+        return [], 0
+    limit = config.SEARCH_MAX_RESULTS
+    if _has_pg_trgm(session):
+        with timer("student_search", backend="pg_trgm"):
+            entries = _database_candidates(session, query, limit)
+    else:
+        with timer("student_search", backend="memory"):
+            entries = _contact_index(session).candidates(query, limit)
+    ranked = []
+    for entry in entries:
+        value, matched = score(entry, query)
+        if value > 0:
+            ranked.append((-value, entry.student_id, matched, entry))
+    ranked.sort(key=lambda item: item[:2])
+    ranked = ranked[:limit]
+    start = (page - 1) * page_size
+    return [
+        {
+            "student_id": entry.student_id,
+            "firstname": entry.firstname,
+            "lastname": entry.lastname,
+            "phone_number": entry.phone_number,
+            "score": -negative_score,
+            "matched": matched
+        }
+        for negative_score, _, matched, entry in ranked[start:start + page_size]
+    ], len(ranked)
@@ -0,0 +1,51 @@
+# src/utils/clients.py
+from config import get_config
+import threading
+import urllib.parse
+
+config = get_config()
+
+# Clients are created on first use so importing the app does not pay for
+# loading the Twilio and AWS SDKs.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+def _rebased_twilio_http_client(base_url):
+    """Twilio HTTP client that sends every API call to base_url (e.g. the load-test stand-in)."""
+    from twilio.http.http_client import TwilioHttpClient
+
+    class RebasedHttpClient(TwilioHttpClient):
+        def request(self, method, url, *args, **kwargs):
+            parts = urllib.parse.urlsplit(url)
+            rebased = base_url.rstrip("/") + parts.path + (f"?{parts.query}" if parts.query else "")
+            return super().request(method, rebased, *args, **kwargs)
+
+    return RebasedHttpClient()
+
+def get_twilio_client():
+    """Shared Twilio REST client (pointed at TWILIO_API_BASE_URL when set)."""
+    def factory():
+        from twilio.rest import Client
+        http_client = _rebased_twilio_http_client(config.TWILIO_API_BASE_URL) if config.TWILIO_API_BASE_URL else None
+        return Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN, http_client=http_client)
+    return _get_or_create("twilio", factory)
+
+def get_s3_client():
+    """Shared boto3 S3 client (pointed at S3_ENDPOINT_URL when set)."""
+    def factory():
+        import boto3
+        options = {}
+        if config.S3_ENDPOINT_URL:
+            from botocore.config import Config
+            options = {"endpoint_url": config.S3_ENDPOINT_URL, "config": Config(s3={"addressing_style": "path"})}
+        return boto3.client("s3", aws_access_key_id=config.AWS_ACCESS_KEY_ID, aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY, **options)
+    return _get_or_create("s3", factory)
@@ -1,13 +1,25 @@
 # src/utils/database.py
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import create_engine, inspect, text, or_, and_, Column, String, Integer, Float, DateTime, ForeignKey, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, validates
+from src.utils.phone import normalize_phone
+from src.utils.metrics import instrument_engine
+from src.utils import tracing, query_budget
 import os
 import sys
+import threading
 import datetime
 
 Base = declarative_base()
 
+# Raw phone column -> canonical E.164 column kept in sync on write
+NORMALIZED_PHONE_COLUMNS = {
+    "student_mobile": "student_mobile_e164",
+    "guardian_mobile_number": "guardian_mobile_e164",
+    "preferred_phone_number": "preferred_phone_e164"
+}
+NORMALIZED_GATEPASS_COLUMNS = {"whatsapp_number": "whatsapp_e164"}
+
 class StudentContact(Base):
     __tablename__ = "student_contacts"
     id = Column(Integer, primary_key=True)
@@ -18,6 +30,15 @@ class StudentContact(Base):
     guardian_mobile_number = Column(String, nullable=True)
     preferred_phone_number = Column(String, nullable=False)
     last_updated = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
+    # Canonical E.164 copies of the phone columns, indexed for inbound sender lookup
+    student_mobile_e164 = Column(String, nullable=True, index=True)
+    guardian_mobile_e164 = Column(String, nullable=True, index=True)
+    preferred_phone_e164 = Column(String, nullable=True, index=True)
+
+    @validates(*NORMALIZED_PHONE_COLUMNS)
+    def _normalize_phone_on_write(self, key, value):
+        setattr(self, NORMALIZED_PHONE_COLUMNS[key], normalize_phone(value))
+        return value
 
 class GatePass(Base):
     __tablename__ = "gate_passes"
@@ -25,22 +46,223 @@ class GatePass(Base):
     student_id = Column(String, ForeignKey("student_contacts.student_id"), nullable=False)
     pass_id = Column(String, unique=True, nullable=False)  # Unique identifier for gate pass
     issued_date = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
-    expiry_date = Column(DateTime, nullable=False)
+    expiry_date = Column(DateTime, nullable=False, index=True)
     payment_percentage = Column(Integer, nullable=False)  # e.g., 50, 75, 100
     whatsapp_number = Column(String, nullable=False)  # Tied to preferred_phone_number
     last_updated = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
     pdf_path = Column(String, nullable=True)  # Temporary path for PDF file
     qr_path = Column(String, nullable=True)  # Temporary path for QR code file
+    image_path = Column(String, nullable=True)  # Storage key of the inline image variant
+    message_sid = Column(String, nullable=True, index=True)  # Twilio SID of the last message sent; all are in gate_pass_messages
+    whatsapp_e164 = Column(String, nullable=True, index=True)  # Canonical whatsapp_number, matched against inbound senders
 
-def init_db():
-    """Initialize database connection and return a session."""
+    @validates(*NORMALIZED_GATEPASS_COLUMNS)
+    def _normalize_phone_on_write(self, key, value):
+        setattr(self, NORMALIZED_GATEPASS_COLUMNS[key], normalize_phone(value))
+        return value
+
+class GatePassMessage(Base):
+    """One WhatsApp message (image, PDF) of a pass's latest delivery and its final Twilio status."""
+    __tablename__ = "gate_pass_messages"
+    id = Column(Integer, primary_key=True)
+    pass_id = Column(String, ForeignKey("gate_passes.pass_id"), nullable=False, index=True)
+    message_sid = Column(String, unique=True, nullable=False)
+    status = Column(String, nullable=True)  # delivered, failed or undelivered once final
+    last_updated = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
+
+class GatePassArchive(Base):
+    """Expired gate passes moved out of gate_passes by the sweeper."""
+    __tablename__ = "gate_pass_archive"
+    id = Column(Integer, primary_key=True)
+    student_id = Column(String, nullable=False, index=True)
+    pass_id = Column(String, unique=True, nullable=False)
+    issued_date = Column(DateTime)
+    expiry_date = Column(DateTime, nullable=False)
+    payment_percentage = Column(Integer, nullable=False)
+    whatsapp_number = Column(String, nullable=False)
+    last_updated = Column(DateTime)
+    message_sid = Column(String, nullable=True)
+    archived_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    id = Column(Integer, primary_key=True)
+    job_name = Column(String, nullable=False, index=True)  # e.g., send_all_reminders
+    term = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="running")  # running, completed, failed
+    started_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
+    heartbeat_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.UTC))  # Last checkpoint write
+    finished_at = Column(DateTime, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    resume_count = Column(Integer, nullable=False, default=0)
+    total_items = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+class JobRunItem(Base):
+    __tablename__ = "job_run_items"
+    __table_args__ = (UniqueConstraint("run_id", "student_id"),)
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("job_runs.id"), nullable=False, index=True)
+    student_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, succeeded, skipped, failed
+    balance = Column(Float, nullable=True)  # Outstanding balance captured when the run was planned
+    scheduled_for = Column(DateTime, nullable=True)  # Planned send slot for paced campaigns
+    detail = Column(Text, nullable=True)  # Status or error returned by the service call
+    processed_at = Column(DateTime, nullable=True)
+
+class WebhookResponse(Base):
+    __tablename__ = "webhook_responses"
+    key = Column(String, primary_key=True)  # Route path + Twilio MessageSid (+ status)
+    state = Column(String, nullable=False)  # in_flight or done
+    body = Column(Text, nullable=True)
+    http_status = Column(Integer, nullable=True)
+    mimetype = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class FinancialSnapshot(Base):
+    """SMS API payment figures per student and term, shared by all workers (financial_snapshot_service)."""
+    __tablename__ = "financial_snapshots"
+    student_id = Column(String, primary_key=True)
+    term = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)  # Bumped by every invalidation
+    data = Column(Text, nullable=True)  # JSON snapshot; NULL until fetched and after invalidation
+    expires_at = Column(DateTime, nullable=True)
+
+def find_contacts_by_phone(session, phone_number):
+    """All contacts linked to a phone number as student, guardian or preferred number.
+
+    The number is normalized first, so any common format resolves with a
+    single query over the indexed E.164 columns.
+    """
+    normalized = normalize_phone(phone_number)
+    if not normalized:
+        return []
+    return session.query(StudentContact).filter(or_(
+        StudentContact.preferred_phone_e164 == normalized,
+        StudentContact.guardian_mobile_e164 == normalized,
+        StudentContact.student_mobile_e164 == normalized
+    )).order_by(StudentContact.student_id).all()
+
+def _backfill_normalized(session, model, columns, batch_size):
+    """Fill NULL normalized columns of model from their raw columns. Returns rows changed."""
+    pending = or_(*[and_(getattr(model, raw).isnot(None), getattr(model, normalized).is_(None)) for raw, normalized in columns.items()])
+    changed = 0
+    last_id = 0
+    while True:
+        rows = session.query(model).filter(model.id > last_id, pending).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return changed
+        for row in rows:
+            before = [getattr(row, normalized) for normalized in columns.values()]
+            for raw, normalized in columns.items():
+                setattr(row, normalized, normalize_phone(getattr(row, raw)))
+            changed += before != [getattr(row, normalized) for normalized in columns.values()]
+        session.commit()
+        last_id = rows[-1].id
+
+def backfill_normalized_phones(session, batch_size=1000):
+    """Populate E.164 columns left NULL by older code, bulk loads or imports. Returns rows updated.
+
+    Only rows with a raw number but no normalized copy are read, so this is
+    cheap once caught up; numbers that cannot be normalized stay NULL.
+    """
+    return (
+        _backfill_normalized(session, StudentContact, NORMALIZED_PHONE_COLUMNS, batch_size)
+        + _backfill_normalized(session, GatePass, NORMALIZED_GATEPASS_COLUMNS, batch_size)
+    )
+
+def _add_missing_columns(engine):
+    """Add model columns missing from existing tables; create_all only creates new tables."""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    added.append(f"{table.name}.{column.name}")
+    return added
+
+def ensure_schema(engine):
+    """Create tables, add new columns and indexes, and backfill any missing normalized phones."""
+    Base.metadata.create_all(engine)
+    _add_missing_columns(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    ensure_search_indexes(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        backfilled = backfill_normalized_phones(session)
+        if backfilled:
+            print(f"📞 Backfilled normalized phone numbers for {backfilled} contacts and gate passes", file=sys.stderr)
+    finally:
+        session.close()
+
+# Student search (src/services/search_service.py): name expression shared by
+# the trigram index and the queries, so Postgres can match them up
+FULLNAME_SQL = "lower(coalesce(firstname, '') || ' ' || coalesce(lastname, ''))"
+SEARCH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_student_contacts_student_id_prefix ON student_contacts (upper(student_id) text_pattern_ops)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_student_contacts_fullname_trgm ON student_contacts USING gin (({FULLNAME_SQL}) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_student_contacts_phone_trgm ON student_contacts USING gin "
+    "(preferred_phone_e164 gin_trgm_ops, guardian_mobile_e164 gin_trgm_ops, student_mobile_e164 gin_trgm_ops)"
+]
+
+def ensure_search_indexes(engine):
+    """Create the Postgres prefix and trigram indexes for student search.
+
+    pg_trgm may need privileges the app user lacks; search then falls back
+    to the in-process index, so failures are reported and skipped.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    for statement in SEARCH_INDEXES:
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(statement))
+        except Exception as e:
+            print(f"⚠️  WARNING: could not create search index ({statement.split(' ON ')[0]}): {e}", file=sys.stderr)
+
+_engines = {}
+_sessionmakers = {}
+_engines_lock = threading.Lock()
+
+def get_engine():
+    """Return the process-wide engine for DATABASE_URL, creating the schema on first use."""
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
-        print("⚠️  WARNING: DATABASE_URL not set. Defaulting to local SQLite database.", file=sys.stderr)
-        print("📦 Using: sqlite:///data/contacts.db", file=sys.stderr)
         db_url = "sqlite:///data/contacts.db"
     if db_url.startswith("postgres://"):
         db_url = db_url.replace("postgres://", "postgresql://")
-    engine = create_engine(db_url)
-    Base.metadata.create_all(engine)
-    return sessionmaker(bind=engine)()
\ No newline at end of file
+    engine = _engines.get(db_url)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(db_url)
+            if engine is None:
+                if not os.getenv("DATABASE_URL"):
+                    print("⚠️  WARNING: DATABASE_URL not set. Defaulting to local SQLite database.", file=sys.stderr)
+                    print("📦 Using: sqlite:///data/contacts.db", file=sys.stderr)
+                engine = create_engine(db_url)
+                instrument_engine(engine)
+                tracing.instrument_engine(engine)
+                query_budget.instrument_engine(engine)
+                # DDL and the backfill are one-off startup work, not the budget of
+                # whichever request or batch item happened to open the engine
+                with query_budget.untracked():
+                    ensure_schema(engine)
+                _sessionmakers[engine] = sessionmaker(bind=engine)
+                _engines[db_url] = engine
+    return engine
+
+def init_db():
+    """Initialize database connection and return a session."""
+    return _sessionmakers[get_engine()]()
@@ -0,0 +1,46 @@
+# src/utils/http_cache.py
+from flask import request, Response
+from werkzeug.http import http_date, is_resource_modified
+from config import get_config
+import datetime
+import hashlib
+
+config = get_config()
+
+def _as_utc(value):
+    # SQLite hands back naive datetimes; they are stored as UTC
+    return value.replace(tzinfo=datetime.UTC) if value.tzinfo is None else value
+
+class Validators:
+    """ETag and Last-Modified for one resource version, from its key and last_updated column."""
+    def __init__(self, key, last_updated, max_age=None):
+        self.last_modified = _as_utc(last_updated).replace(microsecond=0)
+        self.etag = hashlib.sha1(f"{key}|{_as_utc(last_updated).isoformat()}".encode()).hexdigest()[:20]
+        self.max_age = config.CONDITIONAL_GET_MAX_AGE_SECONDS if max_age is None else max_age
+
+    def not_modified(self):
+        """True when the request's If-None-Match / If-Modified-Since already match this version."""
+        return not is_resource_modified(request.environ, etag=self.etag, last_modified=self.last_modified)
+
+    def headers(self):
+        cache_control = f"private, max-age={self.max_age}, must-revalidate" if self.max_age > 0 else "private, no-cache"
+        return {"ETag": f'"{self.etag}"', "Last-Modified": http_date(self.last_modified), "Cache-Control": cache_control}
+
+    def not_modified_response(self):
+        return Response(status=304, headers=self.headers())
+
+def validators_for(key, last_updated, max_age=None):
+    """Validators for a row, or None for rows saved without last_updated."""
+    return Validators(key, last_updated, max_age) if last_updated is not None else None
+
+def conditional(validators, body, status=200):
+    """Return body with the validators' headers, or an empty 304 if the client's copy is current.
+
+    body may be a callable so the payload is only built when it is sent.
+    Without validators (no last_updated) the response is sent unchanged.
+    """
+    if validators is None:
+        return (body() if callable(body) else body), status
+    if status == 200 and validators.not_modified():
+        return validators.not_modified_response()
+    return (body() if callable(body) else body), status, validators.headers()
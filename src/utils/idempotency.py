@@ -0,0 +1,178 @@
+# src/utils/idempotency.py
+from flask import request, current_app, Response
+from sqlalchemy.exc import IntegrityError
+from src.utils.database import init_db, WebhookResponse
+from src.utils.logger import setup_logger
+from config import get_config
+import collections
+import datetime
+import functools
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+NEW, IN_FLIGHT, DONE = "new", "in_flight", "done"
+
+class MemoryIdempotencyStore:
+    """Per-process store of webhook responses keyed by request identity, with a TTL."""
+    def __init__(self, ttl_seconds=None, max_entries=10000):
+        self.ttl_seconds = ttl_seconds or config.IDEMPOTENCY_TTL_SECONDS
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # key -> (expires_at, state, response)
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def begin(self, key):
+        """Claim key. Returns (NEW, None), (IN_FLIGHT, None) or (DONE, cached_response)."""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1], entry[2]
+            self._entries[key] = (now + self.ttl_seconds, IN_FLIGHT, None)
+            return NEW, None
+
+    def complete(self, key, cached):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, DONE, cached)
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class DatabaseIdempotencyStore:
+    """Store shared by all workers, backed by the webhook_responses table."""
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds or config.IDEMPOTENCY_TTL_SECONDS
+        self._claims = 0
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        now = datetime.datetime.now(datetime.UTC)
+        with self._lock:
+            self._claims += 1
+            purge = self._claims % 100 == 0
+        session = init_db()
+        try:
+            if purge:
+                session.query(WebhookResponse).filter(WebhookResponse.expires_at < now).delete(synchronize_session=False)
+                session.commit()
+            session.add(WebhookResponse(key=key, state=IN_FLIGHT, expires_at=now + datetime.timedelta(seconds=self.ttl_seconds)))
+            try:
+                session.commit()
+                return NEW, None
+            except IntegrityError:
+                session.rollback()
+            entry = session.get(WebhookResponse, key)
+            if entry is None:
+                return NEW, None
+            expires_at = entry.expires_at if entry.expires_at.tzinfo else entry.expires_at.replace(tzinfo=datetime.UTC)
+            if expires_at < now:
+                # Expired claim: take it over
+                entry.state = IN_FLIGHT
+                entry.body = None
+                entry.expires_at = now + datetime.timedelta(seconds=self.ttl_seconds)
+                session.commit()
+                return NEW, None
+            if entry.state == DONE:
+                return DONE, (entry.body, entry.http_status, entry.mimetype)
+            return IN_FLIGHT, None
+        finally:
+            session.close()
+
+    def complete(self, key, cached):
+        body, http_status, mimetype = cached
+        session = init_db()
+        try:
+            session.query(WebhookResponse).filter_by(key=key).update({
+                WebhookResponse.state: DONE,
+                WebhookResponse.body: body,
+                WebhookResponse.http_status: http_status,
+                WebhookResponse.mimetype: mimetype
+            })
+            session.commit()
+        finally:
+            session.close()
+
+    def release(self, key):
+        session = init_db()
+        try:
+            session.query(WebhookResponse).filter_by(key=key).delete()
+            session.commit()
+        finally:
+            session.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_idempotency_store():
+    """Process-wide store selected by IDEMPOTENCY_BACKEND (memory or database)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if config.IDEMPOTENCY_BACKEND == "database":
+                    _store = DatabaseIdempotencyStore()
+                else:
+                    _store = MemoryIdempotencyStore()
+    return _store
+
+# Seconds a retry that overlapped the original should wait before trying again
+IN_FLIGHT_RETRY_AFTER_SECONDS = 5
+
+def idempotent_webhook(key_for_request):
+    """Replay the stored response when Twilio retries a webhook it already delivered.
+
+    key_for_request() builds the idempotency key from the current request
+    (None disables deduplication for that request). A retry that arrives
+    while the first delivery is still being processed gets a 503 with
+    Retry-After instead of redoing the work, so it is delivered again if the
+    original fails. Responses with a 5xx status are not stored, so Twilio's
+    retry can run again.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = key_for_request()
+            if not key:
+                return view(*args, **kwargs)
+            store = get_idempotency_store()
+            state, cached = store.begin(key)
+            if state == DONE:
+                body, http_status, mimetype = cached
+                logger.info("Replaying stored response for duplicate webhook %s", key)
+                return Response(body, status=http_status, mimetype=mimetype)
+            if state == IN_FLIGHT:
+                logger.info("Duplicate webhook %s arrived while the original is in flight", key)
+                return Response("Request is already being processed", status=503, mimetype="text/plain",
+                                headers={"Retry-After": str(IN_FLIGHT_RETRY_AFTER_SECONDS)})
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                store.release(key)
+                raise
+            if response.status_code >= 500:
+                store.release(key)
+            else:
+                store.complete(key, (response.get_data(as_text=True), response.status_code, response.mimetype))
+            return response
+        return wrapper
+    return decorator
+
+def twilio_message_key(*fields):
+    """Key builder using the request's MessageSid plus any extra form fields."""
+    def key_for_request():
+        message_sid = request.form.get("MessageSid") or request.form.get("SmsSid")
+        if not message_sid:
+            return None
+        return ":".join([request.path, message_sid] + [request.form.get(field, "") for field in fields])
+    return key_for_request
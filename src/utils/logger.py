@@ -1,31 +1,122 @@
 # src/utils/logger.py
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import threading
 from config import get_config
 
+# Values after these keys (in "key: value", "key=value", dict reprs and
+# Authorization headers) are masked; phone numbers keep their last 3 digits.
+# Only phone shapes count: +<country>, 00<country>, 263 or a national 0
+# prefix, so timestamps, receipt numbers and IDs are left alone
+SECRET_PATTERN = re.compile(
+    r"""(?i)((?:api[_-]?key|auth[_-]?token|token|secret|password|authorization)['"]?\s*[:=]\s*['"]?(?:(?:Api-Key|Bearer|Basic|Token)\s+)?)[^\s'",}&]+"""
+)
+PHONE_PATTERN = re.compile(r"(?<![\w.+-])(?:\+\d|00\d|263|0[1-9])[\d -]{5,12}(\d{3})(?!\w|\.\d)")
+
+def redact(text):
+    """Mask API keys, tokens and phone numbers in a log message."""
+    text = SECRET_PATTERN.sub(r"\1[REDACTED]", text)
+    return PHONE_PATTERN.sub(r"***\1", text)
+
+class RedactingFilter(logging.Filter):
+    """Render the message once with its arguments and redact it."""
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        return True
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the current request/job correlation ID on the calling thread."""
+    def filter(self, record):
+        from src.utils.tracing import current_request_id
+        record.request_id = current_request_id()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        # Tracebacks arrive already appended to the message by QueueHandler.prepare()
+        return json.dumps(entry, default=str)
+
+_queue_handler = None
+_listener = None
+_setup_lock = threading.Lock()
+
+def _file_handler(config):
+    """Handler for LOG_FILE per LOG_ROTATION.
+
+    Every process has its own listener, so in-process size rotation would
+    have each gunicorn worker rename the file under the others; "external"
+    only reopens the file once logrotate (or similar) has moved it.
+    """
+    if config.LOG_ROTATION == "size":
+        return logging.handlers.RotatingFileHandler(
+            config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT
+        )
+    if config.LOG_ROTATION == "external":
+        return logging.handlers.WatchedFileHandler(config.LOG_FILE)
+    raise ValueError(f"Unknown LOG_ROTATION '{config.LOG_ROTATION}'; expected external or size")
+
+def _build_queue_handler(config):
+    """Start the background writer and return the handler every logger shares.
+
+    The calling thread puts the record on a queue after
+    QueueHandler.prepare() has merged the message with its arguments (and
+    any traceback); redaction, the output formats, console output and file
+    I/O happen on the listener thread.
+    """
+    global _listener
+    log_dir = os.path.dirname(config.LOG_FILE)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+    file_handler = _file_handler(config)
+    file_handler.setFormatter(
+        JsonFormatter() if config.LOG_FORMAT == "json"
+        else logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    redacting = RedactingFilter()
+    for handler in (file_handler, console_handler):
+        handler.addFilter(redacting)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # drain pending records on shutdown
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    return queue_handler
+
 def setup_logger(name):
-    """Set up logger with file and console output."""
+    """Set up a logger that hands records to the shared background writer."""
+    global _queue_handler
     config = get_config()
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, config.LOG_LEVEL))
 
-    # File handler
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
-    file_handler = logging.FileHandler("logs/app.log")
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    )
-
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    )
+    if _queue_handler is None:
+        with _setup_lock:
+            if _queue_handler is None:
+                _queue_handler = _build_queue_handler(config)
 
-    # Add handlers
     if not logger.handlers:  # Prevent duplicate handlers
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        logger.addHandler(_queue_handler)
 
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,51 @@
+# src/utils/messages.py
+REMINDER = "reminder"
+PAYMENT_CONFIRMATION = "payment_confirmation"
+
+def _student_label(entry):
+    name = entry.get("fullname")
+    if name and name != "Parent/Guardian":
+        return f"{name} ({entry['student_id']})"
+    return entry["student_id"]
+
+def render_balance_reminder(fullname, student_id, balance, term):
+    return (
+        f"Dear {fullname}, your child ({student_id}) has an outstanding balance of ${balance} for Term {term}. "
+        f"Kindly settle by June 30."
+    )
+
+def render_payment_confirmation(fullname, student_id, amount, balance, term):
+    return (
+        f"Dear {fullname}, thank you for your payment of ${amount} for {student_id} (Term {term}). "
+        f"Your current balance is ${balance}."
+    )
+
+def render_combined_reminder(entries, term):
+    lines = "\n".join(f"- {_student_label(entry)}: ${entry['balance']}" for entry in entries)
+    return (
+        f"Dear Parent/Guardian, the following balances are outstanding for Term {term}:\n"
+        f"{lines}\n"
+        f"Kindly settle by June 30."
+    )
+
+def render_combined_payment_confirmation(entries, term):
+    lines = "\n".join(
+        f"- {_student_label(entry)}: paid ${entry['amount']}, balance ${entry['balance']}" for entry in entries
+    )
+    return (
+        f"Dear Parent/Guardian, thank you for your payments for Term {term}:\n"
+        f"{lines}"
+    )
+
+def render_message(kind, entries):
+    """Render one message for entries of the same kind addressed to one phone number."""
+    first = entries[0]
+    if kind == REMINDER:
+        if len(entries) == 1:
+            return render_balance_reminder(first["fullname"], first["student_id"], first["balance"], first["term"])
+        return render_combined_reminder(entries, first["term"])
+    if kind == PAYMENT_CONFIRMATION:
+        if len(entries) == 1:
+            return render_payment_confirmation(first["fullname"], first["student_id"], first["amount"], first["balance"], first["term"])
+        return render_combined_payment_confirmation(entries, first["term"])
+    raise ValueError(f"Unknown message kind: {kind}")
@@ -0,0 +1,270 @@
+# src/utils/metrics.py
+from src.utils.tracing import span
+from config import get_config
+import atexit
+import bisect
+import contextlib
+import fcntl
+import functools
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+config = get_config()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 14400.0)
+
+# name -> (type, help, buckets); recording an unknown name is a bug
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status", None),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route and method", LATENCY_BUCKETS),
+    "sms_api_request_duration_seconds": ("histogram", "SMS API call latency by client method", LATENCY_BUCKETS),
+    "sms_api_request_errors_total": ("counter", "Failed SMS API calls by client method", None),
+    "twilio_request_duration_seconds": ("histogram", "Twilio message send latency by kind", LATENCY_BUCKETS),
+    "twilio_request_errors_total": ("counter", "Failed Twilio message sends by kind", None),
+    "storage_operation_duration_seconds": ("histogram", "Gate pass storage latency by backend and operation", LATENCY_BUCKETS),
+    "storage_operation_errors_total": ("counter", "Failed storage operations by backend and operation", None),
+    "db_query_duration_seconds": ("histogram", "Database statement latency by statement type", LATENCY_BUCKETS),
+    "db_query_errors_total": ("counter", "Failed database statements by statement type", None),
+    "gatepass_render_duration_seconds": ("histogram", "Gate pass render time by format", LATENCY_BUCKETS),
+    "gatepass_render_errors_total": ("counter", "Failed gate pass renders by format", None),
+    "batch_job_duration_seconds": ("histogram", "Batch job run duration by job", JOB_BUCKETS),
+    "batch_item_duration_seconds": ("histogram", "Per-student processing time in batch jobs", LATENCY_BUCKETS),
+    "batch_items_total": ("counter", "Batch job students processed by job and outcome", None),
+    "student_search_duration_seconds": ("histogram", "Student search latency by backend (pg_trgm or in-process index)", LATENCY_BUCKETS),
+    "student_search_errors_total": ("counter", "Failed student searches by backend", None),
+    "inbound_throttle_total": ("counter", "Inbound WhatsApp messages by throttle decision", None)
+}
+
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_lock = threading.Lock()
+_flusher = None
+
+# Counters of exited processes are folded into this file so totals never go
+# backwards while METRICS_DIR keeps one file per live process
+RETIRED_FILE = "metrics_retired.json"
+_PROCESS_FILE = re.compile(r"^metrics_(\d+)\.json(\.tmp)?$")
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown metric '{name}'")
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+def inc(name, value=1, **labels):
+    """Add value to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_flusher()
+
+def observe(name, value, **labels):
+    """Record one histogram observation."""
+    key = _key(name, labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(buckets, value)] += 1
+        entry[-1] += value
+    _ensure_flusher()
+
+@contextlib.contextmanager
+def timer(prefix, **labels):
+    """Time a block into <prefix>_duration_seconds; exceptions also count in <prefix>_errors_total.
+
+    The block is also recorded as a trace span named prefix.
+    """
+    start = time.perf_counter()
+    try:
+        with span(prefix, **labels):
+            yield
+    except Exception:
+        inc(f"{prefix}_errors_total", **labels)
+        raise
+    finally:
+        observe(f"{prefix}_duration_seconds", time.perf_counter() - start, **labels)
+
+def timed(prefix, **labels):
+    """Decorator form of timer()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(prefix, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _snapshot():
+    with _lock:
+        return {
+            "counters": [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, list(labels), list(entry)] for (name, labels), entry in _histograms.items()]
+        }
+
+def flush():
+    """Write this process's metrics to METRICS_DIR/metrics_<pid>.json for other workers to merge."""
+    if not config.METRICS_DIR:
+        return
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    _write_snapshot(os.path.join(config.METRICS_DIR, f"metrics_{os.getpid()}.json"), _snapshot())
+
+def _flush_periodically():
+    while True:
+        time.sleep(config.METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            pass
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None and config.METRICS_DIR:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_periodically, name="metrics-flush", daemon=True)
+                _flusher.start()
+                atexit.register(flush)
+
+def _read_snapshot(path):
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None  # being replaced or removed
+
+def _write_snapshot(path, snapshot):
+    with open(f"{path}.tmp", "w") as metrics_file:
+        json.dump(snapshot, metrics_file)
+    os.replace(f"{path}.tmp", path)
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+def _retire_exited_processes():
+    """Fold the files of exited workers and shard processes into RETIRED_FILE and delete them."""
+    with open(os.path.join(config.METRICS_DIR, ".retire.lock"), "w") as lock_file:
+        # One worker at a time, so a file is never folded in twice
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        exited = []
+        for path in glob.glob(os.path.join(config.METRICS_DIR, "metrics_*.json*")):
+            match = _PROCESS_FILE.match(os.path.basename(path))
+            if match and not _process_alive(int(match.group(1))):
+                exited.append(path)
+        if not exited:
+            return
+        retired_path = os.path.join(config.METRICS_DIR, RETIRED_FILE)
+        snapshots = [_read_snapshot(path) for path in [retired_path] + exited if not path.endswith(".tmp")]
+        counters, histograms = _merge(snapshot for snapshot in snapshots if snapshot)
+        _write_snapshot(retired_path, {
+            "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+            "histograms": [[name, list(labels), entry] for (name, labels), entry in histograms.items()]
+        })
+        for path in exited:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+def _collect():
+    """Merge every worker's metrics (or just this process's without METRICS_DIR)."""
+    if not config.METRICS_DIR:
+        return [_snapshot()]
+    flush()
+    _retire_exited_processes()
+    snapshots = [_read_snapshot(path) for path in glob.glob(os.path.join(config.METRICS_DIR, "metrics_*.json"))]
+    return [snapshot for snapshot in snapshots if snapshot]
+
+def _merge(snapshots):
+    """Sum snapshots into (counters, histograms) keyed by (name, labels)."""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, entry in snapshot["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            histograms[key] = entry if merged is None else [a + b for a, b in zip(merged, entry)]
+    return counters, histograms
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms = _merge(_collect())
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in (counters if kind == "counter" else histograms).items() if metric == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def instrument_app(app):
+    """Record latency and status counts for every Flask route."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe("http_request_duration_seconds", time.perf_counter() - started, route=route, method=request.method)
+            inc("http_requests_total", route=route, method=request.method, status=response.status_code)
+        return response
+
+def instrument_engine(engine):
+    """Time every statement on a SQLAlchemy engine by statement type."""
+    from sqlalchemy import event
+
+    def _statement_type(statement):
+        return (statement.lstrip().split(None, 1) or ["other"])[0].lower()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        observe("db_query_duration_seconds", time.perf_counter() - started, operation=_statement_type(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        inc("db_query_errors_total", operation=_statement_type(context.statement or ""))
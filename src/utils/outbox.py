@@ -0,0 +1,55 @@
+# src/utils/outbox.py
+from src.utils.messages import render_message
+from src.utils.whatsapp import send_whatsapp_message
+from src.utils.phone import normalize_phone
+from src.utils.logger import setup_logger
+from config import get_config
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+class MessageOutbox:
+    """Collects batch messages and sends one combined message per phone number.
+
+    Siblings that share a guardian phone number and are queued within the
+    same window receive a single WhatsApp message listing each child.
+    """
+    def __init__(self, window_seconds=None, send=send_whatsapp_message):
+        self.window_seconds = config.COALESCE_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.send = send
+        self._pending = {}  # (phone_number, kind) -> list of entries, in arrival order
+        self._opened_at = None
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._pending.values())
+
+    def add(self, phone_number, kind, entry):
+        """Queue an entry (student_id, fullname, term and amount/balance fields) for phone_number."""
+        if self._opened_at is None:
+            self._opened_at = time.monotonic()
+        # One message per number however each sibling's contact wrote it
+        phone_number = normalize_phone(phone_number) or phone_number
+        self._pending.setdefault((phone_number, kind), []).append(entry)
+
+    def due(self):
+        """True once the oldest queued entry has waited a full window."""
+        return self._opened_at is not None and time.monotonic() - self._opened_at >= self.window_seconds
+
+    def flush(self):
+        """Send every queued group; returns a result dict per student ID."""
+        pending, self._pending, self._opened_at = self._pending, {}, None
+        results = {}
+        for (phone_number, kind), entries in pending.items():
+            student_ids = [entry["student_id"] for entry in entries]
+            try:
+                sid = self.send(phone_number, render_message(kind, entries))
+                result = {"status": f"Sent {kind.replace('_', ' ')}", "phone_number": phone_number, "message_sid": sid}
+                if len(entries) > 1:
+                    logger.info("Coalesced %s %s messages for %s into one to %s", len(entries), kind, student_ids, phone_number)
+            except Exception as e:
+                logger.error("Failed to send %s to %s for %s: %s", kind, phone_number, student_ids, e)
+                result = {"error": f"Failed to send message: {str(e)}"}
+            for student_id in student_ids:
+                results[student_id] = result
+        return results
@@ -0,0 +1,32 @@
+# src/utils/phone.py
+import functools
+import re
+
+DEFAULT_COUNTRY_CODE = "263"  # Zimbabwe; local numbers are written 07XXXXXXXX
+
+# Accepts any international number in E.164 format (e.g. +263..., +1..., +44...)
+PHONE_REGEX = re.compile(r'^\+[1-9]\d{7,14}$')
+
+_SEPARATORS = re.compile(r"[\s\-().]")
+
+@functools.lru_cache(maxsize=8192)
+def normalize_phone(raw):
+    """Return the canonical E.164 form of a phone number, or None if it has none.
+
+    Handles 'whatsapp:' prefixes, separators, 00 international prefixes,
+    country-code numbers missing the '+' (as when '+' is decoded to a space
+    in a query string) and local numbers with a leading 0.
+    """
+    if not raw:
+        return None
+    value = _SEPARATORS.sub("", str(raw).strip())
+    if value.lower().startswith("whatsapp:"):
+        value = value[len("whatsapp:"):]
+    if value.startswith("00"):
+        value = f"+{value[2:]}"
+    elif not value.startswith("+"):
+        if value.startswith(DEFAULT_COUNTRY_CODE) and len(value) == len(DEFAULT_COUNTRY_CODE) + 9:
+            value = f"+{value}"
+        else:
+            value = f"+{DEFAULT_COUNTRY_CODE}{value.lstrip('0')}"
+    return value if PHONE_REGEX.match(value) else None
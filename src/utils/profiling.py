@@ -0,0 +1,132 @@
+# src/utils/profiling.py
+from src.utils.logger import setup_logger
+from config import get_config
+import collections
+import contextlib
+import cProfile
+import datetime
+import hmac
+import io
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+
+config = get_config()
+logger = setup_logger(__name__)
+
+PROFILE_FORMATS = {"pstats": ".pstats", "folded": ".folded", "text": ".txt"}
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+class StackSampler:
+    """Sample one thread's Python stack every interval seconds into folded-stack counts.
+
+    The output ("frame;frame;frame count" lines) feeds flamegraph.pl and speedscope.
+    """
+    def __init__(self, thread_id, interval=None):
+        self.thread_id = thread_id
+        self.interval = interval or config.PROFILE_SAMPLE_INTERVAL_SECONDS
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class Profile:
+    """cProfile plus a stack sampler around one request or job, saved under a profile ID."""
+    def __init__(self, label):
+        self.label = label
+        self.profile_id = f"{datetime.datetime.now(datetime.UTC):%Y%m%dT%H%M%S}-{secrets.token_hex(4)}"
+        self._profiler = cProfile.Profile()
+        self._sampler = StackSampler(threading.get_ident())
+
+    def start(self):
+        self._sampler.start()
+        self._profiler.enable()
+
+    def stop(self):
+        self._profiler.disable()
+        self._sampler.stop()
+        return self.save()
+
+    def save(self):
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(config.PROFILE_DIR, self.profile_id)
+        self._profiler.dump_stats(base + PROFILE_FORMATS["pstats"])
+        with open(base + PROFILE_FORMATS["folded"], "w") as folded_file:
+            folded_file.write(self._sampler.folded())
+        summary = io.StringIO()
+        summary.write(f"# {self.label}\n")
+        pstats.Stats(self._profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(base + PROFILE_FORMATS["text"], "w") as text_file:
+            text_file.write(summary.getvalue())
+        logger.info("Saved profile %s of %s", self.profile_id, self.label)
+        return self.profile_id
+
+@contextlib.contextmanager
+def profiled(label, enabled=True):
+    """Profile the block when enabled; yields the Profile (or None), whose profile_id is set afterwards."""
+    if not enabled:
+        yield None
+        return
+    profile = Profile(label)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+
+def profile_path(profile_id, fmt="pstats"):
+    """Path of a saved profile, or None for an unknown ID or format."""
+    if fmt not in PROFILE_FORMATS or not _PROFILE_ID.match(profile_id or ""):
+        return None
+    path = os.path.abspath(os.path.join(config.PROFILE_DIR, profile_id + PROFILE_FORMATS[fmt]))
+    return path if os.path.exists(path) else None
+
+def authorized(token):
+    """True if token matches PROFILING_TOKEN; always False while profiling is disabled."""
+    return bool(config.PROFILING_TOKEN) and hmac.compare_digest(token or "", config.PROFILING_TOKEN)
+
+def instrument_app(app):
+    """Profile requests sent with X-Profile: <PROFILING_TOKEN> (or ?profile=<token>).
+
+    Nothing is registered unless PROFILING_TOKEN is set, so the hook costs
+    nothing when disabled. The response carries the ID in X-Profile-ID.
+    """
+    if not config.PROFILING_TOKEN:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if authorized(request.headers.get("X-Profile") or request.args.get("profile")):
+            g.profile = Profile(f"{request.method} {request.path}")
+            g.profile.start()
+
+    @app.after_request
+    def _save_profile(response):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            response.headers["X-Profile-ID"] = profile.stop()
+        return response
@@ -0,0 +1,124 @@
+# src/utils/query_budget.py
+from src.utils.logger import setup_logger
+from config import get_config
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+# Trackers open in this context, outermost first; every statement counts
+# toward all of them (e.g. a batch item and its job)
+_active = contextvars.ContextVar("query_trackers", default=())
+
+class QueryStats:
+    """Statements, SQL time and repeated statements seen by one tracker."""
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = collections.Counter()
+        self._parameters = collections.defaultdict(set)
+        self._lock = threading.Lock()
+
+    def record(self, statement, parameters, seconds):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.statements[statement] += 1
+            if len(self._parameters[statement]) < config.QUERY_REPEAT_THRESHOLD:
+                self._parameters[statement].add(repr(parameters))
+
+    def repeated(self, threshold=None):
+        """Statements run at least threshold times with differing parameters: likely N+1 loops."""
+        threshold = threshold or config.QUERY_REPEAT_THRESHOLD
+        return [
+            (statement, count) for statement, count in self.statements.most_common()
+            if count >= threshold and len(self._parameters[statement]) > 1
+        ]
+
+    def summary(self, top=5):
+        lines = [f"{self.label}: {self.count} queries in {self.seconds * 1000:.1f} ms"]
+        lines += [f"  {count}x {' '.join(statement.split())[:200]}" for statement, count in self.statements.most_common(top)]
+        return "\n".join(lines)
+
+@contextlib.contextmanager
+def track_queries(label, budget=None, detect_repeats=True):
+    """Count the statements run inside the block and report budget overruns and N+1 patterns.
+
+    Exceeding budget (a number of queries) logs a warning with the most
+    frequent statements; so does any statement repeated
+    QUERY_REPEAT_THRESHOLD times with different parameters, unless
+    detect_repeats is off (whole batch jobs repeat per-item statements by design).
+    """
+    stats = QueryStats(label)
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+        if budget is not None and stats.count > budget:
+            logger.warning("Query budget of %s exceeded by %s\n%s", budget, label, stats.summary())
+        for statement, count in stats.repeated() if detect_repeats else ():
+            logger.warning("Possible N+1 in %s: %sx %s", label, count, " ".join(statement.split())[:200])
+        logger.debug("%s", stats.summary(top=0))
+
+@contextlib.contextmanager
+def untracked():
+    """Keep the block's statements out of every open tracker (schema setup on first use)."""
+    token = _active.set(())
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+@contextlib.contextmanager
+def assert_max_queries(limit, label="block"):
+    """Fail with AssertionError if the block runs more than limit queries (for tests)."""
+    with track_queries(label) as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.count}\n{stats.summary(top=10)}")
+
+def instrument_engine(engine):
+    """Feed every statement on a SQLAlchemy engine to the active trackers."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _active.get():
+            conn.info.setdefault("query_budget_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trackers = _active.get()
+        started = conn.info.get("query_budget_started")
+        if not trackers or not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        for stats in trackers:
+            stats.record(statement, parameters, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_budget_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+def instrument_app(app):
+    """Track queries per Flask request against QUERY_BUDGET_PER_REQUEST."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_tracking():
+        g.query_tracker = track_queries(f"{request.method} {request.path}", budget=config.QUERY_BUDGET_PER_REQUEST)
+        g.query_stats = g.query_tracker.__enter__()
+
+    @app.teardown_request
+    def _stop_tracking(error=None):
+        tracker = g.pop("query_tracker", None)
+        if tracker is not None:
+            tracker.__exit__(None, None, None)
@@ -1,55 +1,288 @@
 # src/utils/scheduler.py
-from apscheduler.schedulers.background import BackgroundScheduler
 from src.services.reminder_service import send_balance_reminders
 from src.services.payment_service import check_new_payments
 from src.services.profile_sync_service import sync_student_profiles
+from src.services.gatepass_cleanup_service import sweep_gatepasses
+from src.services.financial_snapshot_service import get_financial_snapshot
+from src.services.contact_service import preloaded_contacts
+from src.services.job_run_service import (
+    start_or_resume_run, pending_items, record_item, finish_run, run_summary,
+    find_unfinished_run, is_live, as_utc
+)
+from src.services.campaign_service import plan_reminder_campaign, reschedule_pending, phone_numbers_for, group_siblings
 from src.api.sms_client import SMSClient
+from src.utils.database import init_db, JobRun
+from src.utils.sharding import partition
+from src.utils.outbox import MessageOutbox
 from src.utils.logger import setup_logger
+from src.utils.metrics import inc, observe
+from src.utils.profiling import profiled
+from src.utils.query_budget import track_queries
+from src.utils.tracing import start_trace, span, trace_context, flush as flush_spans
+from config import get_config
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import datetime
+import time
 
+config = get_config()
 logger = setup_logger(__name__)
 
-def send_all_reminders():
-    """Send reminders for all students in debt."""
+# Per-student service call for each batch job; looked up by name so shard
+# worker processes can resolve it after a spawn.
+BATCH_PROCESSORS = {
+    "send_all_reminders": send_balance_reminders,
+    "check_all_payments": check_new_payments
+}
+
+def _slot_in_future(scheduled_for):
+    return scheduled_for is not None and as_utc(scheduled_for) > datetime.datetime.now(datetime.UTC)
+
+def _wait_for_slot(scheduled_for):
+    """Sleep until a campaign item's planned send slot."""
+    if scheduled_for is None:
+        return
+    delay = (as_utc(scheduled_for) - datetime.datetime.now(datetime.UTC)).total_seconds()
+    if delay > 0:
+        time.sleep(delay)
+
+def _record(session, run, item, result, counts):
+    outcome = record_item(session, run, item, result)
+    counts[outcome] += 1
+    inc("batch_items_total", job=run.job_name, outcome=outcome)
+
+def _flush_outbox(session, run, outbox, queued, counts):
+    """Send coalesced messages and checkpoint the items waiting on them."""
+    results = outbox.flush()
+    for item in queued:
+        _record(session, run, item, results.get(item.student_id, {"error": "Message was not sent"}), counts)
+    queued.clear()
+
+def _process_items(session, run, term, process_student, student_ids=None):
+    """Process the pending items of a run, or only those of student_ids (one shard).
+
+    With COALESCE_MESSAGES on, messages are queued in an outbox and sent one
+    per phone number when the window elapses, before waiting for the next
+    campaign slot, and at the end. Queued items are only checkpointed once
+    their message has gone out.
+    """
+    counts = {"succeeded": 0, "skipped": 0, "failed": 0}
+    outbox = MessageOutbox() if config.COALESCE_MESSAGES else None
+    queued = []
+    items = pending_items(session, run)
+    if student_ids is not None:
+        student_ids = set(student_ids)
+        items = [item for item in items if item.student_id in student_ids]
+    # Every checkpoint commits; keep the loaded items and run rather than
+    # reading each back from the database after every commit
+    expire_on_commit, session.expire_on_commit = session.expire_on_commit, False
     try:
-        client = SMSClient()
-        debt_data = client.get_students_in_debt()
-        for student in debt_data.get("data", []):
-            student_id = student["student"]["student_number"]
-            send_balance_reminders(student_id, "2025-1")
-        logger.info("Completed batch reminder job")
-    except Exception as e:
-        logger.error(f"Error in batch reminders: {str(e)}")
+        # One IN query for every contact the run needs instead of a lookup per student
+        with preloaded_contacts(session, [item.student_id for item in items]):
+            for item in items:
+                if queued and (outbox.due() or _slot_in_future(item.scheduled_for)):
+                    _flush_outbox(session, run, outbox, queued, counts)
+                _wait_for_slot(item.scheduled_for)
+                kwargs = {"balance": item.balance} if item.balance is not None else {}
+                if outbox is not None:
+                    kwargs["outbox"] = outbox
+                started = time.perf_counter()
+                try:
+                    with span("batch_item", job=run.job_name, student_id=item.student_id), \
+                            track_queries(f"{run.job_name} {item.student_id}", budget=config.QUERY_BUDGET_PER_JOB_ITEM):
+                        result = process_student(item.student_id, term, **kwargs)
+                except Exception as e:
+                    logger.error("Error processing %s in job run %s: %s", item.student_id, run.id, e)
+                    result = {"error": str(e)}
+                observe("batch_item_duration_seconds", time.perf_counter() - started, job=run.job_name)
+                if isinstance(result, dict) and result.get("queued"):
+                    queued.append(item)
+                else:
+                    _record(session, run, item, result, counts)
+        if queued:
+            _flush_outbox(session, run, outbox, queued, counts)
+    finally:
+        session.expire_on_commit = expire_on_commit
+        session.expire_all()  # run counters were incremented in SQL
+    return counts
+
+def _process_shard(job_name, run_id, term, shard_index, shard_count, student_ids, trace=(None, None, None)):
+    """Worker entry point: process one shard (student_ids) of a job run in its own process.
 
-def check_all_payments():
-    """Check payments for all relevant students."""
+    trace is the parent's trace_context(), so shard spans join the job's trace.
+    """
+    started = time.monotonic()
+    trace_id, parent_id, request_id = trace
+    session = init_db()
     try:
-        client = SMSClient()
-        student_ids = set()
-        # Get students in debt
-        debt_data = client.get_students_in_debt()
-        student_ids.update(student["student"]["student_number"] for student in debt_data.get("data", []))
-        # Get students with recent payments
-        for student_id in student_ids.copy():
+        run = session.get(JobRun, run_id)
+        with start_trace(f"shard {job_name}", request_id=request_id, trace_id=trace_id, parent_id=parent_id, shard=shard_index), \
+                profiled(f"{job_name} shard {shard_index + 1}/{shard_count}", enabled=config.PROFILE_SHARDS) as profile:
+            counts = _process_items(session, run, term, BATCH_PROCESSORS[job_name], student_ids)
+    finally:
+        session.close()
+        flush_spans()
+    counts.update(shard=shard_index, duration_seconds=round(time.monotonic() - started, 3))
+    if profile is not None:
+        counts["profile_id"] = profile.profile_id
+    logger.info("Job run %s shard %s/%s done: %s", run_id, shard_index + 1, shard_count, counts)
+    return counts
+
+def _assign_shards(session, run, shard_count):
+    """Split a run's pending students into shard_count lists.
+
+    Students are hashed by their canonical preferred phone number, so
+    siblings sharing a guardian phone land in one shard and its outbox can
+    coalesce their messages; students without a contact hash by student
+    number. The split is made once, here, so every shard works from the
+    same phone numbers.
+    """
+    student_ids = [item.student_id for item in pending_items(session, run)]
+    phones = phone_numbers_for(session, student_ids)
+    return partition(student_ids, shard_count, key=lambda student_id: phones.get(student_id) or student_id)
+
+def _run_shards(job_name, run_id, term, shard_assignments):
+    """Fan a run out over one worker process per shard of students."""
+    shard_count = len(shard_assignments)
+    # spawn rather than fork: the parent holds scheduler threads and DB connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=shard_count, mp_context=context) as executor:
+        futures = [
+            executor.submit(_process_shard, job_name, run_id, term, shard_index, shard_count, student_ids, trace_context())
+            for shard_index, student_ids in enumerate(shard_assignments)
+        ]
+        return [future.result() for future in futures]
+
+def _run_batch(job_name, term, discover_student_ids, shards=None, on_resume=None):
+    """Run a batch job over a checkpointed job run and return its summary.
+
+    Each processed student is checkpointed in job_run_items, so a run that is
+    interrupted (e.g. by a dyno restart) resumes with the remaining students.
+    With shards > 1 the pending students are partitioned by a consistent hash
+    of their guardian phone number (see _assign_shards) and processed by that
+    many worker processes.
+    on_resume(session, run) is called before a resumed run continues.
+    """
+    shard_count = max(1, shards or config.BATCH_SHARDS)
+    with start_trace(f"job {job_name}", job=job_name, term=term), \
+            track_queries(f"job {job_name}", detect_repeats=False) as queries:
+        session = init_db()
+        try:
+            run = start_or_resume_run(session, job_name, term, discover_student_ids)
+            if run is None:
+                return None
+            # A resumed run finishes the term it was started for
+            term = run.term or term
+            if run.resume_count and on_resume:
+                on_resume(session, run)
             try:
-                payment_data = client.get_student_payments(student_id, "2025-1")
-                if payment_data.get("data"):
-                    student_ids.add(student_id)
+                if shard_count > 1:
+                    shard_results = _run_shards(job_name, run.id, term, _assign_shards(session, run, shard_count))
+                else:
+                    shard_results = [_process_items(session, run, term, BATCH_PROCESSORS[job_name])]
+                finish_run(session, run, "completed")
             except Exception as e:
-                logger.debug(f"No payments for {student_id}: {str(e)}")
-        logger.info(f"Checking payments for {len(student_ids)} students")
-        for student_id in student_ids:
-            check_new_payments(student_id, "2025-1")
-        logger.info("Completed batch payment check job")
+                session.rollback()
+                finish_run(session, run, "failed", error=str(e))
+                raise
+            summary = run_summary(run)
+            if summary.get("duration_seconds") is not None:
+                observe("batch_job_duration_seconds", summary["duration_seconds"], job=job_name)
+            summary["shards"] = shard_count
+            summary["queries"] = queries.count  # this process only; shard processes report their own items
+            if shard_count > 1:
+                summary["shard_results"] = shard_results
+            return summary
+        finally:
+            session.close()
+
+def _discover_students_in_debt():
+    client = SMSClient()
+    debt_data = client.get_students_in_debt()
+    return [student["student"]["student_number"] for student in debt_data.get("data", [])]
+
+def _discover_payment_students(term):
+    """Students to check for term, ordered so siblings sharing a phone number are adjacent for coalescing."""
+    client = SMSClient()
+    student_ids = set(_discover_students_in_debt())
+    # Get students with recent payments; the snapshots are reused by check_new_payments
+    for student_id in student_ids.copy():
+        try:
+            if get_financial_snapshot(student_id, term, client)["payment_count"]:
+                student_ids.add(student_id)
+        except Exception as e:
+            logger.debug("No payments for %s: %s", student_id, e)
+    logger.info("Checking payments for %s students", len(student_ids))
+    session = init_db()
+    try:
+        groups = group_siblings([{"student_id": student_id} for student_id in sorted(student_ids)], phone_numbers_for(session, student_ids))
+    finally:
+        session.close()
+    return [student for group in groups for student in group]
+
+def send_all_reminders(shards=None, term=None):
+    """Send reminders for all students in debt as a paced campaign.
+
+    term defaults to CURRENT_TERM. Recipients are planned up front (largest balance first by default) and
+    spread across CAMPAIGN_WINDOW_MINUTES at no more than
+    CAMPAIGN_PER_MINUTE_QUOTA sends per minute.
+    """
+    term = term or config.CURRENT_TERM
+    try:
+        summary = _run_batch(
+            "send_all_reminders", term,
+            lambda: plan_reminder_campaign(term),
+            shards=shards,
+            on_resume=reschedule_pending
+        )
+        logger.info("Completed batch reminder job: %s", summary)
+        return summary
     except Exception as e:
-        logger.error(f"Error in batch payment check: {str(e)}")
+        logger.error("Error in batch reminders: %s", e)
+
+def check_all_payments(shards=None, term=None):
+    """Check payments for all relevant students in term (default CURRENT_TERM)."""
+    term = term or config.CURRENT_TERM
+    try:
+        summary = _run_batch("check_all_payments", term, lambda: _discover_payment_students(term), shards=shards)
+        logger.info("Completed batch payment check job: %s", summary)
+        return summary
+    except Exception as e:
+        logger.error("Error in batch payment check: %s", e)
+
+BATCH_JOBS = {
+    "send_all_reminders": send_all_reminders,
+    "check_all_payments": check_all_payments
+}
+
+def resume_interrupted_runs():
+    """Resume batch runs left unfinished by a previous process."""
+    session = init_db()
+    try:
+        to_resume = []
+        for job_name in BATCH_JOBS:
+            run = find_unfinished_run(session, job_name)
+            if run is not None and not is_live(run):
+                to_resume.append(job_name)
+    finally:
+        session.close()
+    for job_name in to_resume:
+        logger.info("Resuming interrupted %s run", job_name)
+        BATCH_JOBS[job_name]()
 
 def init_scheduler():
     """Initialize scheduler for balance reminders, payment checks, and profile sync."""
     try:
+        from apscheduler.schedulers.background import BackgroundScheduler
         scheduler = BackgroundScheduler()
         # src/utils/scheduler.py (temporary)
         #scheduler.add_job(sync_student_profiles, trigger="date", run_date=datetime.datetime.now() + datetime.timedelta(seconds=30))
+        # Pick up batch runs interrupted by a restart shortly after boot
+        scheduler.add_job(
+            resume_interrupted_runs,
+            trigger="date",
+            run_date=datetime.datetime.now() + datetime.timedelta(seconds=60)
+        )
         # Daily profile sync (every day at 2 AM)
         scheduler.add_job(
             sync_student_profiles,
@@ -57,7 +290,7 @@ def init_scheduler():
             hour=2,
             minute=0
         )
-        # Weekly reminders for all students in debt (every Monday at 9 AM)
+        # Weekly reminder campaign for all students in debt (starts every Monday at 9 AM)
         scheduler.add_job(
             send_all_reminders,
             trigger="cron",
@@ -72,8 +305,15 @@ def init_scheduler():
             hour=8,
             minute=0
         )
+        # Daily gate pass archival and temp file cleanup (every day at 3 AM)
+        scheduler.add_job(
+            sweep_gatepasses,
+            trigger="cron",
+            hour=3,
+            minute=0
+        )
         scheduler.start()
         logger.info("Scheduler started")
     except Exception as e:
-        logger.error(f"Error starting scheduler: {str(e)}")
+        logger.error("Error starting scheduler: %s", e)
         raise
\ No newline at end of file
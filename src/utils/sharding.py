@@ -0,0 +1,33 @@
+# src/utils/sharding.py
+import hashlib
+
+def _stable_key(student_number):
+    """64-bit key for a student number that is identical across processes and runs."""
+    digest = hashlib.md5(str(student_number).strip().upper().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def jump_hash(key, num_buckets):
+    """Jump consistent hash (Lamping & Veach): growing the bucket count only moves ~1/n keys."""
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+def shard_for(student_number, shard_count):
+    """Shard index in [0, shard_count) for a student number."""
+    if shard_count <= 1:
+        return 0
+    return jump_hash(_stable_key(student_number), shard_count)
+
+def partition(student_numbers, shard_count, key=None):
+    """Split student numbers into shard_count lists by consistent hash.
+
+    key(student_number) picks what is hashed instead, so students sharing a
+    key (e.g. siblings with one guardian phone) land in the same shard.
+    """
+    shards = [[] for _ in range(max(shard_count, 1))]
+    for student_number in student_numbers:
+        shards[shard_for(key(student_number) if key else student_number, shard_count)].append(student_number)
+    return shards
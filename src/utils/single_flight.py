@@ -0,0 +1,105 @@
+# src/utils/single_flight.py
+from sqlalchemy import text
+from src.utils.logger import setup_logger
+import contextlib
+import hashlib
+import threading
+
+logger = setup_logger(__name__)
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller runs fn; callers arriving while it is in flight wait
+    and receive the same result (or exception). Nothing is cached after
+    the call finishes.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if not leader:
+            logger.info("Joining in-flight call for %s", key)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.info("Shared result of %s with %s concurrent callers", key, call.waiters)
+
+class KeyedLock:
+    """One mutex per key, dropped once nobody holds or waits for it."""
+    def __init__(self):
+        self._locks = {}  # key -> [lock, users]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+def _advisory_key(key):
+    # pg advisory locks take a signed 64-bit integer
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big", signed=True)
+
+@contextlib.contextmanager
+def advisory_lock(session, key):
+    """PostgreSQL advisory lock shared by all workers; a no-op on other databases.
+
+    The lock belongs to the database connection that took it, and the
+    session hands its connection back to the pool on every commit, so the
+    lock is held on a connection of its own for the whole block (one extra
+    pool connection per holder) and released on that same connection.
+    """
+    engine = session.get_bind()
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    lock_id = _advisory_key(key)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": lock_id})
+        try:
+            yield
+        finally:
+            try:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+            except Exception as e:
+                # Closing the server session is the only other way to drop the lock
+                logger.error("Could not release advisory lock %s: %s", key, e)
+                connection.invalidate()
@@ -0,0 +1,129 @@
+# src/utils/storage.py
+from src.utils.clients import get_s3_client
+from src.utils.logger import setup_logger
+from src.utils.metrics import timed
+from config import get_config
+import hashlib
+import hmac
+import os
+import secrets
+import shutil
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+class S3Storage:
+    """Private S3 objects handed out through short-lived presigned URLs."""
+    def __init__(self, bucket=None):
+        self.bucket = bucket or config.S3_BUCKET_NAME
+
+    @timed("storage_operation", backend="s3", operation="put")
+    def put(self, local_path, key, content_type="application/octet-stream"):
+        """Upload a file and confirm it from the PutObject response (no follow-up HEAD)."""
+        with open(local_path, "rb") as body:
+            result = get_s3_client().put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+        status = result.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if status != 200 or not result.get("ETag"):
+            raise RuntimeError(f"Upload of {key} to S3 not confirmed: status={status}")
+        logger.debug("Uploaded %s to s3://%s (ETag %s)", key, self.bucket, result["ETag"])
+        return key
+
+    def url(self, key, expires_in=None):
+        return get_s3_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_in or config.STORAGE_URL_EXPIRY_SECONDS
+        )
+
+    def delete(self, key):
+        get_s3_client().delete_object(Bucket=self.bucket, Key=key)
+
+    @timed("storage_operation", backend="s3", operation="delete_many")
+    def delete_many(self, keys):
+        """Delete keys in DeleteObjects requests of up to 1000; returns the number deleted."""
+        keys = list(keys)
+        deleted = 0
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            result = get_s3_client().delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True}
+            )
+            errors = result.get("Errors", [])
+            for error in errors:
+                logger.error("Failed to delete s3://%s/%s: %s", self.bucket, error.get("Key"), error.get("Message"))
+            deleted += len(chunk) - len(errors)
+        return deleted
+
+class LocalStorage:
+    """Files under a local directory, served by /files/<key> with HMAC-signed, expiring URLs."""
+    def __init__(self, root=None, base_url=None, signing_key=None):
+        self.root = os.path.abspath(root or config.LOCAL_STORAGE_DIR)
+        self.base_url = (base_url or config.PUBLIC_BASE_URL).rstrip("/")
+        signing_key = signing_key or config.STORAGE_SIGNING_KEY
+        if not signing_key:
+            logger.warning("STORAGE_SIGNING_KEY not set; local file URLs are only valid in this process")
+            signing_key = secrets.token_hex(32)
+        self.signing_key = signing_key.encode()
+
+    def path_for(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key '{key}'")
+        return path
+
+    @timed("storage_operation", backend="local", operation="put")
+    def put(self, local_path, key, content_type=None):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(local_path, path)
+        logger.debug("Stored %s at %s", key, path)
+        return key
+
+    def _signature(self, key, expires):
+        return hmac.new(self.signing_key, f"{key}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def url(self, key, expires_in=None):
+        expires = int(time.time()) + (expires_in or config.STORAGE_URL_EXPIRY_SECONDS)
+        return f"{self.base_url}/files/{key}?expires={expires}&signature={self._signature(key, expires)}"
+
+    def verify(self, key, expires, signature):
+        """True if the signature matches key and expiry and the URL has not expired."""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        return expires >= time.time() and hmac.compare_digest(self._signature(key, expires), signature or "")
+
+    def delete(self, key):
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    @timed("storage_operation", backend="local", operation="delete_many")
+    def delete_many(self, keys):
+        deleted = 0
+        for key in keys:
+            path = self.path_for(key)
+            if os.path.exists(path):
+                os.remove(path)
+                deleted += 1
+        return deleted
+
+STORAGE_BACKENDS = {"s3": S3Storage, "local": LocalStorage}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Process-wide storage backend selected by STORAGE_BACKEND (s3 or local)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if config.STORAGE_BACKEND not in STORAGE_BACKENDS:
+                    raise ValueError(f"Unknown STORAGE_BACKEND '{config.STORAGE_BACKEND}'; expected one of {sorted(STORAGE_BACKENDS)}")
+                _storage = STORAGE_BACKENDS[config.STORAGE_BACKEND]()
+    return _storage
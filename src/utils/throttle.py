@@ -0,0 +1,133 @@
+# src/utils/throttle.py
+from flask import request, Response
+from src.utils.phone import normalize_phone
+from src.utils.logger import setup_logger
+from src.utils.metrics import inc
+from config import get_config
+import collections
+import functools
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+# Inbound commands that render a PDF, upload it and send media
+EXPENSIVE_COMMANDS = {"get gatepass"}
+
+class TokenBucket:
+    """Classic token bucket: refills at rate tokens/second up to capacity."""
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def take(self, cost=1):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+class SenderThrottle:
+    """Token bucket per sender; the least recently seen senders are evicted past max_senders."""
+    def __init__(self, per_minute=None, burst=None, max_senders=10000):
+        self.rate = (per_minute or config.INBOUND_RATE_PER_MINUTE) / 60.0
+        self.burst = burst or config.INBOUND_BURST
+        self.max_senders = max_senders
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, sender, cost=1):
+        with self._lock:
+            bucket = self._buckets.pop(sender, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[sender] = bucket
+            if len(self._buckets) > self.max_senders:
+                self._buckets.popitem(last=False)
+            return bucket.take(min(cost, self.burst))
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on how many expensive commands run at once."""
+    def __init__(self, limit=None):
+        self.limit = limit or config.EXPENSIVE_COMMAND_CONCURRENCY
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        if not self._semaphore.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+sender_throttle = SenderThrottle()
+expensive_limiter = ConcurrencyLimiter()
+_counters = collections.Counter()
+_counters_lock = threading.Lock()
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+    inc("inbound_throttle_total", decision=name)
+
+def throttle_stats():
+    """Counters for this worker process, plus current expensive commands in flight."""
+    with _counters_lock:
+        stats = dict(_counters)
+    for name in ("allowed", "throttled_sender", "throttled_concurrency"):
+        stats.setdefault(name, 0)
+    stats["expensive_in_flight"] = expensive_limiter.in_flight
+    stats["expensive_limit"] = expensive_limiter.limit
+    stats["tracked_senders"] = len(sender_throttle._buckets)
+    return stats
+
+@functools.lru_cache(maxsize=None)
+def _cached_twiml(text):
+    from twilio.twiml.messaging_response import MessagingResponse
+    reply = MessagingResponse()
+    reply.message(text)
+    return str(reply)
+
+def throttle_inbound(view):
+    """Throttle inbound WhatsApp messages per From number and cap concurrent expensive commands.
+
+    Throttled senders and overflow get a prebuilt TwiML reply without
+    touching the database, storage or Twilio.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        sender = normalize_phone(request.form.get("From")) or request.form.get("From", "")
+        command = (request.form.get("Body") or "").lower().strip()
+        expensive = command in EXPENSIVE_COMMANDS
+        if not sender_throttle.allow(sender, cost=config.EXPENSIVE_COMMAND_COST if expensive else 1):
+            _count("throttled_sender")
+            logger.warning("Throttled inbound message from %s", sender)
+            return Response(_cached_twiml("You are sending messages too quickly. Please wait a minute and try again."), mimetype="application/xml")
+        if not expensive:
+            _count("allowed")
+            return view(*args, **kwargs)
+        if not expensive_limiter.try_acquire():
+            _count("throttled_concurrency")
+            logger.warning("Concurrency limit reached; deferring '%s' from %s", command, sender)
+            return Response(_cached_twiml("We are busy preparing gate passes. Please try again in a few minutes."), mimetype="application/xml")
+        _count("allowed")
+        try:
+            return view(*args, **kwargs)
+        finally:
+            expensive_limiter.release()
+    return wrapper
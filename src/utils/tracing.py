@@ -0,0 +1,271 @@
+# src/utils/tracing.py
+from src.utils.logger import setup_logger
+from config import get_config
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import queue
+import threading
+import time
+
+config = get_config()
+logger = setup_logger(__name__)
+
+SERVICE_NAME = "shining-smiles-whatsapp"
+_EXPORT_BATCH = 256
+
+# Innermost open span of the current request/job; contextvars keep concurrent
+# requests apart and copy_context() carries it into worker threads
+_current_span = contextvars.ContextVar("current_span", default=None)
+_export_queue = queue.Queue(maxsize=10000)
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def _new_id(size):
+    return os.urandom(size).hex()
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error", "request_id")
+
+    def __init__(self, name, trace_id, parent_id, request_id, attributes):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.request_id = request_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+def current_span():
+    return _current_span.get()
+
+def current_request_id():
+    """Correlation ID of the request or job in progress, or None outside one."""
+    active = _current_span.get()
+    return active.request_id if active else None
+
+@contextlib.contextmanager
+def _open(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        _export(span)
+
+def start_trace(name, request_id=None, trace_id=None, parent_id=None, **attributes):
+    """Open a root span for a request or job; request_id defaults to the trace ID.
+
+    trace_id/parent_id continue a trace started elsewhere (e.g. a shard process).
+    """
+    trace_id = trace_id or _new_id(16)
+    return _open(Span(name, trace_id, parent_id, request_id or trace_id, attributes))
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time a step as a child of the current span; a no-op outside a trace."""
+    parent = _current_span.get()
+    if parent is None or not config.TRACE_EXPORT:
+        yield None
+        return
+    with _open(Span(name, parent.trace_id, parent.span_id, parent.request_id, attributes)) as child:
+        yield child
+
+def traced(name, **attributes):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def propagate(fn):
+    """Bind fn to the caller's trace context, for ThreadPoolExecutor.submit/map."""
+    context = contextvars.copy_context()
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+def trace_context():
+    """(trace_id, span_id, request_id) of the current span, to continue a trace in another process."""
+    active = _current_span.get()
+    return (active.trace_id, active.span_id, active.request_id) if active else (None, None, None)
+
+# Export: finished spans go through a queue to one background thread so
+# request threads never block on file or network I/O
+
+def _export(span):
+    if not config.TRACE_EXPORT:
+        return
+    _ensure_exporter()
+    try:
+        _export_queue.put_nowait(span.to_dict())
+    except queue.Full:
+        pass  # drop rather than slow the request down
+
+def _write_jsonl(spans):
+    directory = os.path.dirname(config.TRACE_JSONL_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(config.TRACE_JSONL_PATH, "a") as trace_file:
+        for span in spans:
+            trace_file.write(json.dumps(span, default=str) + "\n")
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_payload(spans):
+    """Spans in the OTLP/HTTP JSON encoding (ExportTraceServiceRequest)."""
+    otlp_spans = []
+    for span in spans:
+        attributes = dict(span["attributes"], **{"request.id": span["request_id"]})
+        otlp_span = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["start_ns"] + int(span["duration_ms"] * 1e6)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1}
+        }
+        if span["parent_id"]:
+            otlp_span["parentSpanId"] = span["parent_id"]
+        otlp_spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}]
+    }]}
+
+def _post_otlp(spans):
+    import requests
+    requests.post(config.TRACE_OTLP_ENDPOINT, json=_otlp_payload(spans), timeout=5)
+
+EXPORTERS = {"jsonl": _write_jsonl, "otlp": _post_otlp}
+
+def _drain(block):
+    spans = []
+    try:
+        spans.append(_export_queue.get(timeout=1) if block else _export_queue.get_nowait())
+        while len(spans) < _EXPORT_BATCH:
+            spans.append(_export_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return spans
+
+def flush():
+    """Export every queued span now; also run at exit."""
+    while True:
+        spans = _drain(block=False)
+        if not spans:
+            return
+        _send(spans)
+
+def _send(spans):
+    try:
+        EXPORTERS[config.TRACE_EXPORT](spans)
+    except Exception as e:
+        logger.warning("Dropped %s spans: export to %s failed: %s", len(spans), config.TRACE_EXPORT, e)
+
+def _export_forever():
+    while True:
+        spans = _drain(block=True)
+        if spans:
+            _send(spans)
+
+def _ensure_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                if config.TRACE_EXPORT not in EXPORTERS:
+                    raise ValueError(f"Unknown TRACE_EXPORT '{config.TRACE_EXPORT}'; expected one of {sorted(EXPORTERS)}")
+                _exporter = threading.Thread(target=_export_forever, name="trace-export", daemon=True)
+                _exporter.start()
+                atexit.register(flush)
+
+def instrument_app(app):
+    """Open a root span per Flask request, correlated by X-Request-ID (echoed back)."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        request_id = request.headers.get("X-Request-ID") or _new_id(16)
+        g.trace = start_trace(f"{request.method} {request.path}", request_id=request_id, method=request.method)
+        g.trace.__enter__()
+
+    @app.after_request
+    def _tag_response(response):
+        active = _current_span.get()
+        if active is not None:
+            active.set(route=request.url_rule.rule if request.url_rule else "unmatched", status=response.status_code)
+            response.headers["X-Request-ID"] = active.request_id
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        trace = g.pop("trace", None)
+        if trace is not None:
+            if error is not None:
+                trace.__exit__(type(error), error, error.__traceback__)
+            else:
+                trace.__exit__(None, None, None)
+
+def instrument_engine(engine):
+    """Add a span per SQL statement on a SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_span.get() is None or not config.TRACE_EXPORT:
+            return
+        statement_span = span("db.query", statement=statement[:200])
+        statement_span.__enter__()
+        conn.info.setdefault("trace_spans", []).append(statement_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().__exit__(None, None, None)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            error = context.original_exception
+            spans.pop().__exit__(type(error), error, error.__traceback__)
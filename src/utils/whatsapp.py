@@ -1,49 +1,44 @@
 # src/utils/whatsapp.py
 
-import re
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
+from src.utils.clients import get_twilio_client
+from src.utils.metrics import timer
 from src.utils.logger import setup_logger
+from src.utils.phone import normalize_phone
 from config import get_config
 
 config = get_config()
 logger = setup_logger(__name__)
 
-# Accepts any international number in E.164 format (e.g. +263..., +1..., +44...)
-PHONE_REGEX = re.compile(r'^\+[1-9]\d{7,14}$')
-
 def send_whatsapp_message(to, message):
     """Send a WhatsApp message via Twilio."""
     try:
-        to = to.strip()
-
-        # Try auto-correcting if user forgot the '+'
-        if not to.startswith('+') and to.replace(' ', '').isdigit():
-            to = f'+{to}'
-
-        if not PHONE_REGEX.match(to):
+        normalized = normalize_phone(to)
+        if not normalized:
             raise ValueError(f"Invalid phone number format: '{to}'")
+        to = normalized
 
         to_whatsapp = f"whatsapp:{to}"
         from_whatsapp = f"whatsapp:{config.TWILIO_WHATSAPP_NUMBER}"
 
-        logger.debug(f"Config values: SID={config.TWILIO_ACCOUNT_SID}, Token=****, Number={from_whatsapp}")
-        logger.debug(f"Sending to: {to_whatsapp}")
+        logger.debug("Config values: SID=%s, Token=****, Number=%s", config.TWILIO_ACCOUNT_SID, from_whatsapp)
+        logger.debug("Sending to: %s", to_whatsapp)
 
-        client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
-        response = client.messages.create(
-            from_=from_whatsapp,
-            body=message,
-            to=to_whatsapp
-        )
+        with timer("twilio_request", kind="text"):
+            response = get_twilio_client().messages.create(
+                from_=from_whatsapp,
+                body=message,
+                to=to_whatsapp
+            )
 
-        logger.debug(f"Twilio response: {response.__dict__}")
-        logger.info(f"WhatsApp message sent to {to}: {response.sid}")
+        logger.debug("Twilio response: %s", response.__dict__)
+        logger.info("WhatsApp message sent to %s: %s", to, response.sid)
         return response.sid
 
-    except TwilioRestException as e:
-        logger.error(f"Twilio error sending WhatsApp message to {to}: {e.code} - {str(e)}")
-        raise
     except Exception as e:
-        logger.error(f"Unexpected error sending WhatsApp message to {to}: {str(e)}")
+        # Twilio is already loaded once a send has been attempted
+        from twilio.base.exceptions import TwilioRestException
+        if isinstance(e, TwilioRestException):
+            logger.error("Twilio error sending WhatsApp message to %s: %s - %s", to, e.code, e)
+            raise
+        logger.error("Unexpected error sending WhatsApp message to %s: %s", to, e)
         raise
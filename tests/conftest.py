@@ -0,0 +1,159 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# Settings are read when config is first imported, so set them up front
+_scratch = tempfile.mkdtemp(prefix="shining-smiles-tests-")
+os.environ.setdefault("LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch}/default.db")
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test-token")
+os.environ.setdefault("TWILIO_WHATSAPP_NUMBER", "+14155238886")
+os.environ.setdefault("SMS_API_BASE_URL", "http://sms.test")
+os.environ.setdefault("SMS_API_KEY", "test-key")
+
+import itertools
+import threading
+import types
+
+import pytest
+import requests
+
+from config import Config
+from src.utils import clients, database
+
+# Modules that build their own SMSClient
+SMS_CLIENT_MODULES = (
+    "src.api.sms_client",
+    "src.services.financial_snapshot_service",
+    "src.services.payment_service",
+    "src.services.contact_service",
+    "src.services.profile_sync_service",
+    "src.services.campaign_service",
+    "src.services.reminder_service",
+    "src.utils.scheduler"
+)
+
+class FakeTwilio:
+    """Stands in for twilio.rest.Client; records every messages.create call.
+
+    Set fail to a predicate over the call's keyword arguments to make
+    matching sends raise.
+    """
+    def __init__(self):
+        self.sent = []
+        self.fail = None
+        self._sids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.messages = types.SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        if self.fail and self.fail(kwargs):
+            raise RuntimeError("Twilio is unavailable")
+        with self._lock:
+            message = types.SimpleNamespace(sid=f"SM{next(self._sids):032d}", status="queued", **kwargs)
+            self.sent.append(message)
+        return message
+
+    def sent_to(self, number):
+        return [message for message in self.sent if message.to == f"whatsapp:{number}"]
+
+class FakeSMS:
+    """Stands in for SMSClient; data is set per student and every call is recorded.
+
+    Students without payments, statements or profiles get the API's 404.
+    """
+    def __init__(self):
+        self.payments = {}    # student_id -> [{"amount": ...}, ...]
+        self.statements = {}  # student_id -> {"total_fees": ..., "balance": ...}
+        self.profiles = {}    # student_id -> profile data
+        self.debtors = {}     # student number -> outstanding balance
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, name, student_id, table):
+        with self._lock:
+            self.calls.append((name, student_id))
+        if student_id not in table:
+            raise requests.HTTPError(f"404 Client Error: Not Found for url: http://sms.test/{name}/?student_id_number={student_id}")
+        return {"data": table[student_id]}
+
+    def get_student_payments(self, student_id, term):
+        return self._call("payments", student_id, self.payments)
+
+    def get_student_account_statement(self, student_id, term):
+        return self._call("statement", student_id, self.statements)
+
+    def get_student_profile(self, student_id):
+        return self._call("profile", student_id, self.profiles)
+
+    def get_students_in_debt(self, student_id=None):
+        with self._lock:
+            self.calls.append(("in_debt", student_id))
+        return {"data": [
+            {"student": {"student_number": number}, "outstanding_balance": balance} for number, balance in self.debtors.items()
+        ]}
+
+    def calls_for(self, name):
+        return [student_id for call, student_id in self.calls if call == name]
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Override settings for one test: settings(CAMPAIGN_WINDOW_MINUTES=0)."""
+    def override(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(Config, name, value)
+    return override
+
+@pytest.fixture
+def database_url(monkeypatch, tmp_path):
+    """A fresh SQLite database per test; its engine is dropped afterwards."""
+    url = f"sqlite:///{tmp_path}/test.db"
+    monkeypatch.setenv("DATABASE_URL", url)
+    yield url
+    engine = database._engines.pop(url, None)
+    if engine is not None:
+        database._sessionmakers.pop(engine, None)
+        engine.dispose()
+
+@pytest.fixture(autouse=True)
+def fresh_snapshot_store(monkeypatch):
+    from src.services import financial_snapshot_service
+    monkeypatch.setattr(financial_snapshot_service, "_store", None)
+
+@pytest.fixture
+def session(database_url):
+    session = database.init_db()
+    yield session
+    session.close()
+
+@pytest.fixture
+def twilio(monkeypatch):
+    fake = FakeTwilio()
+    monkeypatch.setitem(clients._clients, "twilio", fake)
+    return fake
+
+@pytest.fixture
+def sms(monkeypatch):
+    fake = FakeSMS()
+    for module in SMS_CLIENT_MODULES:
+        monkeypatch.setattr(f"{module}.SMSClient", lambda: fake)
+    return fake
+
+@pytest.fixture
+def client(database_url, twilio, monkeypatch):
+    """Test client with a fresh idempotency store and inbound throttle."""
+    from app import app
+    from src.utils import idempotency, throttle
+    monkeypatch.setattr(idempotency, "_store", None)
+    monkeypatch.setattr(throttle, "sender_throttle", throttle.SenderThrottle())
+    monkeypatch.setattr(throttle, "expensive_limiter", throttle.ConcurrencyLimiter())
+    return app.test_client()
+
+def add_contact(session, student_id, phone_number, firstname="Tendai", lastname="Moyo", **fields):
+    contact = database.StudentContact(
+        student_id=student_id, firstname=firstname, lastname=lastname, preferred_phone_number=phone_number, **fields
+    )
+    session.add(contact)
+    session.commit()
+    return contact
@@ -0,0 +1,61 @@
+# tests/test_campaign.py
+import collections
+import datetime
+
+from src.services import campaign_service
+from tests.conftest import add_contact
+
+START = datetime.datetime(2025, 3, 3, 8, 0, 30, tzinfo=datetime.UTC)
+
+def groups_of(count):
+    return [[{"student_id": f"SSC2025{index:04d}"}] for index in range(count)]
+
+def per_minute(planned):
+    return collections.Counter(recipient["scheduled_for"] for recipient in planned)
+
+def test_slots_spread_evenly_over_the_window():
+    planned = campaign_service.assign_slots(groups_of(60), START, window_minutes=30, per_minute=10)
+
+    slots = per_minute(planned)
+    assert set(slots.values()) == {2}
+    assert min(slots) == START.replace(second=0)
+    assert max(slots) == START.replace(second=0) + datetime.timedelta(minutes=29)
+    assert [recipient["student_id"] for recipient in planned] == [group[0]["student_id"] for group in groups_of(60)]
+
+def test_quota_is_never_exceeded_even_past_the_window():
+    planned = campaign_service.assign_slots(groups_of(45), START, window_minutes=2, per_minute=10)
+
+    slots = per_minute(planned)
+    assert max(slots.values()) == 10
+    assert len(slots) == 5
+
+def test_siblings_share_one_slot_and_count_once():
+    groups = [[{"student_id": "A1"}, {"student_id": "A2"}, {"student_id": "A3"}]] + groups_of(3)
+    planned = campaign_service.assign_slots(groups, START, window_minutes=60, per_minute=1)
+
+    slot_of = {recipient["student_id"]: recipient["scheduled_for"] for recipient in planned}
+    assert slot_of["A1"] == slot_of["A2"] == slot_of["A3"] == START.replace(second=0)
+    assert len(set(slot_of.values())) == 4
+
+def test_zero_window_disables_pacing():
+    planned = campaign_service.assign_slots(groups_of(3), START, window_minutes=0)
+    assert [recipient["scheduled_for"] for recipient in planned] == [None, None, None]
+
+def test_group_siblings_keeps_priority_order():
+    recipients = [{"student_id": student_id} for student_id in ("S1", "S2", "S3", "S4")]
+    phones = {"S1": "+263771111111", "S2": "+263772222222", "S3": "+263771111111"}
+
+    groups = campaign_service.group_siblings(recipients, phones)
+    assert [[recipient["student_id"] for recipient in group] for group in groups] == [["S1", "S3"], ["S2"], ["S4"]]
+
+def test_campaign_plan_groups_siblings_by_canonical_number(session, sms):
+    add_contact(session, "SSC20250001", "077 111 1111")
+    add_contact(session, "SSC20250002", "+263771111111")
+    add_contact(session, "SSC20250003", "0772222222")
+    sms.debtors = {"SSC20250001": 100.0, "SSC20250002": 50.0, "SSC20250003": 300.0, "SSC20250004": 0}
+
+    planned = campaign_service.plan_reminder_campaign("2025-1", START, window_minutes=10, per_minute=1)
+
+    assert [recipient["student_id"] for recipient in planned] == ["SSC20250003", "SSC20250001", "SSC20250002"]
+    slot_of = {recipient["student_id"]: recipient["scheduled_for"] for recipient in planned}
+    assert slot_of["SSC20250001"] == slot_of["SSC20250002"] != slot_of["SSC20250003"]
@@ -0,0 +1,74 @@
+# tests/test_conditional_get.py
+import datetime
+
+from src.utils import database
+from tests.conftest import add_contact
+
+def add_pass(session, expires_in, pass_id="GP-0001"):
+    add_contact(session, "SSC20250001", "+263771234567")
+    now = datetime.datetime.now(datetime.UTC)
+    session.add(database.GatePass(
+        student_id="SSC20250001", pass_id=pass_id, issued_date=now, expiry_date=now + expires_in,
+        payment_percentage=75, whatsapp_number="+263771234567", last_updated=now
+    ))
+    session.commit()
+
+def verify(client, headers=None, whatsapp_number="%2B263771234567"):
+    return client.get(f"/verify-gatepass?pass_id=GP-0001&whatsapp_number={whatsapp_number}", headers=headers or {})
+
+def test_scanner_polling_an_unchanged_pass_gets_304(client, session, settings):
+    settings(CONDITIONAL_GET_MAX_AGE_SECONDS=300)
+    add_pass(session, datetime.timedelta(days=30))
+
+    first = verify(client)
+    assert first.status_code == 200 and first.get_json()["status"] == "valid"
+    assert first.headers["Cache-Control"] == "private, max-age=300, must-revalidate"
+
+    again = verify(client, {"If-None-Match": first.headers["ETag"]})
+    since = verify(client, {"If-Modified-Since": first.headers["Last-Modified"]})
+    assert (again.status_code, again.get_data()) == (304, b"")
+    assert since.status_code == 304
+
+    # '+' decoded to a space is the same number and the same representation
+    assert verify(client, {"If-None-Match": first.headers["ETag"]}, whatsapp_number="%20263771234567").status_code == 304
+
+def test_changed_pass_is_sent_again(client, session):
+    add_pass(session, datetime.timedelta(days=30))
+    etag = verify(client).headers["ETag"]
+
+    gate_pass = session.query(database.GatePass).filter_by(pass_id="GP-0001").one()
+    gate_pass.last_updated = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=5)
+    session.commit()
+
+    changed = verify(client, {"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+def test_max_age_never_outlives_the_pass(client, session, settings):
+    settings(CONDITIONAL_GET_MAX_AGE_SECONDS=3600)
+    add_pass(session, datetime.timedelta(seconds=90))
+    max_age = int(verify(client).headers["Cache-Control"].split("max-age=")[1].split(",")[0])
+    assert 0 < max_age <= 90
+
+def test_expired_and_unknown_passes_are_not_cached(client, session):
+    add_pass(session, -datetime.timedelta(minutes=1))
+    expired = verify(client, {"If-None-Match": '"anything"'})
+    assert expired.status_code == 410 and "ETag" not in expired.headers
+    assert verify(client, whatsapp_number="%2B263779999999").status_code == 404
+
+def test_unchanged_profile_is_answered_with_304(client, session):
+    add_contact(session, "SSC20250001", "+263771111111")
+    first = client.get("/get-student-profile?student_id=SSC20250001")
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+
+    by_etag = client.get("/get-student-profile?student_id=SSC20250001", headers={"If-None-Match": etag})
+    by_date = client.get("/get-student-profile?student_id=SSC20250001", headers={"If-Modified-Since": last_modified})
+    assert first.status_code == 200 and first.get_json()["profile"]["student_id"] == "SSC20250001"
+    assert (by_etag.status_code, by_etag.get_data()) == (304, b"")
+    assert by_date.status_code == 304
+    assert by_etag.headers["ETag"] == etag
+
+    client.post("/update-contact?student_id=SSC20250001&phone_number=0771111111&firstname=Tatenda")
+    changed = client.get("/get-student-profile?student_id=SSC20250001", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.get_json()["profile"]["firstname"] == "Tatenda"
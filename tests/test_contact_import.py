@@ -0,0 +1,58 @@
+# tests/test_contact_import.py
+import io
+
+from src.services.contact_import_service import import_contacts
+from src.utils import database
+from tests.conftest import add_contact
+
+ROSTER = (
+    "student_id,firstname,lastname,student_mobile,guardian_mobile_number\n"
+    "SSC20250001,Tendai,Moyo,077 111 1111,\n"
+    "SSC20250002,Rudo,Dube,,+263772222222\n"
+    ",Nobody,Here,0773333333,\n"
+    "SSC20250004,Farai,Ncube,123,\n"
+    "SSC20250005,Chipo,Sibanda,,\n"
+    "SSC20250001,Tendai,Moyo-Banda,0771111111,\n"
+)
+
+def test_rows_are_upserted_and_bad_rows_reported_by_line(session):
+    add_contact(session, "SSC20250002", "+263779999999", firstname="Old")
+    report = import_contacts(session, io.StringIO(ROSTER), batch_size=2)
+
+    # The repeated SSC20250001 row lands in a later batch and updates the first
+    assert (report["rows"], report["inserted"], report["updated"], report["batches"], report["error_count"]) == (6, 1, 2, 2, 3)
+    assert report["errors"] == [
+        {"line": 4, "student_id": "", "error": "student_id required"},
+        {"line": 5, "student_id": "SSC20250004", "error": "Invalid phone number format: '123'"},
+        {"line": 6, "student_id": "SSC20250005", "error": "At least one phone number required"}
+    ]
+    contacts = {contact.student_id: contact for contact in session.query(database.StudentContact)}
+    assert sorted(contacts) == ["SSC20250001", "SSC20250002"]
+    assert contacts["SSC20250001"].lastname == "Moyo-Banda"
+    assert contacts["SSC20250001"].preferred_phone_number == "+263771111111"
+    assert (contacts["SSC20250002"].firstname, contacts["SSC20250002"].preferred_phone_number) == ("Rudo", "+263772222222")
+
+def test_dry_run_reports_without_writing(session):
+    add_contact(session, "SSC20250002", "+263779999999", firstname="Old")
+    report = import_contacts(session, io.StringIO(ROSTER), dry_run=True)
+
+    assert report["dry_run"] and (report["inserted"], report["updated"], report["error_count"]) == (1, 1, 3)
+    session.expire_all()
+    [contact] = session.query(database.StudentContact).all()
+    assert (contact.student_id, contact.firstname, contact.preferred_phone_number) == ("SSC20250002", "Old", "+263779999999")
+
+def test_jsonl_lines_that_do_not_parse_are_reported(session):
+    lines = '{"student_id": "SSC20250001", "phone_number": "0771111111"}\n\n{not json}\n["SSC20250002"]\n'
+    report = import_contacts(session, io.BytesIO(lines.encode()), fmt="jsonl")
+
+    assert report["inserted"] == 1
+    assert [(error["line"], error["error"].split(":")[0]) for error in report["errors"]] == [(3, "Invalid JSON"), (4, "Expected a JSON object")]
+
+def test_import_route_takes_an_upload_and_dry_run(client):
+    response = client.post("/import-contacts?dry_run=true", data={"file": (io.BytesIO(ROSTER.encode()), "roster.csv")})
+    body = response.get_json()
+    assert response.status_code == 200 and body["status"] == "Import dry run complete"
+    assert (body["report"]["inserted"], body["report"]["error_count"]) == (2, 3)
+
+    response = client.post("/import-contacts?format=xml", data=ROSTER)
+    assert response.status_code == 400
@@ -0,0 +1,64 @@
+# tests/test_contact_scan_guard.py
+import pytest
+
+from src.services import contact_service
+from src.services.payment_service import check_new_payments
+from src.services.profile_sync_service import sync_student_profiles
+from src.services.reminder_service import send_balance_reminders
+from src.utils import database, scheduler
+from tests.conftest import add_contact
+
+@pytest.fixture
+def scans(settings, monkeypatch):
+    """Run with CONTACT_SCAN_GUARD=raise and record every scan it raises for,
+    even where the service catches the error and carries on."""
+    settings(CONTACT_SCAN_GUARD="raise")
+    raised = []
+
+    class RecordingScanError(contact_service.ContactScanError):
+        def __init__(self, message):
+            raised.append(message)
+            super().__init__(message)
+
+    monkeypatch.setattr(contact_service, "ContactScanError", RecordingScanError)
+    return raised
+
+@pytest.fixture
+def school(session, sms, twilio, monkeypatch):
+    """A paid-up student with a contact, a debtor known only to the SMS API, and their figures."""
+    add_contact(session, "SSC20250001", "0771234567")
+    sms.debtors.update({"SSC20250001": 250.0, "SSC20250002": 400.0})
+    sms.payments["SSC20250001"] = [{"amount": 750.0}]
+    sms.statements.update({"SSC20250001": {"total_fees": 1000.0, "balance": 250.0}, "SSC20250002": {"total_fees": 1000.0, "balance": 400.0}})
+    sms.profiles.update({
+        "SSC20250001": {"firstname": "Tendai", "lastname": "Moyo", "student_mobile": "0771234567", "guardian_mobile_number": "0771234567"},
+        "SSC20250002": {"firstname": "Rudo", "lastname": "Dube", "student_mobile": "0772345678", "guardian_mobile_number": "0772345678"}
+    })
+    monkeypatch.setattr("src.services.gatepass_service.store_gatepass_media", lambda pass_fields, output=None: {
+        "pdf_path": "gatepasses/pass.pdf", "image_path": None, "qr_path": None, "media_urls": ["https://files.test/pass.pdf"]
+    })
+
+def test_per_student_services_never_scan_contacts(scans, school, twilio):
+    from app import app
+    with app.app_context():
+        assert check_new_payments("SSC20250001", "2025-1")["status"] == "Payment confirmation sent"
+    assert send_balance_reminders("SSC20250001", "2025-1")["status"] == "Balance reminder sent"
+    # Not in the database yet: found through the SMS API profile
+    assert send_balance_reminders("SSC20250002", "2025-1")["status"] == "Balance reminder sent"
+    sync_student_profiles()
+
+    assert scans == []
+    assert len(twilio.sent_to("+263772345678")) == 1
+
+def test_batch_jobs_never_scan_contacts(scans, school, session, settings):
+    settings(CAMPAIGN_WINDOW_MINUTES=0, COALESCE_MESSAGES=True)
+    assert scheduler.send_all_reminders(shards=1)["succeeded"] == 2
+    assert scheduler.check_all_payments(shards=1)["total_items"] == 2
+    assert scans == []
+
+def test_guard_raises_on_an_unfiltered_scan(scans, session):
+    with pytest.raises(contact_service.ContactScanError):
+        session.query(database.StudentContact).all()
+    with contact_service.allow_contact_scans():
+        session.query(database.StudentContact).all()
+    assert len(scans) == 1
@@ -0,0 +1,119 @@
+# tests/test_financial_snapshot_service.py
+import pytest
+
+import app as app_module
+from src.services import financial_snapshot_service
+from src.services.financial_snapshot_service import (
+    DatabaseSnapshotStore, MemorySnapshotStore, get_financial_snapshot, invalidate_financial_snapshot
+)
+from src.services.reminder_service import send_balance_reminders
+from tests.conftest import add_contact
+
+@pytest.fixture(params=["database", "memory"])
+def backend(request, settings, database_url):
+    settings(FINANCIAL_SNAPSHOT_BACKEND=request.param)
+    return request.param
+
+def test_statement_is_skipped_when_payments_are_not_found(backend, sms):
+    sms.statements["SSC20250001"] = {"total_fees": 1000.0, "balance": 1000.0}
+    snapshot = get_financial_snapshot("SSC20250001", "2025-1")
+
+    assert snapshot["payment_count"] == 0
+    assert snapshot["balance"] is None
+    assert sms.calls == [("payments", "SSC20250001")]
+
+def test_outstanding_balance_is_fetched_when_needed(backend, sms):
+    sms.debtors = {"SSC20250001": 600.0, "SSC20250002": 80.0}
+    get_financial_snapshot("SSC20250001", "2025-1")
+    snapshot = get_financial_snapshot("SSC20250001", "2025-1", with_outstanding=True)
+
+    assert snapshot["outstanding_balance"] == 600.0
+    assert sms.calls_for("in_debt") == ["SSC20250001"]
+    # Now cached with the outstanding balance for both kinds of caller
+    get_financial_snapshot("SSC20250001", "2025-1")
+    get_financial_snapshot("SSC20250001", "2025-1", with_outstanding=True)
+    assert len(sms.calls) == 3
+
+def test_reminder_quotes_the_debt_listing_balance(backend, sms, session, twilio):
+    add_contact(session, "SSC20250001", "0771234567")
+    sms.payments["SSC20250001"] = [{"amount": 400.0}]
+    sms.statements["SSC20250001"] = {"total_fees": 1000.0, "balance": 600.0}
+    sms.debtors = {"SSC20250001": 450.5}
+
+    assert send_balance_reminders("SSC20250001", "2025-1")["status"] == "Balance reminder sent"
+    [message] = twilio.sent
+    assert "outstanding balance of $450.5 for Term 2025-1" in message.body
+
+    sms.debtors = {}
+    invalidate_financial_snapshot("SSC20250001")
+    assert send_balance_reminders("SSC20250001", "2025-1") == {"status": "No outstanding balance for SSC20250001"}
+
+def test_snapshot_with_payments_is_cached_until_invalidated(backend, sms):
+    sms.payments["SSC20250001"] = [{"amount": 400.0}, {"amount": 350.0}]
+    sms.statements["SSC20250001"] = {"total_fees": 1000.0, "balance": 250.0}
+    first = get_financial_snapshot("SSC20250001", "2025-1")
+    assert (first["total_paid"], first["total_fees"], first["balance"]) == (750.0, 1000.0, 250.0)
+    get_financial_snapshot("SSC20250001", "2025-1")
+    assert len(sms.calls) == 2
+
+    sms.payments["SSC20250001"].append({"amount": 250.0})
+    sms.statements["SSC20250001"]["balance"] = 0.0
+    assert invalidate_financial_snapshot("SSC20250001") == 1
+    assert get_financial_snapshot("SSC20250001", "2025-1")["total_paid"] == 1000.0
+    assert len(sms.calls) == 4
+
+def test_fetch_overtaken_by_invalidation_is_not_stored(backend, sms):
+    sms.payments["SSC20250001"] = [{"amount": 500.0}]
+    sms.statements["SSC20250001"] = {"total_fees": 1000.0, "balance": 500.0}
+    fetch_payments = sms.get_student_payments
+
+    def payment_arrives_mid_fetch(student_id, term):
+        result = fetch_payments(student_id, term)
+        sms.get_student_payments = fetch_payments
+        sms.payments[student_id] = [{"amount": 500.0}, {"amount": 500.0}]
+        invalidate_financial_snapshot(student_id, term)
+        return result
+
+    sms.get_student_payments = payment_arrives_mid_fetch
+    assert get_financial_snapshot("SSC20250001", "2025-1")["total_paid"] == 500.0
+    assert get_financial_snapshot("SSC20250001", "2025-1")["total_paid"] == 1000.0
+    assert financial_snapshot_service.get_snapshot_store().stats()["stale_discarded"] == 1
+
+def test_invalidation_reaches_every_worker(database_url):
+    web_worker, other_worker = DatabaseSnapshotStore(), DatabaseSnapshotStore()
+    snapshot, generation = other_worker.get("SSC20250001", "2025-1")
+    assert snapshot is None
+    other_worker.put({"student_id": "SSC20250001", "term": "2025-1", "total_paid": 500.0}, generation)
+    assert other_worker.get("SSC20250001", "2025-1")[0]["total_paid"] == 500.0
+
+    assert web_worker.invalidate("SSC20250001") == 1
+    assert other_worker.get("SSC20250001", "2025-1")[0] is None
+
+def test_memory_store_ttl_is_capped(settings):
+    settings(FINANCIAL_SNAPSHOT_TTL_SECONDS=900)
+    assert MemorySnapshotStore().ttl_seconds == financial_snapshot_service.MEMORY_TTL_CAP_SECONDS
+
+def payment_event(client, token=None, **data):
+    headers = {"X-Payment-Event-Token": token} if token else {}
+    return client.post("/payment-event", json=data, headers=headers)
+
+def test_payment_event_requires_the_shared_secret(client, settings, sms):
+    assert payment_event(client, student_id="SSC20250001").status_code == 403  # disabled while unset
+
+    settings(PAYMENT_EVENT_SECRET="s3cret")
+    get_financial_snapshot("SSC20250001", "2025-1")
+    assert payment_event(client, student_id="SSC20250001").status_code == 401
+    assert payment_event(client, "wrong", student_id="SSC20250001").status_code == 401
+    get_financial_snapshot("SSC20250001", "2025-1")
+    assert len(sms.calls) == 1  # rejected events left the cache alone
+
+    response = payment_event(client, "s3cret", student_id="SSC20250001")
+    assert response.status_code == 200 and response.get_json()["invalidated"] == 1
+
+def test_payment_check_defaults_to_the_current_term(client, settings, monkeypatch):
+    settings(PAYMENT_EVENT_SECRET="s3cret", CURRENT_TERM="2025-2")
+    checked = []
+    monkeypatch.setattr(app_module, "check_new_payments", lambda student_id, term: checked.append((student_id, term)) or {"status": "checked"})
+
+    payment_event(client, "s3cret", student_id="SSC20250001", check="true")
+    assert checked == [("SSC20250001", "2025-2")]
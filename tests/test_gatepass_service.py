@@ -0,0 +1,194 @@
+# tests/test_gatepass_service.py
+import datetime
+import threading
+import time
+
+import pytest
+
+import app as app_module
+from src.services import gatepass_service
+from src.utils import database, single_flight
+from tests.conftest import add_contact
+
+ISSUED = datetime.datetime(2025, 2, 1)
+EXPIRES = datetime.datetime(2025, 3, 31)
+
+@pytest.fixture
+def stored_media(monkeypatch):
+    """Skip rendering and uploads; slow enough for concurrent issuances to overlap."""
+    rendered = []
+
+    def store(pass_fields, output=None):
+        rendered.append(pass_fields["pass_id"])
+        time.sleep(0.2)
+        return {"pdf_path": f"gatepasses/{pass_fields['pass_id']}.pdf", "image_path": None, "qr_path": None,
+                "media_urls": [f"https://files.test/{pass_fields['pass_id']}.pdf"]}
+
+    monkeypatch.setattr(gatepass_service, "store_gatepass_media", store)
+    return rendered
+
+def test_repeated_issuance_creates_one_pass(session, twilio, stored_media):
+    contact = add_contact(session, "SSC20250001", "0771234567")
+    first, _ = gatepass_service.issue_gatepass_once(session, contact, "2025-1", 75.0, ISSUED, EXPIRES)
+    second, _ = gatepass_service.issue_gatepass_once(session, contact, "2025-1", 75.0, ISSUED, EXPIRES)
+
+    assert first["status"] == "Gate pass issued"
+    assert second["status"] == "Gate pass not updated"
+    assert second["pass_id"] == first["pass_id"]
+    assert session.query(database.GatePass).count() == 1
+    assert len(stored_media) == 1
+    assert len(twilio.sent) == 1
+
+def test_concurrent_issuance_creates_one_pass(database_url, twilio, stored_media):
+    setup = database.init_db()
+    add_contact(setup, "SSC20250001", "0771234567")
+    setup.close()
+    results = []
+
+    def issue(payment_percentage):
+        session = database.init_db()
+        try:
+            contact = session.query(database.StudentContact).filter_by(student_id="SSC20250001").one()
+            results.append(gatepass_service.issue_gatepass_once(session, contact, "2025-1", payment_percentage, ISSUED, EXPIRES)[0])
+        finally:
+            session.close()
+
+    # Identical requests share one flight; a lower percentage waits on the student lock
+    threads = [threading.Thread(target=issue, args=(percentage,)) for percentage in (75.0, 75.0, 60.0)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    check = database.init_db()
+    assert check.query(database.GatePass).count() == 1
+    check.close()
+    assert len({result["pass_id"] for result in results}) == 1
+    assert len(stored_media) == 1
+    assert len(twilio.sent) == 1
+
+class RecordingConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.log.append(("close", self))
+
+    def execute(self, statement, parameters):
+        self.log.append((str(statement).split("(")[0], self))
+
+    def invalidate(self):
+        self.log.append(("invalidate", self))
+
+class PostgresEngine:
+    dialect = type("Dialect", (), {"name": "postgresql"})()
+
+    def __init__(self):
+        self.log = []
+
+    def connect(self):
+        return RecordingConnection(self.log)
+
+class PostgresSession:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def get_bind(self):
+        return self.engine
+
+def test_advisory_lock_unlocks_on_the_connection_that_locked():
+    engine = PostgresEngine()
+    with single_flight.advisory_lock(PostgresSession(engine), "gatepass:SSC20250001"):
+        assert [entry[0] for entry in engine.log] == ["SELECT pg_advisory_lock"]
+    assert [entry[0] for entry in engine.log] == ["SELECT pg_advisory_lock", "SELECT pg_advisory_unlock", "close"]
+    assert len({id(entry[1]) for entry in engine.log}) == 1
+
+MEDIA_URLS = ["https://files.test/pass.jpg", "https://files.test/pass.pdf"]
+
+def test_partial_media_delivery_counts_as_delivered(twilio):
+    twilio.fail = lambda message: message["media_url"] == ["https://files.test/pass.pdf"]
+    method, message_sids = gatepass_service.deliver_gatepass("+263771234567", MEDIA_URLS, "Gate pass as text", "SSC20250001")
+
+    assert method == "media"
+    assert message_sids == [twilio.sent[0].sid]
+    assert [message.media_url for message in twilio.sent] == [["https://files.test/pass.jpg"]]
+    assert not any(getattr(message, "body", None) == "Gate pass as text" for message in twilio.sent)
+
+def test_every_media_sid_is_returned(twilio):
+    method, message_sids = gatepass_service.deliver_gatepass("+263771234567", MEDIA_URLS, "Gate pass as text", "SSC20250001")
+
+    assert method == "media"
+    assert message_sids == [message.sid for message in twilio.sent]
+    assert len(message_sids) == 2
+    assert "Do not share" in twilio.sent[0].body and not hasattr(twilio.sent[1], "body")
+
+def test_text_fallback_when_no_media_is_sent(twilio):
+    twilio.fail = lambda message: "media_url" in message
+    method, message_sids = gatepass_service.deliver_gatepass("+263771234567", MEDIA_URLS, "Gate pass as text", "SSC20250001")
+
+    assert (method, message_sids) == ("text", [])
+    assert [message.body for message in twilio.sent] == ["Gate pass as text"]
+
+class RecordingStorage:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, key):
+        self.deleted.append(key)
+
+@pytest.fixture
+def both_outputs(settings, monkeypatch):
+    """GATEPASS_OUTPUT=both: an inline image and a PDF, each sent in its own message."""
+    settings(GATEPASS_OUTPUT="both")
+
+    def store(pass_fields, output=None):
+        pass_id = pass_fields["pass_id"]
+        return {"pdf_path": f"gatepasses/gatepass_{pass_id}.pdf", "image_path": f"gatepasses/gatepass_{pass_id}.jpg", "qr_path": None,
+                "media_urls": [f"https://files.test/{pass_id}.jpg", f"https://files.test/{pass_id}.pdf"]}
+
+    monkeypatch.setattr(gatepass_service, "store_gatepass_media", store)
+    monkeypatch.setattr(app_module, "store_gatepass_media", store)
+    storage = RecordingStorage()
+    monkeypatch.setattr(app_module, "get_storage", lambda: storage)
+    return storage
+
+def status_callback(client, message_sid, status):
+    return client.post("/message-status", data={"MessageSid": message_sid, "MessageStatus": status})
+
+def test_media_is_kept_until_every_message_is_final(client, session, twilio, both_outputs):
+    contact = add_contact(session, "SSC20250001", "0771234567")
+    result, _ = gatepass_service.issue_gatepass_once(session, contact, "2025-1", 75.0, ISSUED, EXPIRES)
+    image_sid, pdf_sid = [message.sid for message in twilio.sent]
+    assert sorted(sid for (sid,) in session.query(database.GatePassMessage.message_sid)) == sorted([image_sid, pdf_sid])
+
+    # The PDF is delivered first while the image is still queued
+    assert status_callback(client, pdf_sid, "delivered").status_code == 200
+    assert status_callback(client, image_sid, "sent").status_code == 200
+    assert both_outputs.deleted == []
+
+    status_callback(client, image_sid, "undelivered")
+    assert sorted(both_outputs.deleted) == sorted([f"gatepasses/gatepass_{result['pass_id']}.pdf", f"gatepasses/gatepass_{result['pass_id']}.jpg"])
+    session.expire_all()
+    gate_pass = session.query(database.GatePass).one()
+    assert (gate_pass.pdf_path, gate_pass.image_path) == (None, None)
+
+def test_callbacks_of_an_earlier_delivery_leave_a_resent_pass_alone(client, session, twilio, both_outputs):
+    contact = add_contact(session, "SSC20250001", "0771234567")
+    gatepass_service.issue_gatepass_once(session, contact, "2025-1", 75.0, ISSUED, EXPIRES)
+    first_sids = [message.sid for message in twilio.sent]
+
+    client.post("/whatsapp-incoming", data={
+        "From": "whatsapp:+263771234567", "To": "whatsapp:+14155238886", "Body": "get gatepass", "MessageSid": f"SM{900:032d}"
+    })
+    resent_sids = [message.sid for message in twilio.sent][2:]
+    assert len(resent_sids) == 2
+
+    for sid in first_sids:
+        status_callback(client, sid, "delivered")
+    assert both_outputs.deleted == []
+    for sid in resent_sids:
+        status_callback(client, sid, "delivered")
+    assert len(both_outputs.deleted) == 2
@@ -0,0 +1,59 @@
+# tests/test_idempotency.py
+import pytest
+
+import app as app_module
+from src.utils import idempotency
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Count how often the /whatsapp-incoming handler actually runs."""
+    calls = []
+    find_contacts = app_module.find_contacts_by_phone
+
+    def counting(session, phone_number):
+        calls.append(phone_number)
+        return find_contacts(session, phone_number)
+
+    monkeypatch.setattr(app_module, "find_contacts_by_phone", counting)
+    return calls
+
+def incoming(client, message_sid="SM00000000000000000000000000000001", body="hello"):
+    return client.post("/whatsapp-incoming", data={
+        "From": "whatsapp:+263771234567", "To": "whatsapp:+14155238886", "Body": body, "MessageSid": message_sid
+    })
+
+@pytest.mark.parametrize("backend", ["memory", "database"])
+def test_retry_replays_the_stored_response(client, settings, lookups, backend):
+    settings(IDEMPOTENCY_BACKEND=backend)
+    first = incoming(client)
+    retry = incoming(client)
+    other = incoming(client, message_sid="SM00000000000000000000000000000002")
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_data() == first.get_data()
+    assert b"provide your student ID" in first.get_data()
+    assert len(lookups) == 2  # the retry did not run the handler
+
+def test_retry_while_the_original_is_in_flight_is_asked_to_come_back(client, lookups):
+    store = idempotency.get_idempotency_store()
+    key = "/whatsapp-incoming:SM00000000000000000000000000000001"
+    assert store.begin(key) == (idempotency.NEW, None)
+
+    retry = incoming(client)
+    assert retry.status_code == 503
+    assert retry.headers["Retry-After"] == str(idempotency.IN_FLIGHT_RETRY_AFTER_SECONDS)
+    assert lookups == []
+
+    # The original failed and released its claim; Twilio's next retry is processed
+    store.release(key)
+    assert incoming(client).status_code == 200
+    assert len(lookups) == 1
+
+def test_server_errors_are_not_stored(client):
+    def broken():
+        return "Unavailable", 500
+    key = "/whatsapp-incoming:SM00000000000000000000000000000003"
+    view = idempotency.idempotent_webhook(lambda: key)(broken)
+    with app_module.app.test_request_context("/whatsapp-incoming", method="POST"):
+        assert view().status_code == 500
+    assert idempotency.get_idempotency_store().begin(key) == (idempotency.NEW, None)
@@ -0,0 +1,73 @@
+# tests/test_job_runs.py
+import datetime
+
+from src.services import job_run_service
+from src.utils import database, scheduler
+
+STUDENT_IDS = [f"SSC2025000{index}" for index in range(1, 6)]
+
+def discover():
+    return list(STUDENT_IDS)
+
+def never_called():
+    raise AssertionError("a resumed run must not rediscover its students")
+
+def interrupt(session, run, hours_ago=0, minutes_ago=30):
+    """Leave run as a crashed worker would: still running, heartbeat gone stale."""
+    stale = datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=hours_ago, minutes=minutes_ago)
+    run.heartbeat_at = stale
+    run.started_at = stale
+    session.commit()
+
+def test_interrupted_run_resumes_with_only_the_pending_students(session):
+    run = job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", discover)
+    for item in job_run_service.pending_items(session, run)[:2]:
+        job_run_service.record_item(session, run, item, {"status": "Sent", "phone_number": "+263771111111"})
+    interrupt(session, run)
+
+    resumed = job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", never_called)
+    processed = []
+
+    def process(student_id, term, **kwargs):
+        processed.append(student_id)
+        return {"status": "Sent", "phone_number": "+263771111111"}
+
+    counts = scheduler._process_items(session, resumed, "2025-1", process)
+
+    assert resumed.id == run.id and resumed.resume_count == 1
+    assert processed == STUDENT_IDS[2:]
+    assert counts == {"succeeded": 3, "skipped": 0, "failed": 0}
+    session.refresh(resumed)
+    assert (resumed.succeeded, resumed.total_items) == (5, 5)
+    assert job_run_service.pending_count(session, resumed) == 0
+
+def test_live_run_is_not_started_twice(session):
+    job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", discover)
+    assert job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", never_called) is None
+
+def test_run_past_the_resume_window_is_abandoned(session, settings):
+    settings(JOB_RUN_RESUME_WINDOW_HOURS=24)
+    old = job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", discover)
+    interrupt(session, old, hours_ago=25)
+
+    fresh = job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", discover)
+
+    assert fresh.id != old.id and fresh.resume_count == 0
+    session.refresh(old)
+    assert old.status == "abandoned"
+    assert session.query(database.JobRunItem).filter_by(run_id=fresh.id).count() == len(STUDENT_IDS)
+
+def test_failed_items_are_checkpointed_and_not_retried_on_resume(session):
+    run = job_run_service.start_or_resume_run(session, "send_all_reminders", "2025-1", discover)
+
+    def process(student_id, term, **kwargs):
+        if student_id == STUDENT_IDS[0]:
+            return {"error": "No contact"}
+        raise RuntimeError("worker killed")
+
+    counts = scheduler._process_items(session, run, "2025-1", process)
+
+    assert counts["failed"] == 5
+    assert job_run_service.pending_count(session, run) == 0
+    details = dict(session.query(database.JobRunItem.student_id, database.JobRunItem.detail).filter_by(run_id=run.id))
+    assert details[STUDENT_IDS[0]] == "No contact" and details[STUDENT_IDS[1]] == "worker killed"
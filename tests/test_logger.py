@@ -0,0 +1,54 @@
+# tests/test_logger.py
+import logging.handlers
+import types
+
+import pytest
+
+from src.utils import logger
+
+def log_config(tmp_path, rotation):
+    return types.SimpleNamespace(LOG_FILE=str(tmp_path / "app.log"), LOG_ROTATION=rotation, LOG_MAX_BYTES=1024, LOG_BACKUP_COUNT=2)
+
+def test_external_rotation_reopens_a_moved_file(tmp_path):
+    handler = logger._file_handler(log_config(tmp_path, "external"))
+    try:
+        assert isinstance(handler, logging.handlers.WatchedFileHandler)
+        handler.emit(logging.makeLogRecord({"msg": "before rotation"}))
+        (tmp_path / "app.log").rename(tmp_path / "app.log.1")
+        handler.emit(logging.makeLogRecord({"msg": "after rotation"}))
+    finally:
+        handler.close()
+    assert (tmp_path / "app.log.1").read_text() == "before rotation\n"
+    assert (tmp_path / "app.log").read_text() == "after rotation\n"
+
+def test_size_rotation_and_unknown_modes(tmp_path):
+    handler = logger._file_handler(log_config(tmp_path, "size"))
+    handler.close()
+    assert isinstance(handler, logging.handlers.RotatingFileHandler) and handler.maxBytes == 1024
+    with pytest.raises(ValueError, match="LOG_ROTATION"):
+        logger._file_handler(log_config(tmp_path, "daily"))
+
+@pytest.mark.parametrize("text, expected", [
+    ("Sent to +263771234567", "Sent to ***567"),
+    ("Sent to whatsapp:+263771234567", "Sent to whatsapp:***567"),
+    ("Sent to +263 77 123 4567", "Sent to ***567"),
+    ("Sent to 263771234567", "Sent to ***567"),
+    ("Sent to 0771234567", "Sent to ***567"),
+    ("Sent to 00447911123456", "Sent to ***456"),
+    ("Sent to +44 7911 123456.", "Sent to ***456.")
+])
+def test_phone_numbers_are_masked(text, expected):
+    assert logger.redact(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "Run started at 20250301123456",
+    "Receipt 10023345566 recorded",
+    "Student SSC20257279 has 12345678901234 points",
+    "Pass 7d1c2a90-4b4e-4f55-9f0e-123456789012 issued",
+    "Paid $1500000000.50 in total"
+])
+def test_other_long_numbers_are_left_alone(text):
+    assert logger.redact(text) == text
+
+def test_secrets_are_masked():
+    assert logger.redact("headers={'Authorization': 'Api-Key abc123'}") == "headers={'Authorization': 'Api-Key [REDACTED]'}"
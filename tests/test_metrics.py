@@ -0,0 +1,48 @@
+# tests/test_metrics.py
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.utils import metrics
+
+@pytest.fixture
+def metrics_dir(settings, tmp_path, monkeypatch):
+    settings(METRICS_DIR=str(tmp_path))
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    return tmp_path
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def write_process_file(directory, pid, value):
+    snapshot = {"counters": [["batch_items_total", [["job", "reminders"], ["outcome", "succeeded"]], value]], "histograms": []}
+    (directory / f"metrics_{pid}.json").write_text(json.dumps(snapshot))
+
+def reminders_total(text):
+    line = next(line for line in text.splitlines() if line.startswith("batch_items_total{"))
+    return float(line.rsplit(" ", 1)[1])
+
+def test_exited_process_files_are_folded_into_one(metrics_dir):
+    for pid, value in ((exited_pid(), 3), (exited_pid(), 4)):
+        write_process_file(metrics_dir, pid, value)
+    (metrics_dir / f"metrics_{exited_pid()}.json.tmp").write_text("{")
+    metrics.inc("batch_items_total", job="reminders", outcome="succeeded")
+
+    assert reminders_total(metrics.render_prometheus()) == 8
+    assert sorted(os.listdir(metrics_dir)) == sorted([".retire.lock", metrics.RETIRED_FILE, f"metrics_{os.getpid()}.json"])
+    # Folded counts are not added again on the next scrape
+    assert reminders_total(metrics.render_prometheus()) == 8
+
+def test_live_process_files_are_kept(metrics_dir):
+    write_process_file(metrics_dir, os.getppid(), 5)
+    metrics.inc("batch_items_total", job="reminders", outcome="succeeded")
+
+    assert reminders_total(metrics.render_prometheus()) == 6
+    assert (metrics_dir / f"metrics_{os.getppid()}.json").exists()
+    assert not (metrics_dir / metrics.RETIRED_FILE).exists()
@@ -0,0 +1,72 @@
+# tests/test_outbox.py
+from src.utils import outbox as outbox_module
+from src.utils.messages import PAYMENT_CONFIRMATION, REMINDER
+from src.utils.outbox import MessageOutbox
+
+class Sender:
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+
+    def __call__(self, phone_number, body):
+        if phone_number in self.failing:
+            raise RuntimeError("Twilio is unavailable")
+        self.sent.append((phone_number, body))
+        return f"SM{len(self.sent):032d}"
+
+def reminder(student_id, fullname, balance=100.0):
+    return {"student_id": student_id, "fullname": fullname, "balance": balance, "term": "2025-1"}
+
+def test_siblings_on_one_number_get_one_combined_message():
+    send = Sender()
+    outbox = MessageOutbox(window_seconds=60, send=send)
+    outbox.add("077 111 1111", REMINDER, reminder("SSC20250001", "Tendai Moyo"))
+    outbox.add("+263771111111", REMINDER, reminder("SSC20250002", "Rudo Moyo", 50.0))
+    outbox.add("whatsapp:+263771111111", REMINDER, reminder("SSC20250003", "Farai Moyo", 25.0))
+    outbox.add("0772222222", REMINDER, reminder("SSC20250004", "Chipo Dube"))
+    assert len(outbox) == 4
+
+    results = outbox.flush()
+
+    assert [phone_number for phone_number, _ in send.sent] == ["+263771111111", "+263772222222"]
+    combined = send.sent[0][1]
+    assert "Tendai Moyo (SSC20250001): $100.0" in combined and "Farai Moyo (SSC20250003): $25.0" in combined
+    assert send.sent[1][1].startswith("Dear Chipo Dube, your child (SSC20250004)")
+    assert results["SSC20250001"] == results["SSC20250002"] == results["SSC20250003"]
+    assert results["SSC20250001"]["message_sid"] == f"SM{1:032d}"
+    assert len(outbox) == 0 and not outbox.due()
+
+def test_kinds_are_not_mixed_in_one_message():
+    send = Sender()
+    outbox = MessageOutbox(window_seconds=60, send=send)
+    outbox.add("+263771111111", REMINDER, reminder("SSC20250001", "Tendai Moyo"))
+    outbox.add("+263771111111", PAYMENT_CONFIRMATION, dict(reminder("SSC20250002", "Rudo Moyo"), amount=20.0))
+
+    outbox.flush()
+    assert len(send.sent) == 2
+
+def test_failed_send_fails_every_sibling_in_the_group():
+    outbox = MessageOutbox(window_seconds=60, send=Sender(failing={"+263771111111"}))
+    outbox.add("0771111111", REMINDER, reminder("SSC20250001", "Tendai Moyo"))
+    outbox.add("0771111111", REMINDER, reminder("SSC20250002", "Rudo Moyo"))
+    outbox.add("0772222222", REMINDER, reminder("SSC20250003", "Chipo Dube"))
+
+    results = outbox.flush()
+    assert results["SSC20250001"]["error"] == results["SSC20250002"]["error"] == "Failed to send message: Twilio is unavailable"
+    assert results["SSC20250003"]["status"] == "Sent reminder"
+
+def test_outbox_is_due_after_its_window(monkeypatch):
+    now = [500.0]
+    monkeypatch.setattr(outbox_module.time, "monotonic", lambda: now[0])
+    outbox = MessageOutbox(window_seconds=30, send=Sender())
+    assert not outbox.due()
+    outbox.add("0771111111", REMINDER, reminder("SSC20250001", "Tendai Moyo"))
+    now[0] += 29
+    assert not outbox.due()
+    now[0] += 1
+    assert outbox.due()
+
+def test_zero_window_is_due_at_once():
+    outbox = MessageOutbox(window_seconds=0, send=Sender())
+    outbox.add("0771111111", REMINDER, reminder("SSC20250001", "Tendai Moyo"))
+    assert outbox.due()
@@ -0,0 +1,85 @@
+# tests/test_phone.py
+import datetime
+
+import pytest
+from sqlalchemy import insert
+
+import app as app_module
+from src.utils import database
+from src.utils.phone import normalize_phone
+from tests.conftest import add_contact
+
+@pytest.mark.parametrize("raw, expected", [
+    ("+263771234567", "+263771234567"),
+    ("0771234567", "+263771234567"),
+    ("077 123 4567", "+263771234567"),
+    ("(077) 123-4567", "+263771234567"),
+    ("whatsapp:+263771234567", "+263771234567"),
+    ("00263771234567", "+263771234567"),
+    ("263771234567", "+263771234567"),  # '+' decoded to a space in a query string
+    (" 263771234567", "+263771234567"),
+    ("+447911123456", "+447911123456"),
+    ("123", None),
+    ("not a number", None),
+    ("", None),
+    (None, None)
+])
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw) == expected
+
+def test_contacts_are_found_by_any_format(session):
+    add_contact(session, "SSC20250001", "077 123 4567", guardian_mobile_number="0772 000 111")
+    add_contact(session, "SSC20250002", "+263 77 123 4567")
+
+    found = database.find_contacts_by_phone(session, "whatsapp:+263771234567")
+    assert [contact.student_id for contact in found] == ["SSC20250001", "SSC20250002"]
+    assert [contact.student_id for contact in database.find_contacts_by_phone(session, "0772000111")] == ["SSC20250001"]
+
+def test_passes_are_issued_to_the_canonical_number(client, session, twilio, monkeypatch):
+    monkeypatch.setattr("src.services.gatepass_service.store_gatepass_media", lambda pass_fields, output=None: {
+        "pdf_path": "gatepasses/pass.pdf", "image_path": None, "qr_path": None, "media_urls": ["https://files.test/pass.pdf"]
+    })
+    monkeypatch.setattr(app_module, "store_gatepass_media", lambda pass_fields, output=None: {
+        "pdf_path": "gatepasses/resent.pdf", "image_path": None, "qr_path": None, "media_urls": ["https://files.test/resent.pdf"]
+    })
+    add_contact(session, "SSC20250001", "077 123 4567")
+
+    issued = client.post("/generate-gatepass?student_id=SSC20250001&term=2025-1&payment_amount=750&total_fees=1000")
+    assert issued.status_code == 200
+    assert issued.json["whatsapp_number"] == "+263771234567"
+    assert session.query(database.GatePass.whatsapp_number).scalar() == "+263771234567"
+
+    resent = client.post("/whatsapp-incoming", data={
+        "From": "whatsapp:+263771234567", "Body": "get gatepass", "MessageSid": "SM00000000000000000000000000000001"
+    })
+    assert b"Your gate pass has been sent." in resent.get_data()
+    assert [message.media_url for message in twilio.sent_to("+263771234567")] == [
+        ["https://files.test/pass.pdf"], ["https://files.test/resent.pdf"]
+    ]
+
+def test_missing_normalized_numbers_are_backfilled_on_startup(database_url):
+    engine = database.get_engine()
+    issued = datetime.datetime.now(datetime.UTC)
+    with engine.begin() as connection:
+        # Core inserts skip the ORM validators, as bulk loads and older code did
+        connection.execute(insert(database.StudentContact), [
+            {"student_id": "SSC20250001", "preferred_phone_number": "077 123 4567", "guardian_mobile_number": "0772000111"},
+            {"student_id": "SSC20250002", "preferred_phone_number": "unknown", "guardian_mobile_number": None}
+        ])
+        connection.execute(insert(database.GatePass), [{
+            "student_id": "SSC20250001", "pass_id": "legacy-pass", "issued_date": issued,
+            "expiry_date": issued + datetime.timedelta(days=30), "payment_percentage": 75, "whatsapp_number": "077 123 4567"
+        }])
+
+    # Next process start
+    database._sessionmakers.pop(database._engines.pop(database_url))
+    engine.dispose()
+    session = database.init_db()
+    try:
+        contact = session.query(database.StudentContact).filter_by(student_id="SSC20250001").one()
+        assert (contact.preferred_phone_e164, contact.guardian_mobile_e164) == ("+263771234567", "+263772000111")
+        assert session.query(database.GatePass.whatsapp_e164).scalar() == "+263771234567"
+        # Caught up: only the number that cannot be normalized is looked at again
+        assert database.backfill_normalized_phones(session) == 0
+    finally:
+        session.close()
@@ -0,0 +1,46 @@
+# tests/test_profiles.py
+from src.services.profile_sync_service import get_profiles_bulk
+from src.utils.query_budget import track_queries
+from tests.conftest import add_contact
+
+def profile(firstname, phone_number):
+    return {"firstname": firstname, "lastname": "Moyo", "student_mobile": phone_number}
+
+def test_bulk_lookup_fetches_only_misses_and_caches_them(session, sms):
+    add_contact(session, "SSC20250001", "+263771111111")
+    sms.profiles["SSC20250002"] = profile("Rudo", "0772222222")
+    sms.profiles["SSC20250003"] = {"firstname": "Farai"}
+
+    contacts, errors = get_profiles_bulk(session, ["SSC20250001", "SSC20250002", "SSC20250003", "SSC20250004"])
+
+    assert sorted(contacts) == ["SSC20250001", "SSC20250002"]
+    assert contacts["SSC20250002"].preferred_phone_number == "+263772222222"
+    assert errors["SSC20250003"] == "No phone number in profile"
+    assert errors["SSC20250004"].startswith("Profile not found: 404 Client Error")
+    assert sorted(sms.calls_for("profile")) == ["SSC20250002", "SSC20250003", "SSC20250004"]
+
+    sms.calls.clear()
+    with track_queries("repeat") as queries:
+        contacts, errors = get_profiles_bulk(session, ["SSC20250001", "SSC20250002"])
+    assert sorted(contacts) == ["SSC20250001", "SSC20250002"] and not errors
+    assert sms.calls == []
+    assert queries.count == 1  # one IN query for every hit
+
+def test_profiles_route_pages_over_the_requested_ids(client, session, sms):
+    for index in range(1, 6):
+        add_contact(session, f"SSC2025000{index}", f"+26377111111{index}")
+    student_ids = [f"SSC2025000{index}" for index in range(1, 6)] + ["SSC20259999"]
+
+    first = client.post("/get-student-profiles", json={"student_ids": student_ids, "page_size": 4}).get_json()
+    second = client.get(f"/get-student-profiles?student_ids={','.join(student_ids)}&page=2&page_size=4").get_json()
+
+    assert [entry["student_id"] for entry in first["profiles"]] == student_ids[:4]
+    assert (first["total"], first["next_page"], first["errors"]) == (6, 2, {})
+    assert [entry["student_id"] for entry in second["profiles"]] == ["SSC20250005"]
+    assert second["next_page"] is None
+    assert list(second["errors"]) == ["SSC20259999"]
+    assert sms.calls_for("profile") == ["SSC20259999"]
+
+def test_profiles_route_rejects_bad_input(client):
+    assert client.post("/get-student-profiles", json={}).status_code == 400
+    assert client.get("/get-student-profiles?student_ids=SSC20250001&page=x").status_code == 400
@@ -0,0 +1,85 @@
+# tests/test_query_budget.py
+import datetime
+
+import pytest
+
+import app as app_module
+from src.services.contact_service import preloaded_contacts
+from src.services.job_run_service import start_or_resume_run
+from src.services.payment_service import check_new_payments
+from src.services.reminder_service import send_balance_reminders
+from src.utils import database, scheduler
+from src.utils.outbox import MessageOutbox
+from src.utils.query_budget import assert_max_queries, track_queries
+from tests.conftest import add_contact
+
+def incoming(client, body, message_sid):
+    return client.post("/whatsapp-incoming", data={"From": "whatsapp:+263771234567", "Body": body, "MessageSid": message_sid})
+
+def test_schema_setup_is_not_counted_against_the_first_request(client):
+    # The engine and schema are created inside this request
+    with assert_max_queries(2, "first POST /update-contact"):
+        response = client.post("/update-contact?student_id=SSC20250001&phone_number=0771234567")
+    assert response.status_code == 200
+
+def test_whatsapp_incoming_queries(client, session):
+    add_contact(session, "SSC20250001", "0771234567")
+    with assert_max_queries(1):
+        assert b"provide your student ID" in client.post("/whatsapp-incoming", data={
+            "From": "whatsapp:+263779999999", "Body": "hello", "MessageSid": "SM1"
+        }).get_data()
+    with assert_max_queries(1):
+        assert b"Send 'get gatepass'" in incoming(client, "hello", "SM2").get_data()
+
+def test_whatsapp_get_gatepass_queries(client, session, monkeypatch):
+    add_contact(session, "SSC20250001", "0771234567")
+    add_contact(session, "SSC20250002", "0771234567")
+    issued = datetime.datetime.now(datetime.UTC)
+    session.add(database.GatePass(
+        student_id="SSC20250001", pass_id="pass-1", issued_date=issued, expiry_date=issued + datetime.timedelta(days=30),
+        payment_percentage=75, whatsapp_number="+263771234567", last_updated=issued
+    ))
+    session.commit()
+    monkeypatch.setattr(app_module, "store_gatepass_media", lambda pass_fields, output=None: {
+        "pdf_path": "gatepasses/pass-1.pdf", "image_path": None, "qr_path": None, "media_urls": ["https://files.test/pass-1.pdf"]
+    })
+    # Contacts, latest pass, the pass's new files and SID, then its delivery messages replaced
+    with assert_max_queries(5):
+        assert b"Your gate pass has been sent." in incoming(client, "get gatepass", "SM1").get_data()
+
+@pytest.fixture
+def debtors(session):
+    student_ids = [f"SSC2025{index:04d}" for index in range(10)]
+    for index, student_id in enumerate(student_ids):
+        add_contact(session, student_id, f"07712{index:05d}")
+    return student_ids
+
+def test_batch_items_do_not_query_per_contact(session, debtors, twilio):
+    outbox = MessageOutbox(window_seconds=3600, send=lambda phone_number, message: "SM1")
+    with preloaded_contacts(session, debtors):
+        for student_id in debtors:
+            with assert_max_queries(0, f"reminder {student_id}"):
+                assert send_balance_reminders(student_id, "2025-1", balance=250.0, outbox=outbox)["queued"]
+
+def test_payment_check_item_reuses_the_discovery_snapshot(session, debtors, sms, twilio):
+    from src.services.financial_snapshot_service import get_financial_snapshot
+    for student_id in debtors:
+        get_financial_snapshot(student_id, "2025-1")  # the discovery pass
+    with preloaded_contacts(session, debtors):
+        for student_id in debtors:
+            # One keyed read of the shared snapshot, no SMS API call
+            with assert_max_queries(1, f"payments {student_id}"):
+                assert "No new payments" in check_new_payments(student_id, "2025-1", outbox=MessageOutbox())["status"]
+    assert len(sms.calls_for("payments")) == len(debtors)
+
+def test_batch_run_queries_grow_by_a_constant_per_item(session, debtors, twilio, settings):
+    settings(COALESCE_MESSAGES=True, COALESCE_WINDOW_SECONDS=3600)
+    run = start_or_resume_run(session, "send_all_reminders", "2025-1", lambda: [
+        {"student_id": student_id, "balance": 250.0} for student_id in debtors
+    ])
+    with track_queries("run") as stats:
+        counts = scheduler._process_items(session, run, "2025-1", send_balance_reminders)
+    assert counts["succeeded"] == len(debtors)
+    # Pending items and the contact preload, then the item and run counter updates per item
+    assert stats.count == 2 + 2 * len(debtors), stats.summary(10)
+    assert not [statement for statement, _ in stats.repeated() if "student_contacts" in statement]
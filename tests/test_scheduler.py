@@ -0,0 +1,95 @@
+# tests/test_scheduler.py
+import pytest
+
+from src.services import gatepass_service
+from src.services.job_run_service import start_or_resume_run
+from src.services.reminder_service import send_balance_reminders
+from src.utils import database, scheduler
+from tests.conftest import add_contact
+
+FAMILIES = 12
+
+@pytest.fixture
+def siblings(session):
+    """Two children per guardian, each contact writing the shared number differently."""
+    for family in range(FAMILIES):
+        add_contact(session, f"SSC2025{family:03d}A", f"077 {family:03d} 4567", firstname=f"Child{family}A")
+        add_contact(session, f"SSC2025{family:03d}B", f"+263 77{family:03d}4567", firstname=f"Child{family}B")
+    return [(f"SSC2025{family:03d}A", f"SSC2025{family:03d}B") for family in range(FAMILIES)]
+
+def start_run(session, student_ids):
+    return start_or_resume_run(session, "send_all_reminders", "2025-1", lambda: [
+        {"student_id": student_id, "balance": 250.0} for student_id in student_ids
+    ])
+
+def test_siblings_sharing_a_phone_land_in_one_shard(session, siblings):
+    run = start_run(session, [student_id for family in siblings for student_id in family])
+    shards = scheduler._assign_shards(session, run, 4)
+
+    assert sorted(student_id for shard in shards for student_id in shard) == sorted(student_id for family in siblings for student_id in family)
+    shard_of = {student_id: index for index, shard in enumerate(shards) for student_id in shard}
+    assert all(shard_of[first] == shard_of[second] for first, second in siblings)
+    assert len({index for index, shard in enumerate(shards) if shard}) > 1
+
+def test_each_shard_sends_one_message_per_family(session, siblings, twilio, settings):
+    settings(COALESCE_MESSAGES=True, COALESCE_WINDOW_SECONDS=3600)
+    run = start_run(session, [student_id for family in siblings for student_id in family])
+    for shard in scheduler._assign_shards(session, run, 3):
+        counts = scheduler._process_items(session, run, "2025-1", send_balance_reminders, shard)
+        assert counts["succeeded"] == len(shard)
+
+    assert len(twilio.sent) == FAMILIES
+    for family, (first, second) in enumerate(siblings):
+        [message] = twilio.sent_to(f"+26377{family:03d}4567")
+        assert first in message.body and second in message.body
+
+def test_sharded_payment_check_issues_gate_passes(session, sms, twilio, settings, monkeypatch):
+    """Shard workers have no Flask app context; passes are still issued."""
+    settings(COALESCE_MESSAGES=False)
+    monkeypatch.setattr(gatepass_service, "store_gatepass_media", lambda pass_fields, output=None: {
+        "pdf_path": f"gatepasses/{pass_fields['pass_id']}.pdf", "image_path": None, "qr_path": None,
+        "media_urls": [f"https://files.test/{pass_fields['pass_id']}.pdf"]
+    })
+    # Same worker entry point as the process pool, run in this process so the fakes apply
+    monkeypatch.setattr(scheduler, "_run_shards", lambda job_name, run_id, term, shard_assignments: [
+        scheduler._process_shard(job_name, run_id, term, index, len(shard_assignments), student_ids)
+        for index, student_ids in enumerate(shard_assignments)
+    ])
+    for index in range(4):
+        student_id = f"SSC2025000{index}"
+        add_contact(session, student_id, f"07712{index:05d}")
+        sms.debtors[student_id] = 400.0
+        sms.payments[student_id] = [{"amount": 600.0}]
+        sms.statements[student_id] = {"total_fees": 1000.0, "balance": 400.0}
+
+    summary = scheduler.check_all_payments(shards=2)
+
+    assert (summary["shards"], summary["succeeded"], summary["failed"]) == (2, 4, 0)
+    assert sorted(student_id for (student_id,) in session.query(database.GatePass.student_id)) == [f"SSC2025000{index}" for index in range(4)]
+    assert sum(1 for message in twilio.sent if getattr(message, "media_url", None)) == 4
+
+def test_batch_jobs_run_for_the_configured_term(session, settings, monkeypatch):
+    settings(CURRENT_TERM="2025-2")
+    terms = []
+    monkeypatch.setitem(scheduler.BATCH_PROCESSORS, "check_all_payments",
+                        lambda student_id, term, **kwargs: terms.append(term) or {"status": "ok"})
+    monkeypatch.setattr(scheduler, "_discover_payment_students", lambda term: ["SSC20250001"])
+
+    scheduler.check_all_payments(shards=1)
+
+    assert terms == ["2025-2"]
+    assert session.query(database.JobRun.term).scalar() == "2025-2"
+
+def test_resumed_runs_keep_the_term_they_started_with(session, settings, monkeypatch):
+    run = start_or_resume_run(session, "check_all_payments", "2025-1", lambda: ["SSC20250001"])
+    run.status = "failed"
+    session.commit()
+    settings(CURRENT_TERM="2025-2")
+    terms = []
+    monkeypatch.setitem(scheduler.BATCH_PROCESSORS, "check_all_payments",
+                        lambda student_id, term, **kwargs: terms.append(term) or {"status": "ok"})
+
+    summary = scheduler.check_all_payments(shards=1)
+
+    assert (summary["resume_count"], summary["term"]) == (1, "2025-1")
+    assert terms == ["2025-1"]
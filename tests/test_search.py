@@ -0,0 +1,59 @@
+# tests/test_search.py
+import pytest
+
+from src.services import search_service
+from src.services.search_service import search_students
+from tests.conftest import add_contact
+
+@pytest.fixture
+def contacts(session, monkeypatch):
+    monkeypatch.setattr(search_service, "_index", None)
+    add_contact(session, "SSC20250001", "0771234567", firstname="Tendai", lastname="Moyo")
+    add_contact(session, "SSC20250012", "+263772220001", firstname="Tendai", lastname="Dube")
+    add_contact(session, "SSC20240100", "0773331234", firstname="Rudo", lastname="Tendayi")
+    add_contact(session, "SSC20240200", "0774440000", firstname="Farai", lastname="Ncube", guardian_mobile_number="077 999 1234")
+    return session
+
+def ranked(session, query, **kwargs):
+    results, _ = search_students(session, query, **kwargs)
+    return [(result["student_id"], result["matched"]) for result in results]
+
+def test_exact_id_ranks_above_id_prefixes(contacts):
+    results, total = search_students(contacts, "ssc20250001")
+    assert results[0]["student_id"] == "SSC20250001" and results[0]["score"] == 100.0
+    assert total == 1
+    assert ranked(contacts, "SSC2025") == [("SSC20250001", "student_id"), ("SSC20250012", "student_id")]
+
+def test_full_phone_number_in_any_format_matches_exactly(contacts):
+    for query in ("0771234567", "+263 77 123 4567", "263771234567"):
+        results, _ = search_students(contacts, query)
+        assert (results[0]["student_id"], results[0]["matched"], results[0]["score"]) == ("SSC20250001", "phone", 95.0)
+
+def test_phone_suffix_matches_every_number_of_a_contact(contacts):
+    assert sorted(ranked(contacts, "1234")) == [("SSC20240100", "phone"), ("SSC20240200", "phone")]
+
+def test_name_prefix_ranks_above_misspelt_names(contacts):
+    # Similar names (Tendayi) are only matched fuzzily when no name starts with the query
+    assert ranked(contacts, "tendai") == [("SSC20250001", "name"), ("SSC20250012", "name")]
+    assert ranked(contacts, "tenda") == [("SSC20250001", "name"), ("SSC20250012", "name"), ("SSC20240100", "name")]
+    assert ranked(contacts, "tendai moyo")[0] == ("SSC20250001", "name")
+    assert ranked(contacts, "tendia moyo")[0] == ("SSC20250001", "name")
+    assert ranked(contacts, "ncueb") == [("SSC20240200", "name")]
+
+def test_results_are_paged_in_rank_order(contacts):
+    all_results = ranked(contacts, "SSC202")
+    first = ranked(contacts, "SSC202", page=1, page_size=3)
+    second = ranked(contacts, "SSC202", page=2, page_size=3)
+    assert first + second == all_results and len(all_results) == 4
+
+def test_search_route(client, contacts):
+    body = client.get("/search-students?q=SSC202&page_size=3").get_json()
+    assert (body["total"], body["next_page"], len(body["results"])) == (4, 2, 3)
+    assert client.get("/search-students?q=S").status_code == 400
+    assert client.get("/search-students?q=SSC&page=x").status_code == 400
+
+def test_new_contacts_appear_after_the_refresh_interval(contacts, settings):
+    settings(SEARCH_INDEX_REFRESH_SECONDS=0)
+    assert ranked(contacts, "chipo") == []
+    add_contact(contacts, "SSC20250300", "0775550000", firstname="Chipo", lastname="Sibanda")
+    assert ranked(contacts, "chipo") == [("SSC20250300", "name")]
@@ -0,0 +1,79 @@
+# tests/test_sms_client.py
+import types
+
+import pytest
+import requests
+
+from src.api import sms_client
+from src.utils import metrics
+from src.api.sms_client import SMSClient
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, text=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = text if text is not None else str(payload)
+
+    def json(self):
+        if self._payload is None:
+            return sms_client.json.loads(self.text)
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Client Error: Not Found for url", response=self)
+
+@pytest.fixture
+def api(monkeypatch):
+    """Record requests.get calls and answer with api.response."""
+    api = types.SimpleNamespace(calls=[], response=FakeResponse(payload={"data": []}))
+
+    def get(url, **kwargs):
+        api.calls.append((url, kwargs))
+        return api.response
+
+    monkeypatch.setattr(sms_client.requests, "get", get)
+    return api
+
+@pytest.mark.parametrize("method, args, path, params", [
+    ("get_student_payments", ("SSC20250001", "2025-1"), "/student/payments/", {"student_id_number": "SSC20250001", "term": "2025-1"}),
+    ("get_student_account_statement", ("SSC20250001", "2025-1"), "/student/account-statement/", {"student_id_number": "SSC20250001", "term": "2025-1"}),
+    ("get_student_profile", ("SSC20250001",), "/student-profile/", {"student_id_number": "SSC20250001"}),
+    ("get_students_in_debt", (), "/students/accounts-in-debt/", {})
+])
+def test_requests_carry_the_api_key_and_params(api, method, args, path, params):
+    api.response = FakeResponse(payload={"data": [{"amount": 50.0}]})
+    assert getattr(SMSClient(), method)(*args) == {"data": [{"amount": 50.0}]}
+
+    [(url, kwargs)] = api.calls
+    assert url == f"http://sms.test{path}"
+    assert kwargs["params"] == params
+    assert kwargs["headers"]["Authorization"] == "Api-Key test-key"
+    assert kwargs["timeout"] == 30
+
+def test_not_found_raises_for_the_caller(api):
+    api.response = FakeResponse(status_code=404, payload={"detail": "Not found"})
+    with pytest.raises(requests.HTTPError, match="404 Client Error"):
+        SMSClient().get_student_payments("SSC20250001", "2025-1")
+
+def test_invalid_json_is_returned_as_an_error(api):
+    api.response = FakeResponse(text="<html>Bad gateway</html>")
+    assert SMSClient().get_student_profile("SSC20250001") == {"error": "Invalid JSON response", "raw": "<html>Bad gateway</html>"}
+
+def test_missing_settings_are_rejected(settings):
+    settings(SMS_API_KEY="")
+    with pytest.raises(ValueError, match="SMS_API_KEY"):
+        SMSClient()
+
+def test_calls_are_timed_and_failures_counted(api, settings, tmp_path, monkeypatch):
+    settings(METRICS_DIR=str(tmp_path))
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    SMSClient().get_student_payments("SSC20250001", "2025-1")
+    api.response = FakeResponse(status_code=404, payload={"detail": "Not found"})
+    with pytest.raises(requests.HTTPError):
+        SMSClient().get_student_payments("SSC20250001", "2025-1")
+
+    labels = (("method", "get_student_payments"),)
+    assert sum(metrics._histograms[("sms_api_request_duration_seconds", labels)][:-1]) == 2
+    assert metrics._counters[("sms_api_request_errors_total", labels)] == 1
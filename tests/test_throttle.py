@@ -0,0 +1,74 @@
+# tests/test_throttle.py
+import threading
+
+import app as app_module
+from src.utils import throttle
+
+def incoming(client, sender="+263771234567", body="hello", message_sid="SM00000000000000000000000000000001"):
+    return client.post("/whatsapp-incoming", data={
+        "From": f"whatsapp:{sender}", "To": "whatsapp:+14155238886", "Body": body, "MessageSid": message_sid
+    })
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: now[0])
+    bucket = throttle.TokenBucket(rate=1.0, capacity=2)
+
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    now[0] += 1.0
+    assert bucket.take()
+    now[0] += 60.0
+    assert bucket.take(2) and not bucket.take()  # refills only up to capacity
+
+def test_sender_throttle_keeps_a_bucket_per_sender():
+    sender_throttle = throttle.SenderThrottle(per_minute=1, burst=3)
+
+    assert [sender_throttle.allow("+263771234567") for _ in range(4)] == [True, True, True, False]
+    assert sender_throttle.allow("+263772222222")
+    # An expensive command costs at most the whole burst, so it is never refused forever
+    assert sender_throttle.allow("+263773333333", cost=10)
+
+def test_sender_throttle_evicts_the_least_recently_seen():
+    sender_throttle = throttle.SenderThrottle(per_minute=1, burst=1, max_senders=2)
+    for sender in ("a", "b", "a", "c"):
+        sender_throttle.allow(sender)
+    assert list(sender_throttle._buckets) == ["a", "c"]
+
+def test_concurrency_limiter_refuses_past_its_limit():
+    limiter = throttle.ConcurrencyLimiter(limit=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.in_flight == 2
+    limiter.release()
+    assert limiter.try_acquire()
+
+def test_flooding_sender_gets_the_throttle_reply(client):
+    replies = [incoming(client, message_sid=f"SM{index:032d}").get_data() for index in range(8)]
+
+    assert all(b"provide your student ID" in reply for reply in replies[:5])
+    assert all(b"sending messages too quickly" in reply for reply in replies[5:])
+    assert b"provide your student ID" in incoming(client, sender="+263772222222", message_sid=f"SM{99:032d}").get_data()
+
+def test_expensive_commands_past_the_concurrency_cap_are_deferred(client, monkeypatch):
+    monkeypatch.setattr(throttle, "expensive_limiter", throttle.ConcurrencyLimiter(limit=1))
+    started, release = threading.Event(), threading.Event()
+    find_contacts = app_module.find_contacts_by_phone
+
+    def slow(session, phone_number):
+        started.set()
+        release.wait(5)
+        return find_contacts(session, phone_number)
+
+    monkeypatch.setattr(app_module, "find_contacts_by_phone", slow)
+    first = threading.Thread(target=incoming, args=(client,), kwargs={"body": "get gatepass"})
+    first.start()
+    try:
+        assert started.wait(5)
+        reply = incoming(client, sender="+263772222222", body="get gatepass", message_sid=f"SM{2:032d}")
+    finally:
+        release.set()
+        first.join()
+
+    assert b"busy preparing gate passes" in reply.get_data()
+    assert throttle.expensive_limiter.in_flight == 0